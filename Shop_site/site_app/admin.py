@@ -1,4 +1,10 @@
 from django.contrib import admin
+from django.contrib.admin.utils import get_fields_from_path
+from django.core.paginator import Paginator
+from django.db import connection, models
+from django.template.response import TemplateResponse
+from django.utils.functional import cached_property
+
 from .models import (
     Category,
     Product,
@@ -11,8 +17,133 @@ from .models import (
     Payment,
     PaymentProof,
     OrderStatusHistory,
+    DailySourceRevenue,
+    StockReservation,
     format_sum,
 )
+from .rollups import dashboard_summary
+
+
+class EstimatedCountPaginator(Paginator):
+    """Для больших таблиц без фильтров берём оценку числа строк из статистики БД вместо COUNT(*)"""
+
+    threshold = 10000
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimate = estimate_row_count(self.object_list.model)
+            if estimate is not None and estimate > self.threshold:
+                return estimate
+        return super().count
+
+
+def estimate_row_count(model):
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+        elif connection.vendor == 'sqlite':
+            # sqlite_stat1 появляется только после ANALYZE
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            # первое число в stat — количество строк таблицы (для любого индекса)
+            cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+            row = cursor.fetchone()
+            return int(row[0].split()[0]) if row else None
+        else:
+            return None
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] >= 0 else None
+
+
+class IdInputFilter(admin.SimpleListFilter):
+    """Фильтр по введённому ID вместо списка всех связанных объектов"""
+
+    template = 'admin/input_filter.html'
+    lookup = None
+
+    def lookups(self, request, model_admin):
+        # Пустой вариант нужен, чтобы фильтр отрисовался
+        return ((None, None),)
+
+    def choices(self, changelist):
+        query_params = changelist.get_filters_params()
+        query_params.pop(self.parameter_name, None)
+        yield {
+            'value': self.value() or '',
+            'parameter_name': self.parameter_name,
+            'hidden_params': [(key, value) for key, values in query_params.items() for value in values],
+            'reset_query_string': changelist.get_query_string(remove=[self.parameter_name]),
+        }
+
+    def queryset(self, request, queryset):
+        value = (self.value() or '').strip().lstrip('#')
+        if not value:
+            return queryset
+        if not value.isdigit():
+            return queryset.none()
+        return queryset.filter(**{self.lookup: int(value)})
+
+
+class UserIdFilter(IdInputFilter):
+    title = 'site user ID'
+    parameter_name = 'user_id'
+    lookup = 'user_id'
+
+
+class TelegramIdFilter(IdInputFilter):
+    title = 'Telegram ID'
+    parameter_name = 'telegram_id'
+    lookup = 'telegram_user_id'
+
+
+class SubmittedByTelegramIdFilter(TelegramIdFilter):
+    lookup = 'submitted_by_telegram_id'
+
+
+class OrderIdFilter(IdInputFilter):
+    title = 'order ID'
+    parameter_name = 'order_id'
+    lookup = 'order_id'
+
+
+class PaymentOrderIdFilter(OrderIdFilter):
+    lookup = 'payment__order_id'
+
+
+class ExactSearchMixin:
+    """
+    Поиск только по точному совпадению полей из search_fields (без icontains по всей таблице).
+    Числовые поля сравниваются только с числовым запросом, у телефонов пробуем варианты с '+' и без.
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+
+        number = term.lstrip('#')
+        query = models.Q()
+        for field_name in self.get_search_fields(request):
+            path = field_name.lstrip('=')
+            field = get_fields_from_path(queryset.model, path)[-1]
+            if field.is_relation:
+                field = field.target_field
+            if isinstance(field, (models.IntegerField, models.AutoField)):
+                if number.isdigit():
+                    query |= models.Q(**{path: int(number)})
+            elif 'phone' in path:
+                digits = term.lstrip('+')
+                query |= models.Q(**{f'{path}__in': {term, digits, f'+{digits}'}})
+            else:
+                query |= models.Q(**{path: term})
+
+        if not query:
+            return queryset.none(), False
+        return queryset.filter(query), False
 
 
 @admin.register(Category)
@@ -24,9 +155,11 @@ class CategoryAdmin(admin.ModelAdmin):
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('id', 'title', 'title_uz', 'category', 'price', 'created_at')
+    list_display = ('id', 'title', 'title_uz', 'category', 'price', 'stock', 'reserved', 'created_at')
     list_filter = ('category',)
+    list_editable = ('stock',)
     search_fields = ('title', 'title_uz')
+    readonly_fields = ('reserved',)
 
 
 @admin.register(CartItem)
@@ -54,7 +187,7 @@ class OrderProductInline(admin.TabularInline):
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(ExactSearchMixin, admin.ModelAdmin):
     list_display = (
         'id',
         'source_label',
@@ -66,11 +199,15 @@ class OrderAdmin(admin.ModelAdmin):
         'payment_reminder_sent_at',
         'created_at',
     )
-    list_filter = ('status', 'user', 'telegram_user')
-    search_fields = ('id', 'customer_name', 'customer_phone', 'payment_comment', 'user__username', 'telegram_user__telegram_id')
+    list_filter = ('status', TelegramIdFilter, UserIdFilter)
+    search_fields = ('=id', '=customer_phone', '=telegram_user__telegram_id', '=user__username')
+    search_help_text = "Order ID, phone, Telegram ID or username (exact match)"
+    autocomplete_fields = ('user', 'telegram_user')
     readonly_fields = ('created_at',)
     date_hierarchy = 'created_at'
     inlines = [OrderProductInline]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def source_label(self, obj):
         return obj.source_label()
@@ -97,23 +234,89 @@ class TelegramAddressAdmin(admin.ModelAdmin):
 
 
 @admin.register(Payment)
-class PaymentAdmin(admin.ModelAdmin):
+class PaymentAdmin(ExactSearchMixin, admin.ModelAdmin):
     list_display = ('id', 'order', 'provider', 'formatted_amount', 'status', 'is_active', 'created_at')
-    list_filter = ('status', 'provider', 'is_active')
-    search_fields = ('order__id', 'provider')
+    list_filter = ('status', 'provider', 'is_active', OrderIdFilter)
+    list_select_related = ('order__user', 'order__telegram_user')
+    search_fields = ('=id', '=order__id')
+    search_help_text = "Payment ID or order ID (exact match)"
+    autocomplete_fields = ('order', 'reviewed_by')
     readonly_fields = ('created_at', 'updated_at', 'reviewed_at')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(PaymentProof)
-class PaymentProofAdmin(admin.ModelAdmin):
+class PaymentProofAdmin(ExactSearchMixin, admin.ModelAdmin):
     list_display = ('id', 'payment', 'submitted_by_user', 'submitted_by_telegram', 'submitted_at')
-    list_filter = ('submitted_at',)
-    search_fields = ('payment__id', 'submitted_by_telegram__telegram_id', 'telegram_file_id')
+    list_filter = ('submitted_at', PaymentOrderIdFilter, SubmittedByTelegramIdFilter)
+    list_select_related = ('payment', 'submitted_by_user', 'submitted_by_telegram')
+    search_fields = ('=payment__id', '=payment__order__id', '=submitted_by_telegram__telegram_id', '=telegram_file_id')
+    search_help_text = "Payment ID, order ID, Telegram ID or Telegram file ID (exact match)"
+    autocomplete_fields = ('payment', 'submitted_by_user', 'submitted_by_telegram')
     readonly_fields = ('submitted_at',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(OrderStatusHistory)
-class OrderStatusHistoryAdmin(admin.ModelAdmin):
+class OrderStatusHistoryAdmin(ExactSearchMixin, admin.ModelAdmin):
     list_display = ('id', 'order', 'previous_status', 'new_status', 'changed_by', 'changed_at')
-    list_filter = ('new_status', 'changed_at')
-    search_fields = ('order__id', 'changed_by__username')
+    list_filter = ('new_status', 'changed_at', OrderIdFilter)
+    list_select_related = ('order__user', 'order__telegram_user', 'changed_by')
+    search_fields = ('=order__id', '=changed_by__username')
+    search_help_text = "Order ID or staff username (exact match)"
+    autocomplete_fields = ('order', 'changed_by')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(ExactSearchMixin, admin.ModelAdmin):
+    list_display = ('id', 'order', 'product', 'quantity', 'status', 'created_at', 'updated_at')
+    list_filter = ('status', OrderIdFilter)
+    list_select_related = ('order__user', 'order__telegram_user', 'product')
+    search_fields = ('=order__id', '=product__id')
+    search_help_text = "Order ID or product ID (exact match)"
+    autocomplete_fields = ('order', 'product')
+    readonly_fields = ('created_at', 'updated_at')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(DailySourceRevenue)
+class SalesDashboardAdmin(admin.ModelAdmin):
+    """Дашборд продаж: читает только агрегаты, а не всю историю заказов"""
+
+    change_list_template = 'admin/site_app/sales_dashboard.html'
+    periods = (7, 30, 90, 365)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        try:
+            days = int(request.GET.get('days', 30))
+        except ValueError:
+            days = 30
+        days = days if days in self.periods else 30
+        summary = dashboard_summary(days)
+        for row in summary['by_source'] + summary['by_day'] + summary['top_products']:
+            row['revenue_display'] = format_sum(row['revenue'])
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': "Sales dashboard",
+            'periods': self.periods,
+            'summary': summary,
+            'total_revenue_display': format_sum(summary['total_revenue']),
+            **(extra_context or {}),
+        }
+        return TemplateResponse(request, self.change_list_template, context)
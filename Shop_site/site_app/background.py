@@ -0,0 +1,48 @@
+"""
+Пулы потоков для работы после ответа: копии картинок (imaging), копии чеков из Telegram (proof_mirror),
+уведомления клиентам (services.notifications). У каждого пула своё число потоков в настройках;
+0 — задача выполняется сразу в вызывающем потоке.
+"""
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def _run(fn: Callable, args: tuple):
+    try:
+        return fn(*args)
+    except Exception:
+        logger.exception("Background job %s%r failed", fn.__qualname__, args)
+    finally:
+        # Соединение с базой у каждого потока своё — не оставляем его открытым между задачами
+        connections.close_all()
+
+
+def _get_executor(pool_name: str, workers: int) -> ThreadPoolExecutor:
+    executor = _executors.get(pool_name)
+    if executor is None:
+        with _executors_lock:
+            executor = _executors.get(pool_name)
+            if executor is None:
+                executor = _executors[pool_name] = ThreadPoolExecutor(
+                    max_workers=workers, thread_name_prefix=pool_name,
+                )
+    return executor
+
+
+def submit(pool_name: str, workers_setting: str, fn: Callable, *args) -> Optional[Future]:
+    """fn(*args) в пуле pool_name; размер пула — settings.<workers_setting> (0 — сразу здесь)"""
+    workers = getattr(settings, workers_setting)
+    if workers <= 0:
+        fn(*args)
+        return None
+    return _get_executor(pool_name, workers).submit(_run, fn, args)
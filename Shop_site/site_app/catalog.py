@@ -0,0 +1,113 @@
+"""
+Каталог для /api/bootstrap/: дерево категорий и первая страница товаров каждой корневой категории.
+
+Фрагменты рендерятся в JSON один раз на (версию каталога, язык, хост) и хранятся в памяти процесса.
+Версия — дайджест count/max(id)/max(updated_at) категорий и товаров, поэтому все процессы
+(сервер, бот с in-process транспортом) сходятся на ней без общего кэша.
+Остатков (stock) во фрагментах нет: они меняются при каждом заказе и берутся из /api/products/.
+"""
+import hashlib
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .fastjson import ORJSONRenderer
+from .models import Category, Product
+from .serializers import CategorySerializer, ProductListSerializer
+
+LANGUAGES = ('ru', 'uz')
+DEFAULT_LANGUAGE = 'ru'
+
+_lock = threading.Lock()
+_fragments: Dict[Tuple[str, str, str], 'CatalogFragment'] = {}
+
+
+class CatalogFragment(NamedTuple):
+    version: str
+    categories: bytes  # JSON: дерево категорий
+    products: bytes    # JSON: {category_id: {"items": [...], "has_more": bool}}
+    digest: str
+
+
+def normalize_language(language: Optional[str]) -> str:
+    language = (language or '').lower()[:2]
+    return language if language in LANGUAGES else DEFAULT_LANGUAGE
+
+
+def catalog_version() -> str:
+    stats = [
+        model.objects.aggregate(count=Count('id'), max_id=Max('id'), updated=Max('updated_at'))
+        for model in (Category, Product)
+    ]
+    return hashlib.sha1(repr(stats).encode()).hexdigest()[:12]
+
+
+def get_catalog(language: str, request) -> CatalogFragment:
+    """Фрагменты текущей версии каталога; строятся не чаще раза на версию, язык и хост"""
+    version = catalog_version()
+    key = (version, language, request.build_absolute_uri('/'))
+    fragment = _fragments.get(key)
+    if fragment is not None:
+        return fragment
+    with _lock:
+        fragment = _fragments.get(key)
+        if fragment is None:
+            # Старые версии больше не понадобятся
+            for stale in [k for k in _fragments if k[0] != version]:
+                del _fragments[stale]
+            fragment = _build(version, language, request)
+            _fragments[key] = fragment
+    return fragment
+
+
+def clear_cache():
+    with _lock:
+        _fragments.clear()
+
+
+def _label(data: dict, field: str, language: str) -> str:
+    return (language == 'uz' and data.get(f'{field}_uz')) or data.get(field) or ''
+
+
+def _build(version: str, language: str, request) -> CatalogFragment:
+    context = {'request': request}
+    nodes = {
+        data['id']: dict(data, label=_label(data, 'name', language), children=[])
+        for data in CategorySerializer(Category.objects.order_by('name'), many=True, context=context).data
+    }
+    roots: List[dict] = []
+    for node in nodes.values():
+        parent = nodes.get(node['parent'])
+        (parent['children'] if parent else roots).append(node)
+
+    page_size = getattr(settings, 'BOOTSTRAP_PRODUCTS_PER_CATEGORY', 10)
+    products = {}
+    for root in roots:
+        queryset = (
+            Product.objects
+            .select_related('category')
+            .filter(category_id__in=_subtree_ids(root))
+            .order_by('-created_at')[:page_size + 1]
+        )
+        items = [
+            dict(item, label=_label(item, 'title', language))
+            for item in ProductListSerializer(queryset, many=True, context=context).data
+        ]
+        for item in items:
+            item.pop('stock', None)
+        products[str(root['id'])] = {'items': items[:page_size], 'has_more': len(items) > page_size}
+
+    renderer = ORJSONRenderer()
+    categories_json = renderer.render(roots)
+    products_json = renderer.render(products)
+    digest = hashlib.sha1(categories_json + products_json).hexdigest()
+    return CatalogFragment(version, categories_json, products_json, digest)
+
+
+def _subtree_ids(node: dict) -> List[int]:
+    ids = [node['id']]
+    for child in node['children']:
+        ids.extend(_subtree_ids(child))
+    return ids
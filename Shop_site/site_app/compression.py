@@ -0,0 +1,98 @@
+"""
+Сжатие JSON-ответов (Brotli, если установлен пакет brotli, иначе gzip).
+
+Сжимаются только JSON/YAML не короче RESPONSE_COMPRESSION_MIN_BYTES: HTML админки с CSRF-токеном
+не трогаем (BREACH), картинки и так сжаты, а SSE и файлы идут потоком. Сильный ETag становится слабым,
+как у django.middleware.gzip — поэтому ETag из If-None-Match сравниваем через etag_matches().
+"""
+import gzip
+from typing import Optional
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+# Уровни для сжатия на лету: дальше выигрыш в размере мал, а CPU растёт заметно
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def _accepted_encodings(header: str) -> set:
+    accepted = set()
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        q = params.strip()
+        if q.startswith('q='):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if name:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+def choose_encoding(header: str) -> Optional[str]:
+    accepted = _accepted_encodings(header)
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress(content: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(content, quality=BROTLI_QUALITY)
+    return gzip.compress(content, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def etag_matches(request, etag: str) -> bool:
+    """Слабое сравнение If-None-Match (RFC 9110): W/"x" и "x" совпадают"""
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    tags = parse_etags(header)
+    bare = etag.removeprefix('W/')
+    return '*' in tags or any(tag.removeprefix('W/') == bare for tag in tags)
+
+
+class CompressionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not self._compressible(response):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < settings.RESPONSE_COMPRESSION_MIN_BYTES:
+            return response
+
+        encoding = choose_encoding(request.headers.get('Accept-Encoding', ''))
+        if encoding is None:
+            return response
+        compressed = compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        response.headers['Content-Encoding'] = encoding
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        return response
+
+    @staticmethod
+    def _compressible(response) -> bool:
+        if response.streaming or response.status_code in (204, 206, 304) or response.has_header('Content-Encoding'):
+            return False
+        content_type = response.get('Content-Type', '').split(';', 1)[0].strip().lower()
+        return content_type in settings.RESPONSE_COMPRESSION_TYPES or content_type.endswith('+json')
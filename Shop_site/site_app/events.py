@@ -0,0 +1,214 @@
+"""
+События заказа для SSE-потока /api/orders/<id>/events/.
+
+Order.set_status и Payment.save публикуют событие после commit, открытые соединения ждут его
+без запросов к БД (запрос — только снимок при подключении или если пропущенные события уже вытеснены).
+Брокер по умолчанию живёт в памяти процесса: этого достаточно для одного процесса (runserver,
+один воркер uvicorn/gunicorn). Для нескольких процессов ORDER_EVENTS_BROKER указывает класс
+с тем же интерфейсом поверх локального брокера (Redis pub/sub и т.п.).
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Deque, Dict, Iterator, List, NamedTuple, Optional, Set
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+
+RETRY_MS = 3000
+
+Wake = Callable[[], None]
+
+
+class Event(NamedTuple):
+    id: int
+    type: str
+    data: dict
+
+
+class _Channel:
+    __slots__ = ('history', 'floor', 'subscribers', 'touched')
+
+    def __init__(self, floor: int):
+        self.history: Deque[Event] = deque()
+        # События с id <= floor могли пройти мимо истории — для них нужен снимок
+        self.floor = floor
+        self.subscribers: Set[Wake] = set()
+        self.touched = time.monotonic()
+
+
+class InProcessBroker:
+    """
+    Каналы с короткой историей для повтора по Last-Event-ID.
+    id событий — микросекунды с эпохи (строго возрастают), поэтому id из прошлой жизни процесса
+    оказываются ниже floor и клиент получает свежий снимок.
+    """
+
+    def __init__(self, history_size: int = 20, idle_ttl: float = 3600.0):
+        self.history_size = history_size
+        self.idle_ttl = idle_ttl
+        self._lock = threading.Lock()
+        self._channels: Dict[str, _Channel] = {}
+        self._last_id = self._floor = time.time_ns() // 1000
+        self._pruned_at = time.monotonic()
+
+    @property
+    def last_id(self) -> int:
+        return self._last_id
+
+    def publish(self, channel: str, type: str, data: dict) -> Event:
+        with self._lock:
+            self._last_id = max(self._last_id + 1, time.time_ns() // 1000)
+            event = Event(self._last_id, type, data)
+            state = self._channel(channel)
+            state.history.append(event)
+            if len(state.history) > self.history_size:
+                state.floor = state.history.popleft().id
+            subscribers = list(state.subscribers)
+            self._prune()
+        for wake in subscribers:
+            wake()
+        return event
+
+    def replay(self, channel: str, last_id: int) -> Optional[List[Event]]:
+        """События после last_id; None, если часть из них уже потеряна"""
+        with self._lock:
+            state = self._channels.get(channel)
+            if last_id < (state.floor if state else self._floor):
+                return None
+            return [event for event in state.history if event.id > last_id] if state else []
+
+    def subscribe(self, channel: str, wake: Wake):
+        with self._lock:
+            self._channel(channel).subscribers.add(wake)
+
+    def unsubscribe(self, channel: str, wake: Wake):
+        with self._lock:
+            state = self._channels.get(channel)
+            if state:
+                state.subscribers.discard(wake)
+                state.touched = time.monotonic()
+
+    def _channel(self, channel: str) -> _Channel:
+        state = self._channels.get(channel)
+        if state is None:
+            state = self._channels[channel] = _Channel(self._floor)
+        state.touched = time.monotonic()
+        return state
+
+    def _prune(self):
+        # Раз в минуту забываем каналы без подписчиков, молчащие дольше idle_ttl
+        now = time.monotonic()
+        if now - self._pruned_at < 60:
+            return
+        self._pruned_at = now
+        for name, state in list(self._channels.items()):
+            if not state.subscribers and now - state.touched > self.idle_ttl:
+                if state.history:
+                    self._floor = max(self._floor, state.history[-1].id)
+                del self._channels[name]
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.ORDER_EVENTS_BROKER)()
+    return _broker
+
+
+def order_channel(order_id: int) -> str:
+    return f'order:{order_id}'
+
+
+def publish_order_status(order_id: int, previous_status: str, status: str):
+    get_broker().publish(order_channel(order_id), 'status', {
+        'order_id': order_id,
+        'previous_status': previous_status,
+        'status': status,
+    })
+
+
+def publish_payment(order_id: int, payment_id: int, status: str, is_active: bool):
+    get_broker().publish(order_channel(order_id), 'payment', {
+        'order_id': order_id,
+        'payment_id': payment_id,
+        'status': status,
+        'is_active': is_active,
+    })
+
+
+def format_event(event: Event) -> bytes:
+    data = json.dumps(event.data, cls=DjangoJSONEncoder, ensure_ascii=False)
+    return f'id: {event.id}\nevent: {event.type}\ndata: {data}\n\n'.encode()
+
+
+def _missed(broker, channel: str, last_id: Optional[int]) -> Optional[List[Event]]:
+    """Пропущенные события; None — повторить нельзя, нужен снимок"""
+    return broker.replay(channel, last_id) if last_id is not None else None
+
+
+def stream(channel: str, last_id: Optional[int], snapshot: Callable[[], dict]) -> Iterator[bytes]:
+    """SSE для WSGI: соединение держит поток, но спит на threading.Event"""
+    broker = get_broker()
+    woke = threading.Event()
+    broker.subscribe(channel, woke.set)
+    try:
+        yield f'retry: {RETRY_MS}\n\n'.encode()
+        deadline = time.monotonic() + settings.ORDER_EVENTS_STREAM_SECONDS
+        while True:
+            events = _missed(broker, channel, last_id)
+            if events is None:
+                mark = broker.last_id
+                events = [Event(mark, 'snapshot', snapshot())]
+            for event in events:
+                last_id = event.id
+                yield format_event(event)
+            if time.monotonic() >= deadline:
+                return
+            if not woke.wait(settings.ORDER_EVENTS_HEARTBEAT):
+                yield b': ping\n\n'
+            woke.clear()
+    finally:
+        broker.unsubscribe(channel, woke.set)
+
+
+async def astream(channel: str, last_id: Optional[int], snapshot: Callable[[], dict]) -> AsyncIterator[bytes]:
+    """SSE для ASGI: открытое соединение — это только корутина в event loop"""
+    broker = get_broker()
+    loop = asyncio.get_running_loop()
+    woke = asyncio.Event()
+
+    def wake():
+        loop.call_soon_threadsafe(woke.set)
+
+    broker.subscribe(channel, wake)
+    try:
+        yield f'retry: {RETRY_MS}\n\n'.encode()
+        deadline = time.monotonic() + settings.ORDER_EVENTS_STREAM_SECONDS
+        while True:
+            events = _missed(broker, channel, last_id)
+            if events is None:
+                mark = broker.last_id
+                events = [Event(mark, 'snapshot', await sync_to_async(snapshot)())]
+            for event in events:
+                last_id = event.id
+                yield format_event(event)
+            if time.monotonic() >= deadline:
+                return
+            try:
+                await asyncio.wait_for(woke.wait(), settings.ORDER_EVENTS_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield b': ping\n\n'
+            woke.clear()
+    finally:
+        broker.unsubscribe(channel, wake)
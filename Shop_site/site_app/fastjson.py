@@ -0,0 +1,67 @@
+"""
+JSON для DRF через orjson (если установлен: pip install orjson).
+
+Вывод совпадает с rest_framework.renderers.JSONRenderer байт в байт: компактные разделители, UTF-8 без
+экранирования, Decimal/datetime/date/time/lazy-строки — через тот же rest_framework JSONEncoder.default,
+U+2028/U+2029 экранируются. Всё, что orjson не умеет (indent из Accept, int больше 64 бит, не UTF-8 и т.п.),
+уходит в стандартную реализацию DRF, поэтому без orjson классы просто работают как стандартные.
+Исключение — float: как repr() он пишется только для 0 и 1e-4 <= |x| < 1e16. Экспоненты orjson пишет
+по-своему (1e16 вместо 1e+16, 1e-7 вместо 1e-07 — то же число для любого JSON-парсера), а NaN/inf
+отдаёт как null (у DRF — ValueError). Цены у нас Decimal, а координаты заказов в этот диапазон укладываются.
+"""
+import io
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+if orjson is not None:
+    ORJSON_OPTIONS = (
+        # datetime/date/time и dataclass — в JSONEncoder.default, как у DRF (…+00:00 -> …Z)
+        orjson.OPT_PASSTHROUGH_DATETIME
+        | orjson.OPT_PASSTHROUGH_DATACLASS
+        | orjson.OPT_NON_STR_KEYS
+    )
+
+_default = JSONEncoder().default
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or not self.strict or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type or '', renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            # Например, int > 64 бит: пусть stdlib отдаст то же, что раньше (или ту же ошибку)
+            return super().render(data, accepted_media_type, renderer_context)
+        # Как в JSONRenderer: эти символы ломают JavaScript внутри <script>
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class ORJSONParser(JSONParser):
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        body = stream.read()
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            # Ошибку (и редкие случаи вроде int > 64 бит) разбирает stdlib — текст ошибки как у DRF
+            return super().parse(io.BytesIO(body), media_type, parser_context)
@@ -0,0 +1,100 @@
+"""
+Повтор запросов по заголовку Idempotency-Key.
+
+Первый запрос с ключом «занимает» его (строка без ответа), выполняется и сохраняет ответ.
+Повтор с тем же ключом и тем же телом получает сохранённый ответ, не выполняя действие заново;
+с другим телом — 422, пока первый ещё выполняется — 409.
+"""
+import hashlib
+import json
+from datetime import timedelta
+from typing import Any, Optional, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyError(APIException):
+    """Повтор нельзя ни выполнить, ни отдать из сохранённого ответа"""
+
+    def __init__(self, detail: str, status_code: int):
+        super().__init__(detail)
+        self.status_code = status_code
+
+
+def fingerprint(data, user_id: Optional[int] = None) -> str:
+    if hasattr(data, 'lists'):
+        data = {key: values for key, values in data.lists()}
+    payload = {'user': user_id, 'data': data}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def claim(scope: str, key: str, request_hash: str) -> Tuple[Optional[IdempotencyKey], Optional[Tuple[int, Any]]]:
+    """
+    Вернуть (запись, None), если запрос нужно выполнить, или (None, (статус, тело)) для повтора.
+    Конфликты поднимают IdempotencyError. Без ключа возвращает (None, None) — обычная обработка.
+    """
+    key = (key or '').strip()
+    if not key:
+        return None, None
+    if len(key) > MAX_KEY_LENGTH:
+        raise IdempotencyError(f'{HEADER} must be at most {MAX_KEY_LENGTH} characters.', status.HTTP_400_BAD_REQUEST)
+
+    now = timezone.now()
+    expires_at = now + timedelta(hours=getattr(settings, 'IDEMPOTENCY_KEY_TTL_HOURS', 24))
+
+    # Просроченный ключ можно использовать заново
+    IdempotencyKey.objects.filter(scope=scope, key=key, expires_at__lte=now).delete()
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                scope=scope,
+                key=key,
+                request_hash=request_hash,
+                expires_at=expires_at,
+            )
+        return record, None
+    except IntegrityError:
+        pass
+
+    existing = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+    if existing is None:
+        # Ключ удалили между INSERT и SELECT — пусть клиент повторит
+        raise IdempotencyError('Request with this key is being processed.', status.HTTP_409_CONFLICT)
+    if existing.request_hash != request_hash:
+        raise IdempotencyError(
+            f'{HEADER} was already used with a different request.',
+            status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    if existing.status_code is None:
+        raise IdempotencyError('Request with this key is being processed.', status.HTTP_409_CONFLICT)
+
+    return None, (existing.status_code, existing.response_body)
+
+
+def complete(record: Optional[IdempotencyKey], status_code: int, body: Any):
+    """Сохранить ответ для повторов. Ответы 5xx не сохраняем — ключ освобождается"""
+    if record is None:
+        return
+    if status_code >= 500:
+        release(record)
+        return
+    IdempotencyKey.objects.filter(pk=record.pk).update(status_code=status_code, response_body=body)
+
+
+def release(record: Optional[IdempotencyKey]):
+    if record is not None:
+        IdempotencyKey.objects.filter(pk=record.pk).delete()
+
+
+def purge_expired() -> int:
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
@@ -0,0 +1,108 @@
+"""
+Уменьшенные копии картинок (thumb/card/full) в WebP и JPEG для Product, Category и PaymentProof.
+
+После сохранения модели с новой картинкой генерация уходит в пул потоков (IMAGE_DERIVATIVE_WORKERS;
+0 — сразу в том же потоке), результат пишется в поле image_variants:
+    {'source': 'products/ball.<hash>.jpg', 'thumb': {'width': 160, 'height': 120, 'webp': name, 'jpeg': name}, ...}
+Пока копий нет, клиенты получают только оригинал. Файлы сохраняются через default_storage, поэтому у них
+тоже хеш в имени и Cache-Control: immutable. Существующие картинки: manage.py build_image_variants.
+"""
+import io
+import logging
+import posixpath
+from concurrent.futures import Future
+from functools import partial
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from . import background
+from .storage import HASHED_NAME_RE
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+
+
+def _open(field) -> Image.Image:
+    field.open('rb')
+    try:
+        image = Image.open(io.BytesIO(field.read()))
+        image.load()
+    finally:
+        field.close()
+    # Телефоны пишут поворот в EXIF; сами EXIF (и GPS в них) в копии не попадают
+    return ImageOps.exif_transpose(image)
+
+
+def _encode(image: Image.Image, fmt: str) -> bytes:
+    if fmt == 'jpeg' and image.mode != 'RGB':
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            canvas = Image.new('RGB', image.size, (255, 255, 255))
+            canvas.paste(image, mask=image.getchannel('A'))
+            image = canvas
+        else:
+            image = image.convert('RGB')
+    elif fmt == 'webp' and image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() or image.mode == 'P' else 'RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, **FORMATS[fmt])
+    return buffer.getvalue()
+
+
+def build_variants(field) -> Dict:
+    """Создаёт копии всех размеров и возвращает значение для image_variants"""
+    original = _open(field)
+    directory, filename = posixpath.split(field.name)
+    stem = posixpath.splitext(HASHED_NAME_RE.sub(r'\2', filename))[0]
+    variants: Dict = {'source': field.name}
+    for size_name, max_edge in settings.IMAGE_DERIVATIVE_SIZES.items():
+        image = original.copy()
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        variant = {'width': image.width, 'height': image.height}
+        for fmt in FORMATS:
+            name = posixpath.join('variants', directory, f'{stem}-{size_name}.{fmt}')
+            variant[fmt] = default_storage.save(name, ContentFile(_encode(image, fmt)))
+        variants[size_name] = variant
+    return variants
+
+
+def needs_variants(instance) -> bool:
+    return bool(instance.image) and (instance.image_variants or {}).get('source') != instance.image.name
+
+
+def generate(model, pk: int) -> bool:
+    """Копии для одной записи; False — картинка уже другая или удалена (её обработает своя задача)"""
+    instance = model.objects.filter(pk=pk).only('image', 'image_variants').first()
+    if instance is None or not needs_variants(instance):
+        return False
+    try:
+        variants = build_variants(instance.image)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        logger.exception("Could not build image variants for %s #%s (%s)", model.__name__, pk, instance.image.name)
+        return False
+    changes = {'image_variants': variants}
+    if any(field.name == 'updated_at' for field in model._meta.fields):
+        # Меняется версия каталога (site_app/catalog.py), и bootstrap отдаёт уже с копиями
+        changes['updated_at'] = timezone.now()
+    # Пишем, только если за это время картинку не заменили
+    return bool(model.objects.filter(pk=pk, image=instance.image.name).update(**changes))
+
+
+def submit(model, pk: int) -> Optional[Future]:
+    return background.submit('image-variants', 'IMAGE_DERIVATIVE_WORKERS', generate, model, pk)
+
+
+def schedule(instance):
+    """Вызывается из save(): после commit ставит генерацию копий в очередь, если картинка новая"""
+    if needs_variants(instance):
+        transaction.on_commit(partial(submit, type(instance), instance.pk))
@@ -0,0 +1,102 @@
+"""
+Остатки товаров и резервы под заказы.
+
+Все изменения остатков — одиночные условные UPDATE, без чтения-изменения-записи:
+- резерв при оформлении:  stock -= q, reserved += q  (только если stock >= q);
+- оплата заказа:          reserved -= q               (резерв становится продажей);
+- отмена / отклонение:    stock += q, reserved -= q   (резерв возвращается в продажу).
+Переходы самих резервов тоже условные (WHERE status = ...), поэтому повторный вызов ничего не меняет.
+"""
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, Tuple
+
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Order, Product, StockReservation
+
+logger = logging.getLogger(__name__)
+
+
+class OutOfStock(ValueError):
+    def __init__(self, product: Product):
+        self.product = product
+        super().__init__(f'Not enough stock for "{product.title}".')
+
+
+def reserve_stock(order: Order, items: Iterable[Tuple[Product, int]]):
+    """Зарезервировать товары под заказ. Вызывать внутри транзакции оформления заказа"""
+    quantities: Dict[int, int] = defaultdict(int)
+    products: Dict[int, Product] = {}
+    for product, quantity in items:
+        quantities[product.pk] += quantity
+        products[product.pk] = product
+
+    reservations = []
+    # Один и тот же порядок блокировок во всех транзакциях
+    for product_id in sorted(quantities):
+        quantity = quantities[product_id]
+        updated = (
+            Product.objects
+            .filter(pk=product_id, stock__gte=quantity)
+            .update(stock=F('stock') - quantity, reserved=F('reserved') + quantity)
+        )
+        if updated:
+            reservations.append(StockReservation(order=order, product_id=product_id, quantity=quantity))
+        elif not Product.objects.filter(pk=product_id, stock__isnull=True).exists():
+            raise OutOfStock(products[product_id])
+
+    StockReservation.objects.bulk_create(reservations)
+
+
+def commit_reservations(order: Order):
+    """Заказ оплачен: резерв превращается в продажу"""
+    for reservation in order.stock_reservations.exclude(status=StockReservation.Status.COMMITTED):
+        previous_status = reservation.status
+        if not _transition(reservation, previous_status, StockReservation.Status.COMMITTED):
+            continue
+        if previous_status == StockReservation.Status.ACTIVE:
+            _update_product(reservation.product_id, reserved=-reservation.quantity)
+        else:
+            # Резерв уже вернули в продажу (например, после отклонения оплаты) — забираем товар заново
+            taken = (
+                Product.objects
+                .filter(pk=reservation.product_id, stock__gte=reservation.quantity)
+                .update(stock=F('stock') - reservation.quantity)
+            )
+            if not taken:
+                logger.warning(
+                    "Order %s paid but product %s has less than %s units left",
+                    order.pk, reservation.product_id, reservation.quantity,
+                )
+
+
+def release_reservations(order: Order):
+    """Заказ отменён или оплата отклонена: вернуть товар в продажу"""
+    for reservation in order.stock_reservations.exclude(status=StockReservation.Status.RELEASED):
+        previous_status = reservation.status
+        if not _transition(reservation, previous_status, StockReservation.Status.RELEASED):
+            continue
+        if previous_status == StockReservation.Status.ACTIVE:
+            _update_product(reservation.product_id, stock=reservation.quantity, reserved=-reservation.quantity)
+        else:
+            _update_product(reservation.product_id, stock=reservation.quantity)
+
+
+def _transition(reservation: StockReservation, from_status: str, to_status: str) -> bool:
+    return bool(
+        StockReservation.objects
+        .filter(pk=reservation.pk, status=from_status)
+        .update(status=to_status, updated_at=timezone.now())
+    )
+
+
+def _update_product(product_id: int, stock: int = 0, reserved: int = 0):
+    updates = {}
+    if stock:
+        updates['stock'] = F('stock') + stock
+    if reserved:
+        updates['reserved'] = Greatest(F('reserved') + reserved, 0)
+    Product.objects.filter(pk=product_id).update(**updates)
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import logging
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from site_app import rollups
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily sales rollups (revenue by source, product sales, orders by status) from order history."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since",
+            help="Only rebuild days starting from this date (YYYY-MM-DD). Rebuilds everything by default.",
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options["since"]:
+            try:
+                since = date.fromisoformat(options["since"])
+            except ValueError:
+                raise CommandError("--since must be a date in YYYY-MM-DD format.")
+
+        counts = rollups.rebuild(since=since)
+        logger.info("Sales rollups rebuilt since %s: %s", since or "the beginning", counts)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt rollups: {counts['status_rows']} status rows, "
+            f"{counts['revenue_rows']} revenue rows, {counts['product_rows']} product rows."
+        ))
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from site_app import fastjson
+from site_app.fastjson import ORJSONRenderer
+from site_app.models import Category, Order, OrderProduct, Payment, Product
+from site_app.serializers import OrderSerializer, ProductListSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare DRF's JSONRenderer with the orjson renderer on product-list and order payloads. "
+        "Synthetic rows are created in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=200, help="Products in the list payload.")
+        parser.add_argument("--orders", type=int, default=50, help="Orders in the OrderSerializer payload.")
+        parser.add_argument("--repeat", type=int, default=200, help="Renders per payload and renderer.")
+
+    def handle(self, *args, **options):
+        if fastjson.orjson is None:
+            raise CommandError("orjson is not installed: pip install orjson")
+
+        with transaction.atomic():
+            payloads = self.build_payloads(options["products"], options["orders"])
+            transaction.set_rollback(True)
+
+        stdlib, fast = JSONRenderer(), ORJSONRenderer()
+        for name, data in payloads.items():
+            expected = stdlib.render(data)
+            if fast.render(data) != expected:
+                raise CommandError(f"{name}: orjson output differs from JSONRenderer")
+            slow_ms = self.measure(stdlib, data, options["repeat"])
+            fast_ms = self.measure(fast, data, options["repeat"])
+            self.stdout.write(
+                f"{name:<14} {len(expected) / 1024:8.1f} KiB   "
+                f"JSONRenderer {slow_ms:7.3f} ms   orjson {fast_ms:7.3f} ms   x{slow_ms / fast_ms:.1f}"
+            )
+
+    @staticmethod
+    def measure(renderer, data, repeat: int) -> float:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            renderer.render(data)
+        return (time.perf_counter() - started) * 1000 / repeat
+
+    @staticmethod
+    def build_payloads(product_count: int, order_count: int) -> dict:
+        category = Category.objects.create(name="Бенчмарк", slug="bench-json")
+        products = Product.objects.bulk_create(
+            Product(
+                category=category,
+                title=f"Шар «{index}»",
+                description="Фольгированный шар с гелием. " * 4,
+                price=Decimal("12500.50") + index,
+            )
+            for index in range(product_count)
+        )
+        now = timezone.now()
+        for index in range(order_count):
+            order = Order.objects.create(
+                total_price=Decimal("37501.50"),
+                total_uzs=Decimal("37501.50"),
+                customer_name="Покупатель",
+                address="Ташкент, Чиланзар, 7",
+                payment_deadline_at=now + timedelta(hours=1),
+            )
+            OrderProduct.objects.bulk_create(
+                OrderProduct(order=order, product=product, product_title=product.title, quantity=2,
+                             price_uzs=product.price)
+                for product in products[index % max(product_count - 3, 1):][:3]
+            )
+            Payment.objects.create(order=order, amount_uzs=order.total_uzs, provider="bench")
+            order.set_status(Order.Status.AWAITING_PROOF)
+
+        product_list = ProductListSerializer(
+            Product.objects.filter(category=category).select_related("category"), many=True,
+        ).data
+        orders = OrderSerializer(
+            Order.objects.filter(payments__provider="bench")
+            .prefetch_related("order_products__product", "payments", "status_history"),
+            many=True,
+            context={"include_status_history": True},
+        ).data
+        return {"product list": product_list, "orders": orders}
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from site_app import imaging
+from site_app.models import Category, PaymentProof, Product
+
+MODELS = {'product': Product, 'category': Category, 'proof': PaymentProof}
+
+
+class Command(BaseCommand):
+    help = "Build thumb/card/full WebP and JPEG variants for images that do not have them yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--model",
+            choices=sorted(MODELS),
+            action="append",
+            help="Only this model; repeat for several (default: all).",
+        )
+        parser.add_argument("--workers", type=int, default=4, help="Images processed in parallel (1 — in this thread).")
+
+    def handle(self, *args, **options):
+        for key in options["model"] or sorted(MODELS):
+            model = MODELS[key]
+            pending = [
+                instance.pk
+                for instance in model.objects.exclude(image='').exclude(image__isnull=True).only('image', 'image_variants')
+                if imaging.needs_variants(instance)
+            ]
+            if options["workers"] <= 1:
+                built = sum(imaging.generate(model, pk) for pk in pending)
+            else:
+                with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+                    built = sum(pool.map(lambda pk: self.generate(model, pk), pending))
+            self.stdout.write(self.style.SUCCESS(f"{key}: built {built} of {len(pending)} pending"))
+
+    @staticmethod
+    def generate(model, pk: int) -> bool:
+        try:
+            return imaging.generate(model, pk)
+        finally:
+            connections.close_all()
@@ -53,10 +53,14 @@ class Command(BaseCommand):
                 continue
 
             with transaction.atomic():
-                order.set_status(
+                canceled = order.set_status(
                     Order.Status.CANCELED,
                     comment="Автоотмена: дедлайн оплаты истёк.",
                 )
+                if not canceled:
+                    # Заказ успели оплатить или отменить, пока шла выборка
+                    self.stdout.write(f"Order #{order.id} was changed meanwhile, skipped")
+                    continue
                 Order.objects.filter(pk=order.pk).update(payment_reminder_sent_at=now)
 
                 active_payment = (
@@ -65,9 +69,7 @@ class Command(BaseCommand):
                     .first()
                 )
                 if active_payment:
-                    active_payment.status = Payment.Status.REJECTED
-                    active_payment.rejection_reason = "Дедлайн оплаты истёк"
-                    active_payment.save(update_fields=["status", "rejection_reason", "updated_at"])
+                    active_payment.transition(Payment.Status.REJECTED, rejection_reason="Дедлайн оплаты истёк")
 
                 self._notify_telegram(
                     order.telegram_user.telegram_id if order.telegram_user else None,
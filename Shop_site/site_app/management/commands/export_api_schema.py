@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from site_proj.schema import CODECS, build_schema, clear_cache, schema_path
+
+
+class Command(BaseCommand):
+    help = "Write the OpenAPI schema to API_SCHEMA_DIR so the site serves it without regenerating."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url",
+            default=settings.API_SCHEMA_URL,
+            help="Public base URL of the API (sets host/schemes in the schema).",
+        )
+        parser.add_argument(
+            "--format",
+            choices=sorted(CODECS),
+            action="append",
+            help="Schema format to write; repeat for several (default: all).",
+        )
+
+    def handle(self, *args, **options):
+        formats = options["format"] or sorted(CODECS)
+        clear_cache()
+        Path(settings.API_SCHEMA_DIR).mkdir(parents=True, exist_ok=True)
+
+        for fmt in formats:
+            path = schema_path(fmt)
+            path.write_bytes(build_schema(fmt, url=options["url"] or None))
+            self.stdout.write(self.style.SUCCESS(f"Wrote {path}"))
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Q
+
+from site_app import proof_mirror
+from site_app.models import PaymentProof
+
+
+class Command(BaseCommand):
+    help = "Download Telegram-only payment proofs into media storage and build their thumbnails."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Parallel downloads (1 — in this thread).")
+        parser.add_argument("--limit", type=int, default=0, help="Newest N proofs only (0 — all).")
+
+    def handle(self, *args, **options):
+        client = proof_mirror.get_client()
+        if client is None:
+            raise CommandError("BOT_TOKEN is not configured.")
+        pending = (
+            PaymentProof.objects
+            .filter(Q(image='') | Q(image__isnull=True))
+            .exclude(telegram_file_id__isnull=True)
+            .exclude(telegram_file_id='')
+            .order_by('-submitted_at')
+            .values_list('pk', flat=True)
+        )
+        if options["limit"]:
+            pending = pending[:options["limit"]]
+        pending = list(pending)
+        if options["workers"] <= 1:
+            mirrored = sum(proof_mirror.mirror(pk, client) for pk in pending)
+        else:
+            with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+                mirrored = sum(pool.map(lambda pk: self.mirror(pk, client), pending))
+        self.stdout.write(self.style.SUCCESS(f"Mirrored {mirrored} of {len(pending)} proofs"))
+
+    @staticmethod
+    def mirror(pk: int, client) -> bool:
+        try:
+            return proof_mirror.mirror(pk, client)
+        finally:
+            connections.close_all()
@@ -0,0 +1,18 @@
+from __future__ import annotations
+
+import logging
+
+from django.core.management.base import BaseCommand
+
+from site_app.idempotency import purge_expired
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Delete stored Idempotency-Key responses older than IDEMPOTENCY_KEY_TTL_HOURS."
+
+    def handle(self, *args, **options):
+        deleted = purge_expired()
+        logger.info("Purged %s expired idempotency keys", deleted)
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired idempotency keys."))
@@ -0,0 +1,133 @@
+"""
+Раздача MEDIA_ROOT вместо django.conf.urls.static.static().
+
+- ETag/Last-Modified и условные запросы (304), Range (206) с If-Range;
+- имена с хешем содержимого (site_app.storage) кэшируются навсегда (immutable), остальные — на MEDIA_MAX_AGE;
+- MEDIA_SENDFILE=x-accel-redirect|x-sendfile: Python только проверяет запрос и ставит заголовки,
+  файл (и Range) отдаёт nginx / Apache.
+"""
+import mimetypes
+import posixpath
+import re
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+
+from .storage import is_hashed_name
+
+CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """'bytes=0-99' -> (0, 99); несколько диапазонов не поддерживаем (отдаём файл целиком). ValueError — 416"""
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Последние N байт
+        length = int(last)
+        if length == 0:
+            raise ValueError('empty suffix range')
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError('unsatisfiable range')
+    return start, end
+
+
+def _read_range(path: Path, start: int, length: int) -> Iterator[bytes]:
+    with path.open('rb') as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _if_range_matches(request, etag: str, mtime: int) -> bool:
+    value = request.headers.get('If-Range')
+    if not value:
+        return True
+    if value.startswith('"'):
+        return value == etag
+    return parse_http_date_safe(value) == mtime
+
+
+def cache_control(response, path: str):
+    if path.startswith(tuple(settings.MEDIA_PRIVATE_PREFIXES)):
+        patch_cache_control(response, private=True, max_age=settings.MEDIA_MAX_AGE)
+    elif is_hashed_name(path):
+        patch_cache_control(response, public=True, max_age=settings.MEDIA_HASHED_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=settings.MEDIA_MAX_AGE)
+
+
+def serve_media(request, path: str):
+    path = posixpath.normpath(path).lstrip('/')
+    fullpath = Path(safe_join(settings.MEDIA_ROOT, path))
+    if not fullpath.is_file():
+        raise Http404('File not found.')
+
+    stat = fullpath.stat()
+    mtime = int(stat.st_mtime)
+    etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+    content_type, encoding = mimetypes.guess_type(str(fullpath))
+    content_type = content_type or 'application/octet-stream'
+
+    response = get_conditional_response(request, etag=etag, last_modified=mtime)
+    if response is None:
+        response = _file_response(request, fullpath, path, stat.st_size, content_type, etag, mtime)
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(mtime)
+    response['Accept-Ranges'] = 'bytes'
+    cache_control(response, path)
+    return response
+
+
+def _file_response(request, fullpath: Path, path: str, size: int, content_type: str, etag: str, mtime: int):
+    mode = settings.MEDIA_SENDFILE
+    if mode == 'x-accel-redirect':
+        # nginx: location MEDIA_ACCEL_PREFIX { internal; alias MEDIA_ROOT/; }
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + quote(path)
+        return response
+    if mode == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = str(fullpath)
+        return response
+
+    range_header = request.headers.get('Range')
+    if range_header and request.method in ('GET', 'HEAD') and _if_range_matches(request, etag, mtime):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                _read_range(fullpath, start, end - start + 1), status=206, content_type=content_type,
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(end - start + 1)
+            return response
+
+    response = FileResponse(fullpath.open('rb'), content_type=content_type)
+    response.block_size = CHUNK_SIZE
+    return response
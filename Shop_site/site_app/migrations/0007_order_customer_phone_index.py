@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('site_app', '0006_order_customer_name_order_customer_phone_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='customer_phone',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=100),
+        ),
+    ]
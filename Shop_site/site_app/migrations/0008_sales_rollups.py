@@ -0,0 +1,62 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:25
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('site_app', '0007_order_customer_phone_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyOrderStatusCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('pending_payment_link', 'Pending Payment Link'), ('awaiting_proof', 'Awaiting Proof'), ('under_review', 'Under Review'), ('rejected', 'Rejected'), ('paid', 'Paid'), ('canceled', 'Canceled')], max_length=32)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Daily orders by status',
+                'verbose_name_plural': 'Daily orders by status',
+                'ordering': ('-date', 'status'),
+                'constraints': [models.UniqueConstraint(fields=('date', 'status'), name='uniq_daily_order_status')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailySourceRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('source', models.CharField(max_length=20)),
+                ('orders_count', models.IntegerField(default=0)),
+                ('revenue_uzs', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=18)),
+            ],
+            options={
+                'verbose_name': 'Daily revenue by source',
+                'verbose_name_plural': 'Daily revenue by source',
+                'ordering': ('-date', 'source'),
+                'constraints': [models.UniqueConstraint(fields=('date', 'source'), name='uniq_daily_source_revenue')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('units', models.IntegerField(default=0)),
+                ('revenue_uzs', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=18)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='site_app.product')),
+            ],
+            options={
+                'verbose_name': 'Daily product sales',
+                'verbose_name_plural': 'Daily product sales',
+                'ordering': ('-date', 'product'),
+                'constraints': [models.UniqueConstraint(fields=('date', 'product'), name='uniq_daily_product_sales')],
+            },
+        ),
+    ]
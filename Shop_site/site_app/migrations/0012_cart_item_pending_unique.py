@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:48
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def mark_ordered_and_merge(apps, schema_editor):
+    """Позиции из заказов помечаем ordered_at, дубли в корзине складываем в одну строку"""
+    CartItem = apps.get_model('site_app', 'CartItem')
+    Order = apps.get_model('site_app', 'Order')
+    for order in Order.objects.filter(items__isnull=False).distinct().only('id', 'created_at'):
+        order.items.filter(ordered_at__isnull=True).update(ordered_at=order.created_at)
+
+    duplicates = (
+        CartItem.objects.filter(ordered_at__isnull=True)
+        .values('user_id', 'product_id')
+        .annotate(keep_id=Min('id'), total=Sum('quantity'), lines=Count('id'))
+        .filter(lines__gt=1)
+    )
+    for row in duplicates:
+        lines = CartItem.objects.filter(user_id=row['user_id'], product_id=row['product_id'], ordered_at__isnull=True)
+        lines.exclude(pk=row['keep_id']).delete()
+        lines.filter(pk=row['keep_id']).update(quantity=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('site_app', '0011_catalog_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cartitem',
+            name='ordered_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(mark_ordered_and_merge, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(condition=models.Q(('ordered_at__isnull', True)), fields=('user', 'product'), name='uniq_cart_item_pending'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:50
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def move_ordered_cart_items(apps, schema_editor):
+    """Заказы без OrderProduct получают строки из Order.items; заказанные строки корзины удаляются"""
+    CartItem = apps.get_model('site_app', 'CartItem')
+    Order = apps.get_model('site_app', 'Order')
+    OrderProduct = apps.get_model('site_app', 'OrderProduct')
+
+    orders = Order.objects.filter(items__isnull=False, order_products__isnull=True).distinct()
+    for order in orders.prefetch_related('items__product'):
+        OrderProduct.objects.bulk_create([
+            OrderProduct(
+                order=order,
+                product=item.product,
+                product_title=item.product.title,
+                quantity=item.quantity,
+                price_uzs=item.product.price,
+            )
+            for item in order.items.all()
+        ])
+    CartItem.objects.filter(Q(ordered_at__isnull=False) | Q(order__isnull=False)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('site_app', '0012_cart_item_pending_unique'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(move_ordered_cart_items, migrations.RunPython.noop),
+        migrations.RemoveConstraint(
+            model_name='cartitem',
+            name='uniq_cart_item_pending',
+        ),
+        migrations.RemoveField(
+            model_name='cartitem',
+            name='ordered_at',
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='items',
+        ),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('user', 'product'), name='uniq_cart_item'),
+        ),
+    ]
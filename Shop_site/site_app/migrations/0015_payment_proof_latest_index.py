@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('site_app', '0014_order_history_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='paymentproof',
+            index=models.Index(fields=['payment', '-submitted_at', '-id'], name='proof_latest_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:13
+
+import site_app.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('site_app', '0016_image_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentproof',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='paymentproof',
+            name='image',
+            field=models.ImageField(blank=True, null=True, upload_to=site_app.models.payment_proof_upload_to),
+        ),
+        migrations.AddConstraint(
+            model_name='paymentproof',
+            constraint=models.UniqueConstraint(condition=models.Q(('content_hash', ''), _negated=True), fields=('payment', 'content_hash'), name='proof_payment_hash_uniq'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:22
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def keep_newest_active(apps, schema_editor):
+    """Если у заказа несколько активных платежей, активным остаётся последний"""
+    Payment = apps.get_model('site_app', 'Payment')
+    duplicates = (
+        Payment.objects.filter(is_active=True)
+        .values('order_id')
+        .annotate(keep_id=Max('id'), active=Count('id'))
+        .filter(active__gt=1)
+    )
+    for row in duplicates:
+        Payment.objects.filter(order_id=row['order_id'], is_active=True).exclude(pk=row['keep_id']).update(is_active=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('site_app', '0017_payment_proof_content_hash'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(keep_newest_active, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='payment',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('order',), name='payment_one_active_per_order', violation_error_message='Only one active payment is allowed per order.'),
+        ),
+    ]
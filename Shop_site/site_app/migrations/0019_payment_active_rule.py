@@ -0,0 +1,28 @@
+from django.db import migrations
+from django.db.models import Max
+
+
+def apply_active_rule(apps, schema_editor):
+    """Оплаченные платежи закрыты; последний отклонённый платёж заказа без активного снова активен"""
+    Payment = apps.get_model('site_app', 'Payment')
+    Payment.objects.filter(status='paid', is_active=True).update(is_active=False)
+
+    with_active = Payment.objects.filter(is_active=True).values('order_id')
+    newest = (
+        Payment.objects.exclude(order_id__in=with_active)
+        .values('order_id')
+        .annotate(newest_id=Max('id'))
+        .values_list('newest_id', flat=True)
+    )
+    Payment.objects.filter(pk__in=list(newest), status='rejected').update(is_active=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('site_app', '0018_payment_one_active_per_order'),
+    ]
+
+    operations = [
+        migrations.RunPython(apply_active_rule, migrations.RunPython.noop),
+    ]
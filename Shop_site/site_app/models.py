@@ -1,4 +1,6 @@
+import os
 from decimal import Decimal
+from functools import partial
 from typing import Optional
 
 from django.db import models, transaction
@@ -8,17 +10,30 @@ from django.utils import timezone
 from django.core.exceptions import ValidationError
 
 
+def save_with_image_variants(instance, *args, **kwargs):
+    """save() для моделей с image/image_variants: старые копии сбрасываются, новые строятся после commit"""
+    if not instance.image:
+        instance.image_variants = {}
+    models.Model.save(instance, *args, **kwargs)
+    from .imaging import schedule
+    schedule(instance)
+
+
 class Category(models.Model):
     name = models.CharField(max_length=100)
     name_uz = models.CharField(max_length=100, blank=True, default="")
     slug = models.SlugField(unique=True)
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='children')
     image = models.ImageField(upload_to='categories/', blank=True, null=True)
+    # Уменьшенные копии картинки (site_app/imaging.py)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    # Для версии каталога в /api/bootstrap/ (см. site_app/catalog.py)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
+        save_with_image_variants(self, *args, **kwargs)
 
     def __str__(self):
         return self.name
@@ -32,7 +47,17 @@ class Product(models.Model):
     description_uz = models.TextField(blank=True, default="")
     price = models.DecimalField(max_digits=10, decimal_places=2)
     image = models.ImageField(upload_to='products/', blank=True, null=True)
+    # Уменьшенные копии картинки (site_app/imaging.py)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Остаток для продажи; NULL — количество не отслеживается
+    stock = models.PositiveIntegerField(blank=True, null=True)
+    # Сколько единиц держат неоплаченные заказы (уже вычтено из stock)
+    reserved = models.PositiveIntegerField(default=0)
+
+    def save(self, *args, **kwargs):
+        save_with_image_variants(self, *args, **kwargs)
 
     def __str__(self):
         return self.title
@@ -43,6 +68,13 @@ class CartItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
 
+    class Meta:
+        # В корзине только то, что ещё не заказано: при оформлении строки переходят в OrderProduct и удаляются.
+        # Индекс (user_id, product_id) обслуживает чтение корзины и INSERT ... ON CONFLICT в services.cart
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'product'], name='uniq_cart_item'),
+        ]
+
     def get_total_price(self):
         return self.product.price * self.quantity
 
@@ -105,9 +137,20 @@ class Order(models.Model):
         PAID = 'paid', 'Paid'
         CANCELED = 'canceled', 'Canceled'
 
+    # Новый статус -> из каких в него можно перейти (set_status). Отклонённый заказ снова уходит
+    # на проверку, когда клиент присылает другой чек; отменить можно и оплаченный (возврат)
+    TRANSITIONS = {
+        Status.AWAITING_PROOF: (Status.PENDING_PAYMENT_LINK,),
+        Status.UNDER_REVIEW: (Status.PENDING_PAYMENT_LINK, Status.AWAITING_PROOF, Status.REJECTED),
+        Status.PAID: (Status.PENDING_PAYMENT_LINK, Status.AWAITING_PROOF, Status.UNDER_REVIEW),
+        Status.REJECTED: (Status.PENDING_PAYMENT_LINK, Status.AWAITING_PROOF, Status.UNDER_REVIEW),
+        Status.CANCELED: (
+            Status.PENDING_PAYMENT_LINK, Status.AWAITING_PROOF, Status.UNDER_REVIEW, Status.REJECTED, Status.PAID,
+        ),
+    }
+
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders', blank=True, null=True)
     telegram_user = models.ForeignKey(TelegramUser, on_delete=models.CASCADE, related_name='tg_orders', blank=True, null=True)
-    items = models.ManyToManyField(CartItem)
     total_price = models.DecimalField(max_digits=12, decimal_places=2)
     total_uzs = models.DecimalField(max_digits=18, decimal_places=2, default=Decimal('0'))
     created_at = models.DateTimeField(auto_now_add=True)
@@ -117,7 +160,7 @@ class Order(models.Model):
     payment_comment = models.TextField(blank=True, default='')
     payment_reminder_sent_at = models.DateTimeField(blank=True, null=True)
     customer_name = models.CharField(max_length=200, blank=True, default='')
-    customer_phone = models.CharField(max_length=100, blank=True, default='')
+    customer_phone = models.CharField(max_length=100, blank=True, default='', db_index=True)
     
     # Delivery information
     address = models.TextField(blank=True, null=True)
@@ -127,6 +170,11 @@ class Order(models.Model):
 
     class Meta:
         ordering = ('-created_at',)
+        indexes = [
+            # История заказов: keyset-пагинация по (created_at, id) для каждого покупателя
+            models.Index(fields=('telegram_user', '-created_at', '-id'), name='order_tg_history_idx'),
+            models.Index(fields=('user', '-created_at', '-id'), name='order_user_history_idx'),
+        ]
 
     def __str__(self):
         if self.user:
@@ -143,36 +191,75 @@ class Order(models.Model):
             return "telegram"
         return "website"
 
+    SOURCE_LABELS = {
+        "site_user": "Site user",
+        "telegram": "Telegram",
+        "website": "Website",
+    }
+
     def source_label(self) -> str:
-        mapping = {
-            "site_user": "Site user",
-            "telegram": "Telegram",
-            "website": "Website",
-        }
-        return mapping.get(self.source, "Unknown")
+        return self.SOURCE_LABELS.get(self.source, "Unknown")
 
     @property
     def formatted_total(self) -> str:
         """Возвращает отформатированную сумму заказа"""
-        return format_sum(self.total_uzs or self.total_price)
+        return self.format_total(self.total_uzs, self.total_price)
+
+    @staticmethod
+    def format_total(total_uzs, total_price) -> str:
+        """То же для строк из .values(): сумма в сумах, если задана, иначе total_price"""
+        return format_sum(total_uzs or total_price)
+
+    def save(self, *args, **kwargs):
+        is_new = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if is_new:
+                from .rollups import record_order_created
+                record_order_created(self)
+
+    def can_transition(self, new_status: str) -> bool:
+        return self.status in self.TRANSITIONS.get(new_status, ())
+
+    def set_status(self, new_status: str, changed_by: Optional[User] = None, comment: str = '') -> bool:
+        """
+        Установить новый статус заказа с сохранением истории.
+        Один UPDATE ... WHERE status = <прочитанный статус> (он должен быть в TRANSITIONS): из двух
+        одновременных запросов выигрывает один, второй получает False без лишних чтений и без записи в историю.
+        """
+        if not self.can_transition(new_status):
+            return False
 
-    def set_status(self, new_status: str, changed_by: Optional[User] = None, comment: str = ''):
-        """Установить новый статус заказа с сохранением истории"""
-        if new_status == self.status:
-            return
-        
         previous_status = self.status
-        self.status = new_status
-        self.save(update_fields=['status'])
-        
-        # Создаем запись в истории изменений статуса
-        OrderStatusHistory.objects.create(
-            order=self,
-            previous_status=previous_status,
-            new_status=new_status,
-            changed_by=changed_by,
-            comment=comment,
-        )
+        with transaction.atomic():
+            if not Order.objects.filter(pk=self.pk, status=previous_status).update(status=new_status):
+                return False
+            self.status = new_status
+
+            # Создаем запись в истории изменений статуса
+            OrderStatusHistory.objects.create(
+                order=self,
+                previous_status=previous_status,
+                new_status=new_status,
+                changed_by=changed_by,
+                comment=comment,
+            )
+            self.status_changed(previous_status, new_status)
+        return True
+
+    def status_changed(self, previous_status: str, new_status: str):
+        """Сводки, резервы склада и событие для подписчиков после записи статуса (UPDATE и история уже сделаны)"""
+        from .rollups import record_status_change
+        record_status_change(self, previous_status, new_status)
+
+        from .inventory import commit_reservations, release_reservations
+        if new_status == self.Status.PAID:
+            commit_reservations(self)
+        elif new_status in (self.Status.CANCELED, self.Status.REJECTED):
+            release_reservations(self)
+
+        from .events import publish_order_status
+        transaction.on_commit(partial(publish_order_status, self.pk, previous_status, new_status))
 
 
 class OrderProduct(models.Model):
@@ -222,6 +309,17 @@ class Payment(models.Model):
         PAID = 'paid', 'Paid'
         REJECTED = 'rejected', 'Rejected'
 
+    # Новый статус -> из каких в него можно перейти (transition). После отклонения платёж остаётся
+    # активным, и новый чек снова отправляет его на проверку
+    TRANSITIONS = {
+        Status.UNDER_REVIEW: (Status.AWAITING_PROOF, Status.REJECTED),
+        Status.PAID: (Status.AWAITING_PROOF, Status.UNDER_REVIEW),
+        Status.REJECTED: (Status.AWAITING_PROOF, Status.UNDER_REVIEW),
+    }
+    REVIEWED_STATUSES = (Status.PAID, Status.REJECTED)
+    # Оплаченный платёж закрыт; отклонённый остаётся активным (см. TRANSITIONS)
+    CLOSED_STATUSES = (Status.PAID,)
+
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='payments')
     amount_uzs = models.DecimalField(max_digits=18, decimal_places=2)
     provider = models.CharField(max_length=100)
@@ -238,49 +336,112 @@ class Payment(models.Model):
         indexes = [
             models.Index(fields=('status', 'is_active')),
         ]
+        constraints = [
+            # Один активный платёж на заказ — частичный уникальный индекс вместо запроса в clean()
+            models.UniqueConstraint(
+                fields=('order',),
+                condition=models.Q(is_active=True),
+                name='payment_one_active_per_order',
+                violation_error_message="Only one active payment is allowed per order.",
+            ),
+        ]
 
     def __str__(self):
         return f"Payment #{self.pk} for Order #{self.order_id} - {self.status}"
 
+    @classmethod
+    def status_changes(cls, new_status: str, now=None) -> dict:
+        """Поля, которые меняются вместе со статусом: одно правило для save(), transition() и массовой модерации"""
+        changes = {}
+        if new_status in cls.REVIEWED_STATUSES:
+            changes['reviewed_at'] = now or timezone.now()
+        if new_status in cls.CLOSED_STATUSES:
+            changes['is_active'] = False
+        return changes
+
     def clean(self):
-        if self.amount_uzs <= 0:
+        self.check_rules()
+
+    def check_rules(self, fields: Optional[set] = None):
+        """Правила платежа; fields — только эти поля изменились (save(update_fields=...)), остальные не проверяем"""
+        def changed(*names):
+            return fields is None or any(name in fields for name in names)
+
+        if changed('amount_uzs') and self.amount_uzs <= 0:
             raise ValidationError("Payment amount must be positive.")
-        if self.order and self.amount_uzs != (self.order.total_uzs or self.order.total_price):
+        if changed('amount_uzs', 'order') and self.order_id and self.amount_uzs != (self.order.total_uzs or self.order.total_price):
             raise ValidationError("Payment amount must match order total.")
-        if self.status == self.Status.REJECTED and not self.rejection_reason:
+        if changed('status', 'rejection_reason') and self.status == self.Status.REJECTED and not self.rejection_reason:
             raise ValidationError("Rejection reason is required when payment is rejected.")
-        if self.is_active and self.order_id:
-            qs = Payment.objects.filter(order_id=self.order_id, is_active=True)
-            if self.pk:
-                qs = qs.exclude(pk=self.pk)
-            if qs.exists():
-                raise ValidationError("Only one active payment is allowed per order.")
 
     def save(self, *args, **kwargs):
-        is_new = self.pk is None
-        self.full_clean()
+        is_new = self._state.adding
+        update_fields = kwargs.get('update_fields')
+        fields = None if update_fields is None else set(update_fields)
+        # Связи проверяет внешний ключ, «один активный» — индекс: clean_fields без запросов к базе
+        exclude = [field.name for field in self._meta.concrete_fields if field.is_relation]
+        if fields is not None:
+            exclude += [field.name for field in self._meta.concrete_fields if field.name not in fields and field.attname not in fields]
+        self.clean_fields(exclude=exclude)
+        self.check_rules(fields)
 
         with transaction.atomic():
-            if self.status in {self.Status.PAID, self.Status.REJECTED}:
-                self.is_active = False
-                if self.status in {self.Status.PAID, self.Status.REJECTED} and not self.reviewed_at:
-                    self.reviewed_at = timezone.now()
+            if fields is None or 'status' in fields:
+                changes = self.status_changes(self.status)
+                if self.reviewed_at:
+                    changes.pop('reviewed_at', None)
+                for field, value in changes.items():
+                    setattr(self, field, value)
+                if fields is not None and changes:
+                    kwargs['update_fields'] = fields | set(changes)
+
+            if self.is_active and (is_new or fields is None or 'is_active' in fields):
+                # До записи: иначе новый активный платёж упрётся в payment_one_active_per_order
+                Payment.objects.filter(order_id=self.order_id, is_active=True).exclude(pk=self.pk).update(is_active=False)
 
             result = super().save(*args, **kwargs)
 
-            if self.is_active:
-                Payment.objects.filter(order=self.order, is_active=True).exclude(pk=self.pk).update(is_active=False)
-
+            from .events import publish_payment
+            transaction.on_commit(partial(publish_payment, self.order_id, self.pk, self.status, self.is_active))
             return result
 
+    def transition(self, new_status: str, **changes) -> bool:
+        """
+        Перевести платёж в new_status одним UPDATE ... WHERE status IN (TRANSITIONS[new_status]) вместе с changes.
+        False — платёж уже обработан (другим админом или раньше); тогда ничего не записано.
+        """
+        allowed = self.TRANSITIONS.get(new_status, ())
+        if self.status not in allowed:
+            return False
+        now = timezone.now()
+        changes = {'status': new_status, 'updated_at': now, **self.status_changes(new_status, now), **changes}
+        with transaction.atomic():
+            if not Payment.objects.filter(pk=self.pk, status__in=allowed).update(**changes):
+                return False
+            for field, value in changes.items():
+                setattr(self, field, value)
+            from .events import publish_payment
+            transaction.on_commit(partial(publish_payment, self.order_id, self.pk, self.status, self.is_active))
+        return True
+
     @property
     def formatted_amount(self) -> str:
         return format_sum(self.amount_uzs)
 
 
+def payment_proof_upload_to(instance, filename: str) -> str:
+    """Имя чека не зависит от исходного имени файла: одинаковые скриншоты — один файл payment_proofs/proof.<hash>.jpg"""
+    ext = os.path.splitext(filename)[1].lower()
+    return f"payment_proofs/proof{'.jpg' if ext == '.jpeg' else ext}"
+
+
 class PaymentProof(models.Model):
     payment = models.ForeignKey(Payment, on_delete=models.CASCADE, related_name='proofs')
-    image = models.ImageField(upload_to='payment_proofs/', blank=True, null=True)
+    image = models.ImageField(upload_to=payment_proof_upload_to, blank=True, null=True)
+    # sha256 картинки: повторная загрузка того же файла к платежу не создаёт новый чек
+    content_hash = models.CharField(max_length=64, blank=True, default='', editable=False)
+    # Уменьшенные копии картинки (site_app/imaging.py)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     telegram_file_id = models.CharField(max_length=255, blank=True, null=True)
     submitted_by_user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='payment_proofs')
     submitted_by_telegram = models.ForeignKey(TelegramUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='payment_proofs')
@@ -294,10 +455,31 @@ class PaymentProof(models.Model):
             ('payment', 'telegram_file_id'),
             ('payment', 'message_id'),
         )
+        indexes = [
+            # Последний чек платежа без сортировки (services.latest_payment_proof)
+            models.Index(fields=('payment', '-submitted_at', '-id'), name='proof_latest_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=('payment', 'content_hash'),
+                condition=~models.Q(content_hash=''),
+                name='proof_payment_hash_uniq',
+            ),
+        ]
 
     def __str__(self):
         return f"PaymentProof #{self.pk} for Payment #{self.payment_id}"
 
+    def save(self, *args, **kwargs):
+        if self.image and not self.image._committed:
+            from .storage import full_digest
+            self.content_hash = full_digest(self.image.file)
+        elif not self.image:
+            self.content_hash = ''
+        save_with_image_variants(self, *args, **kwargs)
+        from .proof_mirror import schedule
+        schedule(self)
+
     def clean(self):
         if not self.image and not self.telegram_file_id:
             raise ValidationError("Either image or telegram_file_id must be provided.")
@@ -318,3 +500,102 @@ class OrderStatusHistory(models.Model):
 
     def __str__(self):
         return f"Order #{self.order_id}: {self.previous_status or 'none'} → {self.new_status}"
+
+
+class DailySourceRevenue(models.Model):
+    """Выручка по дням и источникам заказа (по дате оплаты)"""
+    date = models.DateField()
+    source = models.CharField(max_length=20)
+    orders_count = models.IntegerField(default=0)
+    revenue_uzs = models.DecimalField(max_digits=18, decimal_places=2, default=Decimal('0'))
+
+    class Meta:
+        ordering = ('-date', 'source')
+        verbose_name = "Daily revenue by source"
+        verbose_name_plural = "Daily revenue by source"
+        constraints = [
+            models.UniqueConstraint(fields=('date', 'source'), name='uniq_daily_source_revenue'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.source}: {format_sum(self.revenue_uzs)}"
+
+
+class DailyProductSales(models.Model):
+    """Проданные единицы и выручка по товару за день (по дате оплаты)"""
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    units = models.IntegerField(default=0)
+    revenue_uzs = models.DecimalField(max_digits=18, decimal_places=2, default=Decimal('0'))
+
+    class Meta:
+        ordering = ('-date', 'product')
+        verbose_name = "Daily product sales"
+        verbose_name_plural = "Daily product sales"
+        constraints = [
+            models.UniqueConstraint(fields=('date', 'product'), name='uniq_daily_product_sales'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} product #{self.product_id}: {self.units}"
+
+
+class DailyOrderStatusCount(models.Model):
+    """Сколько заказов, созданных в этот день, сейчас находятся в каждом статусе"""
+    date = models.DateField()
+    status = models.CharField(max_length=32, choices=Order.Status.choices)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ('-date', 'status')
+        verbose_name = "Daily orders by status"
+        verbose_name_plural = "Daily orders by status"
+        constraints = [
+            models.UniqueConstraint(fields=('date', 'status'), name='uniq_daily_order_status'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.status}: {self.count}"
+
+
+class StockReservation(models.Model):
+    class Status(models.TextChoices):
+        ACTIVE = 'active', 'Active'
+        COMMITTED = 'committed', 'Committed'
+        RELEASED = 'released', 'Released'
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='stock_reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_reservations')
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.ACTIVE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ('-created_at',)
+        constraints = [
+            models.UniqueConstraint(fields=('order', 'product'), name='uniq_stock_reservation'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x product #{self.product_id} for Order #{self.order_id} ({self.status})"
+
+
+class IdempotencyKey(models.Model):
+    """Сохранённый ответ на запрос с заголовком Idempotency-Key"""
+    scope = models.CharField(max_length=50)
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    # NULL, пока первый запрос ещё выполняется
+    status_code = models.PositiveSmallIntegerField(blank=True, null=True)
+    response_body = models.JSONField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=('scope', 'key'), name='uniq_idempotency_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}:{self.key} ({self.status_code or 'in progress'})"
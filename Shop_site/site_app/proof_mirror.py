@@ -0,0 +1,149 @@
+"""
+Копии чеков из Telegram в MEDIA_ROOT.
+
+Бот присылает только telegram_file_id, поэтому у такого чека нет image и веб-админка его не видит.
+После сохранения чека задача уходит в пул потоков (PROOF_MIRROR_WORKERS; 0 — сразу в том же потоке):
+getFile -> скачивание кусками во временный файл (не больше PAYMENT_PROOF_MAX_BYTES) -> PaymentProof.image
+и уменьшенные копии (site_app/imaging.py). Один file_id скачивается один раз: следующие чеки с ним
+получают тот же файл. Старые чеки: manage.py mirror_payment_proofs.
+"""
+import logging
+import tempfile
+import threading
+from concurrent.futures import Future
+from functools import partial
+from typing import Optional
+
+import requests
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from . import background, imaging
+from .models import PaymentProof, payment_proof_upload_to
+from .storage import full_digest
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+
+class MirrorError(Exception):
+    pass
+
+
+class TelegramFileClient:
+    """getFile и скачивание файла через Bot API; HTTP-сессия своя у каждого потока"""
+
+    def __init__(self, token: str, base_url: str, timeout: int = 30):
+        self.token = token
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def download(self, file_id: str, destination, max_size: int) -> str:
+        """Пишет файл в destination (бинарный файл) и возвращает file_path из getFile"""
+        response = self.session.get(
+            f'{self.base_url}/bot{self.token}/getFile', params={'file_id': file_id}, timeout=self.timeout,
+        )
+        try:
+            # Ошибки Bot API приходят JSON-ом с description и кодом 4xx
+            payload = response.json()
+        except ValueError:
+            response.raise_for_status()
+            raise MirrorError('getFile returned no JSON')
+        if not payload.get('ok'):
+            raise MirrorError(payload.get('description') or 'getFile failed')
+        result = payload['result']
+        if (result.get('file_size') or 0) > max_size:
+            raise MirrorError(f"file is larger than {max_size} bytes")
+
+        received = 0
+        url = f"{self.base_url}/file/bot{self.token}/{result['file_path']}"
+        with self.session.get(url, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(CHUNK_SIZE):
+                received += len(chunk)
+                if received > max_size:
+                    raise MirrorError(f"file is larger than {max_size} bytes")
+                destination.write(chunk)
+        return result['file_path']
+
+
+def get_client() -> Optional[TelegramFileClient]:
+    if not settings.BOT_TOKEN:
+        return None
+    return TelegramFileClient(settings.BOT_TOKEN, settings.TELEGRAM_API_URL)
+
+
+def needs_mirror(proof) -> bool:
+    return bool(proof.telegram_file_id) and not proof.image
+
+
+def _without_image():
+    return Q(image='') | Q(image__isnull=True)
+
+
+def _download(client: TelegramFileClient, file_id: str):
+    """Скачивает файл в MEDIA_ROOT; (имя, sha256)"""
+    with tempfile.TemporaryFile() as buffer:
+        file_path = client.download(file_id, buffer, settings.PAYMENT_PROOF_MAX_BYTES)
+        content = File(buffer, name=file_path)
+        content.content_hash = full_digest(content)
+        content.seek(0)
+        name = default_storage.save(payment_proof_upload_to(None, file_path), content)
+    return name, content.content_hash
+
+
+def mirror(pk: int, client: Optional[TelegramFileClient] = None) -> bool:
+    """Копия одного чека; False — копировать нечего (уже есть image, нет file_id или не задан BOT_TOKEN)"""
+    client = client or get_client()
+    proof = PaymentProof.objects.filter(pk=pk).only('payment_id', 'telegram_file_id', 'image').first()
+    if client is None or proof is None or not needs_mirror(proof):
+        return False
+
+    done = (
+        PaymentProof.objects
+        .filter(telegram_file_id=proof.telegram_file_id)
+        .exclude(_without_image())
+        .values('image', 'content_hash')
+        .first()
+    )
+    if done:
+        name, content_hash = done['image'], done['content_hash']
+    else:
+        try:
+            name, content_hash = _download(client, proof.telegram_file_id)
+        except (requests.RequestException, MirrorError, OSError, ValueError) as exc:
+            logger.warning("Could not mirror Telegram file for proof #%s: %s", pk, exc)
+            return False
+
+    # Тот же файл уже есть у другого чека этого платежа (см. proof_payment_hash_uniq): хеш не ставим
+    if content_hash and PaymentProof.objects.filter(payment_id=proof.payment_id, content_hash=content_hash).exists():
+        content_hash = ''
+    try:
+        with transaction.atomic():
+            updated = PaymentProof.objects.filter(_without_image(), pk=pk).update(image=name, content_hash=content_hash)
+    except IntegrityError:
+        updated = PaymentProof.objects.filter(_without_image(), pk=pk).update(image=name)
+    if updated:
+        imaging.generate(PaymentProof, pk)
+    return bool(updated)
+
+
+def submit(pk: int) -> Optional[Future]:
+    return background.submit('proof-mirror', 'PROOF_MIRROR_WORKERS', mirror, pk)
+
+
+def schedule(proof):
+    """Вызывается из PaymentProof.save(): после commit ставит скачивание в очередь, если картинки ещё нет"""
+    if settings.BOT_TOKEN and needs_mirror(proof):
+        transaction.on_commit(partial(submit, proof.pk))
@@ -0,0 +1,229 @@
+"""
+Инкрементальные агрегаты продаж для дашборда в админке.
+
+Агрегаты обновляются в той же транзакции, что и смена статуса заказа:
+- DailyOrderStatusCount — по дате создания заказа, при создании и каждой смене статуса;
+- DailySourceRevenue / DailyProductSales — по дате оплаты, когда заказ становится PAID,
+  и откатываются, если оплаченный заказ потом отменяют.
+Команда ``manage.py backfill_sales_rollups`` пересчитывает их по всей истории.
+"""
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Dict, Optional
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, CharField, Count, F, Max, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import (
+    DailyOrderStatusCount,
+    DailyProductSales,
+    DailySourceRevenue,
+    Order,
+    OrderProduct,
+    OrderStatusHistory,
+)
+
+
+def _bump(model, keys: dict, **deltas):
+    """UPDATE ... SET x = x + delta, а если строки ещё нет — создаём её"""
+    updates = {field: F(field) + delta for field, delta in deltas.items()}
+    if model.objects.filter(**keys).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**keys, **deltas)
+    except IntegrityError:
+        # Строку успел создать параллельный запрос
+        model.objects.filter(**keys).update(**updates)
+
+
+def record_order_created(order: Order):
+    _bump(
+        DailyOrderStatusCount,
+        {'date': timezone.localdate(order.created_at), 'status': order.status},
+        count=1,
+    )
+
+
+def record_status_change(order: Order, previous_status: Optional[str], new_status: str):
+    day = timezone.localdate(order.created_at)
+    if previous_status:
+        _bump(DailyOrderStatusCount, {'date': day, 'status': previous_status}, count=-1)
+    _bump(DailyOrderStatusCount, {'date': day, 'status': new_status}, count=1)
+
+    if new_status == Order.Status.PAID:
+        _record_sale(order, timezone.localdate(), 1)
+    elif previous_status == Order.Status.PAID:
+        # Оплаченный заказ отменили — убираем выручку из того дня, когда его оплатили
+        paid_at = (
+            OrderStatusHistory.objects
+            .filter(order=order, new_status=Order.Status.PAID)
+            .aggregate(paid_at=Max('changed_at'))['paid_at']
+        )
+        _record_sale(order, timezone.localdate(paid_at) if paid_at else timezone.localdate(), -1)
+
+
+def _record_sale(order: Order, day: date, sign: int):
+    revenue = order.total_uzs or order.total_price or Decimal('0')
+    _bump(
+        DailySourceRevenue,
+        {'date': day, 'source': order.source},
+        orders_count=sign,
+        revenue_uzs=sign * revenue,
+    )
+
+    per_product: Dict[int, list] = defaultdict(lambda: [0, Decimal('0')])
+    for product_id, quantity, price in order.order_products.values_list('product_id', 'quantity', 'price_uzs'):
+        per_product[product_id][0] += quantity
+        per_product[product_id][1] += quantity * price
+    for product_id, (units, product_revenue) in per_product.items():
+        _bump(
+            DailyProductSales,
+            {'date': day, 'product_id': product_id},
+            units=sign * units,
+            revenue_uzs=sign * product_revenue,
+        )
+
+
+SOURCE_EXPRESSION = Case(
+    When(user_id__isnull=False, then=Value('site_user')),
+    When(telegram_user_id__isnull=False, then=Value('telegram')),
+    default=Value('website'),
+    output_field=CharField(),
+)
+
+
+def rebuild(since: Optional[date] = None) -> Dict[str, int]:
+    """Пересчитать агрегаты с нуля (начиная с даты ``since``, если она задана)"""
+    since_dt = timezone.make_aware(datetime.combine(since, time.min)) if since else None
+
+    with transaction.atomic():
+        for model in (DailyOrderStatusCount, DailySourceRevenue, DailyProductSales):
+            stale = model.objects.all()
+            if since:
+                stale = stale.filter(date__gte=since)
+            stale.delete()
+
+        orders = Order.objects.all()
+        if since_dt:
+            orders = orders.filter(created_at__gte=since_dt)
+        status_rows = [
+            DailyOrderStatusCount(date=row['day'], status=row['status'], count=row['count'])
+            for row in (
+                orders
+                .annotate(day=TruncDate('created_at'))
+                .values('day', 'status')
+                .annotate(count=Count('id'))
+                .order_by()
+            )
+        ]
+        DailyOrderStatusCount.objects.bulk_create(status_rows, batch_size=1000)
+
+        paid_orders = (
+            Order.objects
+            .filter(status=Order.Status.PAID)
+            .annotate(
+                paid_at=Coalesce(
+                    Max('status_history__changed_at', filter=Q(status_history__new_status=Order.Status.PAID)),
+                    'created_at',
+                ),
+                source_key=SOURCE_EXPRESSION,
+            )
+        )
+        if since_dt:
+            paid_orders = paid_orders.filter(paid_at__gte=since_dt)
+
+        paid_day: Dict[int, date] = {}
+        revenue: Dict[tuple, list] = defaultdict(lambda: [0, Decimal('0')])
+        for order_id, paid_at, source, total_uzs, total_price in (
+            paid_orders.values_list('id', 'paid_at', 'source_key', 'total_uzs', 'total_price').iterator(chunk_size=2000)
+        ):
+            day = timezone.localdate(paid_at)
+            paid_day[order_id] = day
+            revenue[(day, source)][0] += 1
+            revenue[(day, source)][1] += total_uzs or total_price or Decimal('0')
+        DailySourceRevenue.objects.bulk_create(
+            [
+                DailySourceRevenue(date=day, source=source, orders_count=count, revenue_uzs=amount)
+                for (day, source), (count, amount) in revenue.items()
+            ],
+            batch_size=1000,
+        )
+
+        products: Dict[tuple, list] = defaultdict(lambda: [0, Decimal('0')])
+        order_products = (
+            OrderProduct.objects
+            .filter(order__status=Order.Status.PAID)
+            .values_list('order_id', 'product_id', 'quantity', 'price_uzs')
+            .iterator(chunk_size=2000)
+        )
+        for order_id, product_id, quantity, price in order_products:
+            day = paid_day.get(order_id)
+            if day is None:
+                continue
+            products[(day, product_id)][0] += quantity
+            products[(day, product_id)][1] += quantity * price
+        DailyProductSales.objects.bulk_create(
+            [
+                DailyProductSales(date=day, product_id=product_id, units=units, revenue_uzs=amount)
+                for (day, product_id), (units, amount) in products.items()
+            ],
+            batch_size=1000,
+        )
+
+    return {
+        'status_rows': len(status_rows),
+        'revenue_rows': len(revenue),
+        'product_rows': len(products),
+    }
+
+
+def dashboard_summary(days: int = 30) -> dict:
+    """Данные для дашборда — читаются только из агрегатов"""
+    start = timezone.localdate() - timedelta(days=days - 1)
+
+    revenue = DailySourceRevenue.objects.filter(date__gte=start)
+    by_source = [
+        dict(row, label=Order.SOURCE_LABELS.get(row['source'], row['source']))
+        for row in (
+            revenue.values('source')
+            .annotate(orders=Sum('orders_count'), revenue=Sum('revenue_uzs'))
+            .order_by('-revenue')
+        )
+    ]
+    by_day = list(
+        revenue.values('date')
+        .annotate(orders=Sum('orders_count'), revenue=Sum('revenue_uzs'))
+        .order_by('-date')
+    )
+    top_products = list(
+        DailyProductSales.objects.filter(date__gte=start)
+        .values('product_id', 'product__title')
+        .annotate(units=Sum('units'), revenue=Sum('revenue_uzs'))
+        .filter(units__gt=0)
+        .order_by('-revenue')[:10]
+    )
+    labels = dict(Order.Status.choices)
+    by_status = [
+        {'status': row['status'], 'label': labels.get(row['status'], row['status']), 'count': row['count']}
+        for row in (
+            DailyOrderStatusCount.objects.filter(date__gte=start)
+            .values('status')
+            .annotate(count=Sum('count'))
+            .order_by('-count')
+        )
+    ]
+
+    return {
+        'start': start,
+        'days': days,
+        'total_revenue': sum((row['revenue'] for row in by_source), Decimal('0')),
+        'total_orders': sum(row['orders'] for row in by_source),
+        'by_source': by_source,
+        'by_day': by_day,
+        'top_products': top_products,
+        'by_status': by_status,
+    }
@@ -1,3 +1,6 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.storage import default_storage
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import (
@@ -14,23 +17,61 @@ from .models import (
     OrderStatusHistory,
     format_sum,
 )
-
-
-class CategorySerializer(serializers.ModelSerializer):
+from .imaging import FORMATS as IMAGE_FORMATS
+
+
+def image_variants_data(obj, request=None) -> dict:
+    """
+    Уменьшенные копии (site_app/imaging.py) для клиента:
+    {'thumb': {'width', 'height', 'webp', 'jpeg'}, 'card': ..., 'full': ..., 'srcset': {'webp': 'url 160w, ...', 'jpeg': ...}}.
+    Пусто, пока копии текущей картинки не готовы — тогда берите image.
+    """
+    variants = obj.image_variants or {}
+    if not obj.image or variants.get('source') != obj.image.name:
+        return {}
+
+    def url(name):
+        value = default_storage.url(name)
+        return request.build_absolute_uri(value) if request else value
+
+    data = {}
+    for size_name in settings.IMAGE_DERIVATIVE_SIZES:
+        variant = variants.get(size_name)
+        if variant:
+            data[size_name] = {
+                'width': variant['width'],
+                'height': variant['height'],
+                **{fmt: url(variant[fmt]) for fmt in IMAGE_FORMATS if fmt in variant},
+            }
+    data['srcset'] = {
+        fmt: ', '.join(f"{item[fmt]} {item['width']}w" for item in data.values() if fmt in item)
+        for fmt in IMAGE_FORMATS
+    }
+    return data
+
+
+class ImageVariantsMixin(serializers.Serializer):
+    image_variants = serializers.SerializerMethodField()
+
+    def get_image_variants(self, obj):
+        return image_variants_data(obj, self.context.get('request'))
+
+
+class CategorySerializer(ImageVariantsMixin, serializers.ModelSerializer):
     parent = serializers.PrimaryKeyRelatedField(read_only=True)
     image = serializers.ImageField(read_only=True)
     class Meta:
         model = Category
-        fields = ['id', 'name', 'name_uz', 'slug', 'parent', 'image']
+        fields = ['id', 'name', 'name_uz', 'slug', 'parent', 'image', 'image_variants']
 
 
-class ProductListSerializer(serializers.ModelSerializer):
+class ProductListSerializer(ImageVariantsMixin, serializers.ModelSerializer):
     category = serializers.CharField(source='category.name', read_only=True)
     image = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
-        fields = ['id', 'title', 'title_uz', 'price', 'category', 'image']
+        fields = ['id', 'title', 'title_uz', 'price', 'stock', 'category', 'image', 'image_variants']
     
     def get_image(self, obj):
         if obj.image:
@@ -42,13 +83,16 @@ class ProductListSerializer(serializers.ModelSerializer):
         return None
 
 
-class ProductDetailSerializer(serializers.ModelSerializer):
+class ProductDetailSerializer(ImageVariantsMixin, serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     image = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
-        fields = ['id', 'title', 'title_uz', 'description', 'description_uz', 'price', 'image', 'category', 'created_at']
+        fields = [
+            'id', 'title', 'title_uz', 'description', 'description_uz', 'price', 'stock', 'image', 'image_variants',
+            'category', 'created_at',
+        ]
     
     def get_image(self, obj):
         if obj.image:
@@ -91,6 +135,21 @@ class CartSerializer(serializers.Serializer):
     total_price = serializers.DecimalField(max_digits=10, decimal_places=2)
 
 
+class CartSyncItemSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=0, default=1)
+
+
+class CartSyncSerializer(serializers.Serializer):
+    items = CartSyncItemSerializer(many=True, allow_empty=True)
+
+    def validate_items(self, value):
+        limit = settings.CART_SYNC_MAX_ITEMS
+        if len(value) > limit:
+            raise serializers.ValidationError(f'At most {limit} items per cart.')
+        return value
+
+
 class FavoriteSerializer(serializers.ModelSerializer):
     product = ProductShortSerializer(read_only=True)
 
@@ -119,7 +178,7 @@ class OrderItemSerializer(serializers.ModelSerializer):
         return obj.total_price
 
 
-class PaymentProofSerializer(serializers.ModelSerializer):
+class PaymentProofSerializer(ImageVariantsMixin, serializers.ModelSerializer):
     submitted_by = serializers.SerializerMethodField()
     image_url = serializers.SerializerMethodField()
 
@@ -133,6 +192,7 @@ class PaymentProofSerializer(serializers.ModelSerializer):
             'message_id',
             'image',
             'image_url',
+            'image_variants',
             'submitted_by',
         ]
         read_only_fields = fields
@@ -156,8 +216,9 @@ class PaymentProofSerializer(serializers.ModelSerializer):
 class PaymentSerializer(serializers.ModelSerializer):
     formatted_amount = serializers.SerializerMethodField()
     proofs = serializers.SerializerMethodField()
+    proof_preview = serializers.SerializerMethodField()
     reviewed_by = serializers.SerializerMethodField()
-    order_id = serializers.IntegerField(source='order_id', read_only=True)
+    order_id = serializers.IntegerField(read_only=True)
     order_status = serializers.CharField(source='order.status', read_only=True)
 
     class Meta:
@@ -177,12 +238,28 @@ class PaymentSerializer(serializers.ModelSerializer):
             'reviewed_by',
             'reviewed_at',
             'proofs',
+            'proof_preview',
         ]
         read_only_fields = fields
 
     def get_formatted_amount(self, obj):
         return obj.formatted_amount
 
+    def get_proof_preview(self, obj):
+        """Миниатюра последнего чека для списка; только с include_proof_preview и prefetch_related('proofs')"""
+        if not self.context.get('include_proof_preview', False):
+            return None
+        request = self.context.get('request')
+        for proof in obj.proofs.all():
+            if not proof.image:
+                continue
+            thumb = image_variants_data(proof, request).get('thumb')
+            if thumb:
+                return thumb.get('jpeg') or thumb.get('webp')
+            url = proof.image.url
+            return request.build_absolute_uri(url) if request else url
+        return None
+
     def get_proofs(self, obj):
         include = self.context.get('include_proofs', False)
         if not include:
@@ -273,7 +350,8 @@ class CheckoutRequestSerializer(serializers.Serializer):
     customer_phone = serializers.CharField(required=False, allow_blank=True)
 
     def validate(self, attrs):
-        user = self.context.get('request').user if self.context.get('request') else None
+        request = self.context.get('request')
+        user = self.context['user'] if 'user' in self.context else (request.user if request else None)
         has_user_cart = bool(user and user.is_authenticated)
         if not attrs.get('cart_items') and not has_user_cart:
             raise serializers.ValidationError("Either provide cart_items or use an authenticated user with a cart.")
@@ -300,10 +378,11 @@ class PaymentProofCreateSerializer(serializers.Serializer):
     order_id = serializers.IntegerField(required=False)
     payment_id = serializers.IntegerField(required=False)
     telegram_user_id = serializers.IntegerField(required=False)
-    telegram_file_id = serializers.CharField(required=False, allow_blank=True)
-    message_id = serializers.CharField(required=False, allow_blank=True)
+    telegram_file_id = serializers.CharField(required=False, allow_blank=True, max_length=255)
+    message_id = serializers.CharField(required=False, allow_blank=True, max_length=128)
     comment = serializers.CharField(required=False, allow_blank=True)
-    image = serializers.ImageField(required=False)
+    # Картинку декодирует services.submit_payment_proof, и только если это не повтор уже присланного файла
+    image = serializers.FileField(required=False)
 
     def validate(self, attrs):
         order_id = attrs.get('order_id')
@@ -318,10 +397,46 @@ class PaymentProofCreateSerializer(serializers.Serializer):
         return attrs
 
 
+def validate_proof_image(image):
+    """Проверка, что файл чека — картинка (Pillow); ошибка — как у поля image сериализатора"""
+    try:
+        return serializers.ImageField().run_validation(image)
+    except serializers.ValidationError as exc:
+        raise serializers.ValidationError({'image': exc.detail})
+    except DjangoValidationError as exc:
+        raise serializers.ValidationError({'image': exc.messages})
+
+
 class PaymentModerationSerializer(serializers.Serializer):
     reason = serializers.CharField(required=False, allow_blank=True)
 
 
+class PaymentDecisionSerializer(serializers.Serializer):
+    APPROVE = 'approve'
+    REJECT = 'reject'
+
+    payment_id = serializers.IntegerField(min_value=1)
+    action = serializers.ChoiceField(choices=[APPROVE, REJECT])
+    reason = serializers.CharField(required=False, allow_blank=True, max_length=1000, default='')
+
+    def validate(self, attrs):
+        attrs['reason'] = attrs['reason'].strip()
+        if attrs['action'] == self.REJECT and not attrs['reason']:
+            raise serializers.ValidationError({'reason': "Reason is required for rejection."})
+        return attrs
+
+
+class PaymentBulkModerationSerializer(serializers.Serializer):
+    decisions = PaymentDecisionSerializer(many=True, allow_empty=False, max_length=settings.PAYMENT_BULK_MAX_DECISIONS)
+    telegram_admin_id = serializers.IntegerField(required=False)
+
+    def validate_decisions(self, decisions):
+        ids = [decision['payment_id'] for decision in decisions]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError("Each payment may appear only once.")
+        return decisions
+
+
 class OrderCancelSerializer(serializers.Serializer):
     reason = serializers.CharField(required=True, allow_blank=False)
 
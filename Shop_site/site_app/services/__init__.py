@@ -0,0 +1,64 @@
+"""
+Бизнес-логика корзины, заказов, истории заказов и оплат без привязки к HTTP.
+Её вызывают API views и бот (in-process транспорт DjangoAPIClient).
+"""
+from .cart import CartSyncResult, add_favorite, add_to_cart, merge_cart_lines, pending_cart_items, sync_cart
+from .checkout import (
+    CheckoutResult,
+    calculate_manual_total,
+    create_checkout_order,
+    generate_payment_link,
+    place_order,
+    process_checkout,
+)
+from .errors import ServiceError
+from .moderation import moderate_payments, moderate_payments_by_telegram
+from .notifications import notify_admin_new_order, queue_telegram_notifications, send_telegram_notification
+from .orders import decode_cursor, encode_cursor, order_history, page_limit
+from .payments import (
+    approve_payment,
+    approve_payment_by_telegram,
+    cancel_order,
+    get_payment,
+    latest_payment_proof,
+    reject_payment,
+    reject_payment_by_telegram,
+    remind_order,
+    require_telegram_admin,
+    submit_payment_proof,
+)
+
+__all__ = [
+    'CartSyncResult',
+    'CheckoutResult',
+    'ServiceError',
+    'add_favorite',
+    'add_to_cart',
+    'approve_payment',
+    'approve_payment_by_telegram',
+    'calculate_manual_total',
+    'cancel_order',
+    'create_checkout_order',
+    'decode_cursor',
+    'encode_cursor',
+    'generate_payment_link',
+    'get_payment',
+    'latest_payment_proof',
+    'merge_cart_lines',
+    'moderate_payments',
+    'moderate_payments_by_telegram',
+    'notify_admin_new_order',
+    'order_history',
+    'page_limit',
+    'pending_cart_items',
+    'place_order',
+    'process_checkout',
+    'queue_telegram_notifications',
+    'reject_payment',
+    'reject_payment_by_telegram',
+    'remind_order',
+    'require_telegram_admin',
+    'send_telegram_notification',
+    'submit_payment_proof',
+    'sync_cart',
+]
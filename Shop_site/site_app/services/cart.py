@@ -0,0 +1,122 @@
+"""
+Корзина и избранное.
+Добавление — один INSERT ... ON CONFLICT DO UPDATE ... RETURNING, поэтому двойной тап не создаёт дублей.
+Замена корзины целиком (PUT /api/cart/sync/) применяет только отличия — одним bulk_create,
+одним bulk_update и одним DELETE.
+"""
+from typing import Dict, Iterable, List, Mapping, NamedTuple
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import CartItem, Favorite, Product
+
+
+class CartSyncResult(NamedTuple):
+    items: List[CartItem]
+    unknown_product_ids: List[int]
+
+
+def merge_cart_lines(lines: Iterable[Mapping]) -> Dict[int, int]:
+    """[{'product_id', 'quantity'}, ...] -> {product_id: quantity}; повторы складываются, 0 — убрать"""
+    wanted: Dict[int, int] = {}
+    for line in lines:
+        product_id = int(line['product_id'])
+        wanted[product_id] = wanted.get(product_id, 0) + int(line.get('quantity', 1))
+    return {product_id: quantity for product_id, quantity in wanted.items() if quantity > 0}
+
+
+def pending_cart_items(user: User):
+    # Заказанные строки удаляются при оформлении, так что это просто корзина пользователя
+    return CartItem.objects.filter(user=user)
+
+
+def _supports_upsert() -> bool:
+    features = connection.features
+    return features.supports_update_conflicts_with_target and features.can_return_columns_from_insert
+
+
+def add_to_cart(user: User, product: Product, quantity: int = 1) -> CartItem:
+    """Увеличивает количество товара в корзине (или создаёт строку) одним запросом"""
+    if not _supports_upsert():
+        return _add_to_cart_fallback(user, product, quantity)
+    qn = connection.ops.quote_name
+    table = qn(CartItem._meta.db_table)
+    sql = (
+        f'INSERT INTO {table} ({qn("user_id")}, {qn("product_id")}, {qn("quantity")}) VALUES (%s, %s, %s) '
+        f'ON CONFLICT ({qn("user_id")}, {qn("product_id")}) '
+        f'DO UPDATE SET {qn("quantity")} = {table}.{qn("quantity")} + EXCLUDED.{qn("quantity")} '
+        f'RETURNING {qn("id")}, {qn("user_id")}, {qn("product_id")}, {qn("quantity")}'
+    )
+    item = list(CartItem.objects.raw(sql, [user.pk, product.pk, quantity]))[0]
+    item.product = product
+    return item
+
+
+def _add_to_cart_fallback(user: User, product: Product, quantity: int) -> CartItem:
+    for _ in range(2):
+        items = pending_cart_items(user).filter(product=product)
+        if items.update(quantity=F('quantity') + quantity):
+            return items.select_related('product').get()
+        try:
+            with transaction.atomic():
+                return CartItem.objects.create(user=user, product=product, quantity=quantity)
+        except IntegrityError:
+            # Строку успел создать параллельный запрос
+            continue
+    raise IntegrityError('Could not add the product to the cart.')
+
+
+def add_favorite(user: User, product: Product) -> Favorite:
+    """Добавляет товар в избранное; повторное добавление возвращает существующую запись"""
+    if not _supports_upsert():
+        favorite, _ = Favorite.objects.get_or_create(user=user, product=product)
+        return favorite
+    qn = connection.ops.quote_name
+    added_at = connection.ops.adapt_datetimefield_value(timezone.now())
+    sql = (
+        f'INSERT INTO {qn(Favorite._meta.db_table)} ({qn("user_id")}, {qn("product_id")}, {qn("added_at")}) '
+        f'VALUES (%s, %s, %s) '
+        # Пустой DO UPDATE нужен, чтобы RETURNING вернул и уже существующую строку
+        f'ON CONFLICT ({qn("user_id")}, {qn("product_id")}) DO UPDATE SET {qn("user_id")} = EXCLUDED.{qn("user_id")} '
+        f'RETURNING {qn("id")}, {qn("user_id")}, {qn("product_id")}, {qn("added_at")}'
+    )
+    favorite = list(Favorite.objects.raw(sql, [user.pk, product.pk, added_at]))[0]
+    favorite.product = product
+    return favorite
+
+
+def sync_cart(user: User, lines: Iterable[Mapping]) -> CartSyncResult:
+    """Приводит корзину пользователя к переданному составу; неизвестные товары пропускаются"""
+    wanted = merge_cart_lines(lines)
+    known = set(Product.objects.filter(pk__in=wanted).values_list('pk', flat=True))
+    unknown = sorted(product_id for product_id in wanted if product_id not in known)
+    wanted = {product_id: quantity for product_id, quantity in wanted.items() if product_id in known}
+
+    with transaction.atomic():
+        existing = {item.product_id: item for item in pending_cart_items(user).select_for_update()}
+
+        removed = [item.pk for product_id, item in existing.items() if product_id not in wanted]
+        changed = []
+        for product_id, item in existing.items():
+            quantity = wanted.get(product_id)
+            if quantity is not None and item.quantity != quantity:
+                item.quantity = quantity
+                changed.append(item)
+        added = [
+            CartItem(user=user, product_id=product_id, quantity=quantity)
+            for product_id, quantity in wanted.items()
+            if product_id not in existing
+        ]
+
+        if removed:
+            CartItem.objects.filter(pk__in=removed).delete()
+        if changed:
+            CartItem.objects.bulk_update(changed, ['quantity'])
+        if added:
+            CartItem.objects.bulk_create(added)
+
+    items = list(pending_cart_items(user).select_related('product').order_by('id'))
+    return CartSyncResult(items, unknown)
@@ -0,0 +1,207 @@
+"""
+Оформление заказа: общая логика для CheckoutView, OrderViewSet и in-process клиента бота
+"""
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from typing import Any, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from rest_framework import status
+
+from .. import idempotency
+from ..inventory import reserve_stock
+from ..models import CartItem, Order, OrderProduct, Payment, Product, TelegramUser
+from ..serializers import CheckoutRequestSerializer, CheckoutResponseSerializer
+from .cart import pending_cart_items
+from .notifications import notify_admin_new_order
+
+
+DEFAULT_PAYMENT_DEADLINE_MINUTES = getattr(settings, 'PAYMENT_DEADLINE_MINUTES', 180)
+
+
+def generate_payment_link(provider: str = 'link') -> str:
+    base_url = getattr(settings, 'PAYMENT_LINK_BASE_URL', 'https://pay.partyland.uz/i/')
+    suffix = uuid.uuid4().hex[:10]
+    return f"{base_url}{suffix}"
+
+
+def calculate_manual_total(cart_items: List[dict]) -> Tuple[Decimal, List[Tuple[Product, int]]]:
+    total = Decimal('0')
+    detailed_items = []
+    for item in cart_items:
+        product_id = item.get('product_id')
+        quantity = item.get('quantity', 1)
+        product = get_object_or_404(Product, pk=product_id)
+        qty = int(quantity)
+        line_total = Decimal(product.price) * qty
+        total += line_total
+        detailed_items.append((product, qty))
+    return total, detailed_items
+
+
+def create_checkout_order(
+    *,
+    user: Optional[User],
+    telegram_user: Optional[TelegramUser],
+    cart_items_query: Optional[List[CartItem]],
+    manual_items: Optional[List[Tuple[Product, int]]],
+    comment: str,
+    payment_link: str | None,
+    provider: str,
+    deadline_minutes: int | None,
+    address: Optional[str],
+    latitude: Optional[float],
+    longitude: Optional[float],
+    delivery_time: Optional[str],
+    customer_name: str = '',
+    customer_phone: str = '',
+) -> Tuple[Order, Payment]:
+    deadline_minutes = deadline_minutes or DEFAULT_PAYMENT_DEADLINE_MINUTES
+    payment_deadline = timezone.now() + timedelta(minutes=deadline_minutes)
+
+    if cart_items_query:
+        total = sum([Decimal(item.get_total_price()) for item in cart_items_query])
+    else:
+        total = sum([Decimal(product.price) * qty for product, qty in (manual_items or [])])
+
+    if total <= 0:
+        raise ValueError("Order total must be positive.")
+
+    link = payment_link or generate_payment_link(provider)
+
+    with transaction.atomic():
+        order = Order.objects.create(
+            user=user,
+            telegram_user=telegram_user,
+            total_price=total,
+            total_uzs=total,
+            payment_link=link,
+            payment_comment=comment,
+            payment_deadline_at=payment_deadline,
+            status=Order.Status.PENDING_PAYMENT_LINK,
+            address=address,
+            latitude=latitude,
+            longitude=longitude,
+            delivery_time=delivery_time,
+            customer_name=customer_name.strip(),
+            customer_phone=customer_phone.strip(),
+        )
+
+        if cart_items_query:
+            lines = [(cart_item.product, cart_item.quantity) for cart_item in cart_items_query]
+        else:
+            lines = manual_items or []
+        # OrderProduct — единственный источник состава заказа; строки корзины после оформления удаляются
+        OrderProduct.objects.bulk_create([
+            OrderProduct(
+                order=order,
+                product=product,
+                product_title=product.title,
+                quantity=qty,
+                price_uzs=product.price,
+            )
+            for product, qty in lines
+        ])
+        if cart_items_query:
+            CartItem.objects.filter(pk__in=[cart_item.pk for cart_item in cart_items_query]).delete()
+
+        reserve_stock(order, lines)
+
+        payment = Payment.objects.create(
+            order=order,
+            amount_uzs=total,
+            provider=provider or 'link',
+            status=Payment.Status.AWAITING_PROOF,
+        )
+
+    return order, payment
+
+
+def process_checkout(user: Optional[User], validated_data: dict) -> Tuple[Order, Payment]:
+    telegram_user = None
+    if validated_data.get('telegram_user_id'):
+        telegram_user, _ = TelegramUser.objects.get_or_create(telegram_id=validated_data['telegram_user_id'])
+
+    manual_items_details = None
+    cart_items_query = None
+
+    if validated_data.get('cart_items'):
+        _, manual_items_details = calculate_manual_total(validated_data['cart_items'])
+    else:
+        if not user:
+            raise ValueError("Authenticated user is required when cart_items are not provided.")
+        cart_items_query = list(pending_cart_items(user).select_related('product'))
+        if not cart_items_query:
+            raise ValueError("Cart is empty.")
+
+    order, payment = create_checkout_order(
+        user=user,
+        telegram_user=telegram_user,
+        cart_items_query=cart_items_query,
+        manual_items=manual_items_details,
+        comment=validated_data.get('comment', ''),
+        payment_link=validated_data.get('payment_link'),
+        provider=validated_data.get('payment_provider', 'link'),
+        deadline_minutes=validated_data.get('deadline_minutes'),
+        address=validated_data.get('address'),
+        latitude=validated_data.get('latitude'),
+        longitude=validated_data.get('longitude'),
+        delivery_time=validated_data.get('delivery_time'),
+        customer_name=validated_data.get('customer_name', ''),
+        customer_phone=validated_data.get('customer_phone', ''),
+    )
+
+    notify_admin_new_order(order)
+
+    return order, payment
+
+
+class CheckoutResult(NamedTuple):
+    status_code: int
+    data: Any
+    replayed: bool = False
+
+
+def place_order(data, *, user: Optional[User] = None, idempotency_key: str = '') -> CheckoutResult:
+    """
+    POST /api/checkout/ без HTTP: валидация, Idempotency-Key, заказ и тело ответа.
+    Ошибки валидации и конфликты ключа поднимаются как исключения DRF.
+    """
+    serializer = CheckoutRequestSerializer(data=data, context={'user': user})
+    serializer.is_valid(raise_exception=True)
+
+    # Повтор с тем же Idempotency-Key получает сохранённый ответ без нового заказа
+    record, replay = idempotency.claim(
+        'checkout',
+        idempotency_key,
+        idempotency.fingerprint(data, user.pk if user else None),
+    )
+    if replay is not None:
+        return CheckoutResult(*replay, replayed=True)
+
+    try:
+        order, payment = process_checkout(user, serializer.validated_data)
+    except ValueError as exc:
+        result = CheckoutResult(status.HTTP_400_BAD_REQUEST, {'detail': str(exc)})
+        idempotency.complete(record, result.status_code, result.data)
+        return result
+    except Exception:
+        idempotency.release(record)
+        raise
+
+    result = CheckoutResult(status.HTTP_201_CREATED, CheckoutResponseSerializer({
+        'order_id': order.id,
+        'status': order.status,
+        'total_uzs': order.total_uzs,
+        'formatted_total': order.formatted_total,
+        'payment_link': order.payment_link,
+        'payment_deadline_at': order.payment_deadline_at,
+        'payment_id': payment.id,
+    }).data)
+    idempotency.complete(record, result.status_code, result.data)
+    return result
@@ -0,0 +1,11 @@
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class ServiceError(APIException):
+    """Ошибка бизнес-правила; DRF отдаёт её как {'detail': ...} с нужным статусом"""
+    status_code = status.HTTP_400_BAD_REQUEST
+
+    def __init__(self, detail: str, status_code: int = status.HTTP_400_BAD_REQUEST):
+        super().__init__(detail)
+        self.status_code = status_code
@@ -0,0 +1,181 @@
+"""
+Массовая модерация оплат: много решений approve/reject за одну транзакцию.
+Платежи читаются одним запросом, меняются одним UPDATE на действие, заказы — одним UPDATE на пару
+(прежний статус, новый статус), история пишется одним bulk_create. Уведомления клиентам уходят в фон после commit.
+"""
+from collections import defaultdict
+from functools import partial
+from typing import Dict, List, Optional
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Case, CharField, Value, When
+from django.utils import timezone
+from rest_framework import status
+
+from ..events import publish_payment
+from ..models import Order, OrderStatusHistory, Payment
+from ..serializers import PaymentBulkModerationSerializer, PaymentDecisionSerializer
+from .errors import ServiceError
+from .notifications import payment_approved_message, payment_rejected_message, queue_telegram_notifications
+from .payments import already_processed, require_telegram_admin
+
+ACTIONS = {
+    PaymentDecisionSerializer.APPROVE: (Payment.Status.PAID, Order.Status.PAID, 'approved'),
+    PaymentDecisionSerializer.REJECT: (Payment.Status.REJECTED, Order.Status.REJECTED, 'rejected'),
+}
+
+
+def _skipped(payment_id: int, result: str, detail: str, payment: Optional[Payment] = None) -> dict:
+    return {
+        'payment_id': payment_id,
+        'result': result,
+        'detail': detail,
+        'status': payment.status if payment else None,
+        'order_id': payment.order_id if payment else None,
+        'order_status': payment.order.status if payment else None,
+    }
+
+
+def _lost_race():
+    # Кто-то изменил платёж или заказ между чтением и UPDATE: откатываем всю пачку, админ повторит
+    return ServiceError('Payments were changed by another request; retry.', status.HTTP_409_CONFLICT)
+
+
+def moderate_payments(decisions: List[dict], reviewed_by: Optional[User] = None) -> dict:
+    """
+    decisions — провалидированные PaymentDecisionSerializer: [{'payment_id', 'action', 'reason'}, ...].
+    Уже обработанные и несуществующие платежи пропускаются (результат по каждому id в порядке запроса).
+    """
+    payments = Payment.objects.select_related('order', 'order__telegram_user').in_bulk(
+        [decision['payment_id'] for decision in decisions]
+    )
+    results: Dict[int, dict] = {}
+    accepted: Dict[str, List[tuple]] = defaultdict(list)
+    order_targets: Dict[int, str] = {}
+
+    for decision in decisions:
+        payment_id, action = decision['payment_id'], decision['action']
+        payment = payments.get(payment_id)
+        payment_status, order_status, _ = ACTIONS[action]
+        if payment is None:
+            results[payment_id] = _skipped(payment_id, 'not_found', 'Payment not found.')
+            continue
+        if payment.status not in Payment.TRANSITIONS[payment_status]:
+            results[payment_id] = _skipped(payment_id, 'already_processed', already_processed(payment).detail, payment)
+            continue
+        order = payment.order
+        target = order_targets.get(order.pk, order_status)
+        if target != order_status or not (order.can_transition(order_status) or order.status == order_status):
+            # Заказ отменён (или в этой же пачке получает другое решение) — платёж не трогаем
+            results[payment_id] = _skipped(payment_id, 'order_changed', 'Order was changed by another request.', payment)
+            continue
+        order_targets[order.pk] = order_status
+        accepted[action].append((payment, decision['reason']))
+
+    now = timezone.now()
+    with transaction.atomic():
+        approvals = accepted[PaymentDecisionSerializer.APPROVE]
+        if approvals:
+            updated = Payment.objects.filter(
+                pk__in=[payment.pk for payment, _ in approvals],
+                status__in=Payment.TRANSITIONS[Payment.Status.PAID],
+            ).update(
+                status=Payment.Status.PAID, updated_at=now, reviewed_by=reviewed_by, rejection_reason='',
+                **Payment.status_changes(Payment.Status.PAID, now),
+            )
+            if updated != len(approvals):
+                raise _lost_race()
+
+        rejections = accepted[PaymentDecisionSerializer.REJECT]
+        if rejections:
+            updated = Payment.objects.filter(
+                pk__in=[payment.pk for payment, _ in rejections],
+                status__in=Payment.TRANSITIONS[Payment.Status.REJECTED],
+            ).update(
+                status=Payment.Status.REJECTED, updated_at=now, reviewed_by=reviewed_by,
+                **Payment.status_changes(Payment.Status.REJECTED, now),
+                rejection_reason=Case(
+                    *[When(pk=payment.pk, then=Value(reason)) for payment, reason in rejections],
+                    output_field=CharField(),
+                ),
+            )
+            if updated != len(rejections):
+                raise _lost_race()
+
+        # Заказы: один UPDATE ... WHERE status = <прежний> на каждую пару статусов
+        changed_orders = {}
+        comments = {}
+        for items in accepted.values():
+            for payment, reason in items:
+                order = payment.order
+                if order.status != order_targets[order.pk] and order.pk not in changed_orders:
+                    changed_orders[order.pk] = (order, order.status)
+                    comments[order.pk] = reason
+        groups: Dict[tuple, List[int]] = defaultdict(list)
+        for order, previous_status in changed_orders.values():
+            groups[(previous_status, order_targets[order.pk])].append(order.pk)
+        for (previous_status, new_status), order_ids in groups.items():
+            if Order.objects.filter(pk__in=order_ids, status=previous_status).update(status=new_status) != len(order_ids):
+                raise _lost_race()
+
+        OrderStatusHistory.objects.bulk_create([
+            OrderStatusHistory(
+                order=order,
+                previous_status=previous_status,
+                new_status=order_targets[order.pk],
+                changed_by=reviewed_by,
+                comment=comments[order.pk],
+            )
+            for order, previous_status in changed_orders.values()
+        ])
+        for order, previous_status in changed_orders.values():
+            order.status = order_targets[order.pk]
+            order.status_changed(previous_status, order.status)
+
+        messages = []
+        for action, items in accepted.items():
+            payment_status, _, result = ACTIONS[action]
+            for payment, reason in items:
+                payment.status = payment_status
+                payment.updated_at = now
+                for field, value in Payment.status_changes(payment_status, now).items():
+                    setattr(payment, field, value)
+                payment.reviewed_by = reviewed_by
+                payment.rejection_reason = reason if payment_status == Payment.Status.REJECTED else ''
+                transaction.on_commit(
+                    partial(publish_payment, payment.order_id, payment.pk, payment.status, payment.is_active)
+                )
+                results[payment.pk] = {
+                    'payment_id': payment.pk,
+                    'result': result,
+                    'detail': '',
+                    'status': payment.status,
+                    'order_id': payment.order_id,
+                    'order_status': order_targets[payment.order_id],
+                }
+                if payment_status == Payment.Status.PAID:
+                    messages.append((payment.order.telegram_user, payment_approved_message(payment.order_id)))
+                else:
+                    messages.append((payment.order.telegram_user, payment_rejected_message(reason)))
+        notifications = queue_telegram_notifications(messages)
+
+    ordered = [results[decision['payment_id']] for decision in decisions]
+    return {
+        'results': ordered,
+        'approved': sum(1 for item in ordered if item['result'] == 'approved'),
+        'rejected': sum(1 for item in ordered if item['result'] == 'rejected'),
+        'skipped': sum(1 for item in ordered if item['result'] not in ('approved', 'rejected')),
+        'notifications_queued': notifications,
+    }
+
+
+def moderate_payments_by_telegram(data) -> dict:
+    serializer = PaymentBulkModerationSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+    telegram_admin_id = serializer.validated_data.get('telegram_admin_id')
+    if not telegram_admin_id:
+        raise ServiceError('telegram_admin_id is required.')
+    # reviewed_by остаётся пустым: Telegram-админ — не Django пользователь
+    require_telegram_admin(telegram_admin_id)
+    return moderate_payments(serializer.validated_data['decisions'])
@@ -0,0 +1,196 @@
+"""
+Уведомления в Telegram из Django (Bot API напрямую, без бота)
+"""
+import logging
+from functools import partial
+from typing import Iterable, List, Optional, Tuple
+
+import requests
+from django.conf import settings
+from django.db import transaction
+
+from .. import background
+from ..models import Order, TelegramUser, format_sum
+
+logger = logging.getLogger(__name__)
+
+
+def payment_approved_message(order_id: int) -> str:
+    return f"🎉 Оплата подтверждена! Заказ №{order_id} перешёл в обработку."
+
+
+def payment_rejected_message(reason: str) -> str:
+    return f"❌ Чек отклонён: {reason}. Пожалуйста, пришлите корректный чек или свяжитесь с поддержкой."
+
+
+def send_telegram_notification(telegram_user: Optional[TelegramUser], message: str) -> None:
+    bot_token = getattr(settings, 'BOT_TOKEN', '')
+    if not telegram_user or not bot_token:
+        return
+    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+    try:
+        requests.post(url, json={"chat_id": telegram_user.telegram_id, "text": message}, timeout=10)
+    except requests.RequestException as exc:  # pragma: no cover
+        logger.warning("Failed to send telegram notification: %s", exc)
+
+
+def send_telegram_messages(messages: List[Tuple[int, str]]) -> int:
+    """Отправляет пачку сообщений через одно HTTP-соединение; возвращает число доставленных"""
+    url = f"{settings.TELEGRAM_API_URL}/bot{settings.BOT_TOKEN}/sendMessage"
+    sent = 0
+    with requests.Session() as session:
+        for chat_id, text in messages:
+            try:
+                session.post(url, json={"chat_id": chat_id, "text": text}, timeout=10).raise_for_status()
+                sent += 1
+            except requests.RequestException as exc:
+                logger.warning("Failed to send telegram notification to %s: %s", chat_id, exc)
+    return sent
+
+
+def queue_telegram_notifications(messages: Iterable[Tuple[Optional[TelegramUser], str]]) -> int:
+    """
+    Уведомления клиентам после commit одной задачей в фоне (NOTIFICATION_WORKERS; 0 — сразу в том же потоке):
+    ответ на массовую модерацию не ждёт Telegram. Возвращает число поставленных в очередь сообщений.
+    """
+    batch = [(telegram_user.telegram_id, text) for telegram_user, text in messages if telegram_user]
+    if not batch or not settings.BOT_TOKEN:
+        return 0
+    transaction.on_commit(partial(background.submit, 'telegram-notify', 'NOTIFICATION_WORKERS', send_telegram_messages, batch))
+    return len(batch)
+
+
+def notify_admin_new_order(order: Order) -> None:
+    """
+    Отправляет уведомление всем админам в Telegram о новом заказе.
+    """
+    bot_token = getattr(settings, 'BOT_TOKEN', '')
+    if not bot_token:
+        logger.warning("BOT_TOKEN not configured, skipping admin notification")
+        return
+
+    # Получаем всех админов из базы данных
+    admin_users = TelegramUser.objects.filter(is_admin=True)
+    if not admin_users.exists():
+        # Fallback: используем ADMIN_TELEGRAM_CHAT_ID из settings если есть
+        admin_chat_id = getattr(settings, 'ADMIN_TELEGRAM_CHAT_ID', '')
+        if admin_chat_id:
+            admin_ids = [int(admin_chat_id)]
+        else:
+            logger.warning("No admin users found in database and ADMIN_TELEGRAM_CHAT_ID not set")
+            return
+    else:
+        admin_ids = [admin.telegram_id for admin in admin_users]
+
+    # Формируем сообщение
+    lines = [
+        f"🔔 <b>Новый заказ #{order.pk}</b>",
+    ]
+    
+    # Определяем источник заказа
+    source_label = order.source_label()
+    if source_label == "Website":
+        lines.append("🌐 Источник: Сайт")
+    elif source_label == "Telegram":
+        lines.append("💬 Источник: Telegram бот")
+    else:
+        lines.append(f"📱 Источник: {source_label}")
+
+    # Информация о клиенте
+    if order.telegram_user:
+        lines.append(f"👤 Клиент: {order.telegram_user.name or f'TG {order.telegram_user.telegram_id}'}")
+        if order.telegram_user.phone:
+            lines.append(f"📞 Телефон: {order.telegram_user.phone}")
+    elif order.customer_name:
+        lines.append(f"👤 Имя: {order.customer_name}")
+    if order.customer_phone:
+        lines.append(f"📞 Контакт: {order.customer_phone}")
+
+    # Адрес доставки
+    if order.address:
+        if order.latitude and order.longitude:
+            lines.append(f"📍 Адрес: {order.address} (координаты: {order.latitude:.6f}, {order.longitude:.6f})")
+        else:
+            lines.append(f"📍 Адрес: {order.address}")
+    else:
+        lines.append("📍 Адрес: Не указан")
+
+    # Время доставки
+    if order.delivery_time:
+        lines.append(f"⏰ Время доставки: {order.delivery_time}")
+    
+    # Комментарий
+    if order.payment_comment:
+        lines.append(f"💬 Комментарий: {order.payment_comment}")
+
+    lines.append("")
+    lines.append("🧾 Состав заказа:")
+
+    # Товары из заказа
+    for item in order.order_products.all():
+        lines.append(
+            f"• {item.product_title} × {item.quantity} — {format_sum(item.total_price)}"
+        )
+
+    lines.append("")
+    lines.append(f"💰 Итого: <b>{order.formatted_total}</b>")
+    
+    if order.payment_link:
+        lines.append(f"🔗 Ссылка для оплаты: {order.payment_link}")
+    
+    if order.payment_deadline_at:
+        deadline_str = order.payment_deadline_at.strftime('%d.%m.%Y %H:%M')
+        lines.append(f"⏳ Срок оплаты: {deadline_str}")
+
+    message_text = "\n".join(lines)
+    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+
+    # Получаем активный payment для заказа
+    active_payment = order.payments.filter(is_active=True).first()
+    payment_id = active_payment.pk if active_payment else None
+
+    # Создаем inline клавиатуру с кнопками подтверждения/отклонения
+    reply_markup = None
+    if payment_id:
+        reply_markup = {
+            "inline_keyboard": [
+                [
+                    {
+                        "text": "✅ Подтвердить оплату",
+                        "callback_data": f"approve_order:{order.pk}:{payment_id}"
+                    },
+                    {
+                        "text": "❌ Отклонить",
+                        "callback_data": f"reject_order:{order.pk}:{payment_id}"
+                    }
+                ]
+            ]
+        }
+
+    # Отправляем сообщение всем админам
+    success_count = 0
+    for admin_id in admin_ids:
+        try:
+            payload = {
+                "chat_id": admin_id,
+                "text": message_text,
+                "parse_mode": "HTML"
+            }
+            if reply_markup:
+                payload["reply_markup"] = reply_markup
+
+            response = requests.post(
+                url,
+                json=payload,
+                timeout=10
+            )
+            response.raise_for_status()
+            success_count += 1
+            logger.info(f"Admin notification sent to {admin_id} for order {order.pk}")
+        except requests.RequestException as exc:
+            logger.warning(f"Failed to notify admin {admin_id} about order {order.pk}: {exc}")
+    
+    if success_count == 0:
+        logger.error(f"Failed to notify any admin about order {order.pk}")
+    else:
+        logger.info(f"Successfully notified {success_count} admin(s) about order {order.pk}")
@@ -0,0 +1,93 @@
+"""
+История заказов покупателя для бота и веб-приложения.
+Два запроса на страницу при любой длине истории: заказы (keyset по created_at, id) и их строки из OrderProduct.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+
+from ..models import Order, OrderProduct
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+SUMMARY_LINES = 3
+
+ORDER_FIELDS = ('id', 'status', 'total_price', 'total_uzs', 'created_at', 'address', 'delivery_time')
+
+
+def encode_cursor(created_at: datetime, order_id: int) -> str:
+    """Короткий курсор (влезает в callback_data Telegram): '<микросекунды>.<id>'"""
+    return f"{(created_at - EPOCH) // timedelta(microseconds=1)}.{order_id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        micros, order_id = cursor.split('.', 1)
+        return EPOCH + timedelta(microseconds=int(micros)), int(order_id)
+    except (AttributeError, ValueError, OverflowError):
+        raise ValidationError({'cursor': 'Invalid cursor.'})
+
+
+def page_limit(raw) -> int:
+    default, maximum = settings.ORDER_HISTORY_PAGE_SIZE, settings.ORDER_HISTORY_MAX_PAGE_SIZE
+    if raw in (None, ''):
+        return default
+    try:
+        limit = int(raw)
+    except (TypeError, ValueError):
+        raise ValidationError({'limit': 'Expected an integer.'})
+    return max(1, min(limit, maximum))
+
+
+def order_history(owner: Q, cursor: Optional[str] = None, limit: Optional[int] = None) -> Dict:
+    """
+    Страница истории заказов, новые сначала.
+    owner — фильтр покупателя, например Q(telegram_user__telegram_id=...) или Q(user=request.user)
+    """
+    limit = limit or settings.ORDER_HISTORY_PAGE_SIZE
+    orders = Order.objects.filter(owner).order_by('-created_at', '-id')
+    if cursor:
+        created_at, order_id = decode_cursor(cursor)
+        orders = orders.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=order_id))
+    rows = list(orders.values(*ORDER_FIELDS)[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    lines: Dict[int, List[Dict]] = {row['id']: [] for row in rows}
+    if lines:
+        products = (
+            OrderProduct.objects
+            .filter(order_id__in=lines)
+            .order_by('id')
+            .values_list('order_id', 'product_id', 'product_title', 'quantity')
+        )
+        for order_id, product_id, title, quantity in products:
+            lines[order_id].append({'product_id': product_id, 'title': title, 'quantity': quantity})
+
+    results = []
+    for row in rows:
+        items = lines[row['id']]
+        results.append({
+            'id': row['id'],
+            'status': row['status'],
+            'total_price': str(row['total_price']),
+            'formatted_total': Order.format_total(row['total_uzs'], row['total_price']),
+            'created_at': row['created_at'],
+            'address': row['address'] or '',
+            'delivery_time': row['delivery_time'] or '',
+            'items': items,
+            'items_count': sum(item['quantity'] for item in items),
+            'summary': _summary(items),
+        })
+
+    next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id']) if has_more else None
+    return {'results': results, 'next_cursor': next_cursor}
+
+
+def _summary(items: List[Dict]) -> str:
+    parts = [f"{item['title']} ×{item['quantity']}" for item in items[:SUMMARY_LINES]]
+    if len(items) > SUMMARY_LINES:
+        parts.append(f"+{len(items) - SUMMARY_LINES}")
+    return ', '.join(parts)
@@ -0,0 +1,246 @@
+"""
+Чеки, подтверждение/отклонение оплаты и отмена заказа.
+Функции возвращают то же тело ответа, что и соответствующие API views.
+"""
+from typing import Optional
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.shortcuts import get_object_or_404
+from rest_framework import status
+from rest_framework.exceptions import NotFound, ValidationError
+
+from ..models import Order, Payment, PaymentProof, TelegramUser
+from ..serializers import PaymentProofCreateSerializer, validate_proof_image
+from ..storage import full_digest
+from .errors import ServiceError
+from .notifications import payment_approved_message, payment_rejected_message, send_telegram_notification
+
+
+def get_payment(payment_id: int) -> Payment:
+    return get_object_or_404(Payment.objects.select_related('order', 'order__telegram_user'), pk=payment_id)
+
+
+def require_telegram_admin(telegram_admin_id) -> TelegramUser:
+    try:
+        admin_user = TelegramUser.objects.get(telegram_id=telegram_admin_id)
+    except TelegramUser.DoesNotExist:
+        raise ServiceError('Admin user not found.', status.HTTP_404_NOT_FOUND)
+    if not admin_user.is_admin:
+        raise ServiceError('User is not an admin.', status.HTTP_403_FORBIDDEN)
+    return admin_user
+
+
+def order_closed(order: Order) -> Optional[ServiceError]:
+    """Чек к оплаченному или отменённому заказу не принимаем: иначе платёж уйдёт на проверку, а заказ — нет"""
+    if order.status == Order.Status.UNDER_REVIEW or order.can_transition(Order.Status.UNDER_REVIEW):
+        return None
+    if order.status == Order.Status.PAID:
+        return ServiceError('Order already paid.')
+    if order.status == Order.Status.CANCELED:
+        return ServiceError('Order already canceled.')
+    return ServiceError('Order does not accept payment proofs.')
+
+
+def submit_payment_proof(data, image=None) -> dict:
+    serializer = PaymentProofCreateSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+    data = serializer.validated_data
+    telegram_user, _ = TelegramUser.objects.get_or_create(telegram_id=data['telegram_user_id'])
+
+    if data.get('payment_id'):
+        payment = get_payment(data['payment_id'])
+    else:
+        # Активный платёж у заказа один (payment_one_active_per_order): сразу с заказом, одним запросом
+        payment = (
+            Payment.objects.select_related('order', 'order__telegram_user')
+            .filter(order_id=data['order_id'], is_active=True)
+            .first()
+        )
+        if payment is None:
+            order = get_object_or_404(Order.objects.select_related('telegram_user'), pk=data['order_id'])
+            # Оплаченный платёж закрыт (is_active=False): объясняем почему, а не «платёж не найден»
+            if not order.telegram_user or order.telegram_user.telegram_id == telegram_user.telegram_id:
+                closed = order_closed(order)
+                if closed:
+                    raise closed
+            raise ValidationError("Active payment not found for order.")
+
+    order = payment.order
+    if order.telegram_user and order.telegram_user.telegram_id != telegram_user.telegram_id:
+        raise ValidationError("Order does not belong to this Telegram user.")
+    closed = order_closed(order)
+    if closed:
+        raise closed
+    if payment.status != Payment.Status.UNDER_REVIEW and payment.status not in Payment.TRANSITIONS[Payment.Status.UNDER_REVIEW]:
+        raise already_processed(payment)
+    if not order.telegram_user:
+        order.telegram_user = telegram_user
+        order.save(update_fields=['telegram_user'])
+
+    image = data.get('image') or image
+    content_hash = full_digest(image) if image else ''
+    comment = data.get('comment', '')
+    with transaction.atomic():
+        # Тот же скриншот ещё раз: хеш посчитан при приёме, картинку даже не открываем
+        if not (content_hash and payment.proofs.filter(content_hash=content_hash).exists()):
+            if image:
+                image = validate_proof_image(image)
+            proof = PaymentProof(
+                payment=payment,
+                telegram_file_id=data.get('telegram_file_id') or None,
+                submitted_by_telegram=telegram_user,
+                submitted_by_user=None,
+                comment=comment,
+                message_id=data.get('message_id') or None,
+                content_hash=content_hash,
+            )
+            if image:
+                proof.image = image
+            try:
+                proof.clean()
+            except DjangoValidationError as exc:
+                raise ValidationError(exc.messages)
+            try:
+                with transaction.atomic():
+                    proof.save()
+            except IntegrityError:
+                # Повтор по уникальным индексам (тот же file_id, message_id или хеш) — чек уже сохранён
+                pass
+
+        # Платёж и заказ переходят вместе: проигравший гонку откатывает и чек, и платёж
+        if not payment.transition(Payment.Status.UNDER_REVIEW) and payment.status != Payment.Status.UNDER_REVIEW:
+            raise already_processed(payment)
+        if not order.set_status(Order.Status.UNDER_REVIEW, comment=comment) and order.status != Order.Status.UNDER_REVIEW:
+            raise ServiceError('Order was changed by another request.', status.HTTP_409_CONFLICT)
+
+    return {
+        'status': payment.status,
+        'message': 'Чек получен. Ожидайте подтверждения.',
+        'payment_id': payment.id,
+        'order_status': order.status,
+    }
+
+
+def remind_order(order_id, telegram_user_id) -> dict:
+    if not order_id or not telegram_user_id:
+        raise ValidationError("order_id and telegram_user_id are required.")
+
+    order = get_object_or_404(Order.objects.select_related('telegram_user'), pk=order_id)
+    if not order.telegram_user or str(order.telegram_user.telegram_id) != str(telegram_user_id):
+        raise NotFound("Order not found for this user.")
+
+    if order.status == Order.Status.PENDING_PAYMENT_LINK:
+        order.set_status(Order.Status.AWAITING_PROOF)
+
+    return {
+        'order_id': order.id,
+        'status': order.status,
+        'payment_link': order.payment_link,
+        'payment_deadline_at': order.payment_deadline_at,
+        'formatted_total': order.formatted_total,
+    }
+
+
+def latest_payment_proof(order_id: int, telegram_admin_id, request=None) -> dict:
+    """Последний чек активного платежа заказа — только то, что нужно кнопке «посмотреть чек»"""
+    if not telegram_admin_id:
+        raise ServiceError('telegram_admin_id is required.')
+    require_telegram_admin(telegram_admin_id)
+
+    proof = (
+        PaymentProof.objects
+        .filter(payment__order_id=order_id, payment__is_active=True)
+        .order_by('-submitted_at', '-id')
+        .values('id', 'payment_id', 'telegram_file_id', 'image', 'payment__order__telegram_user__telegram_id')
+        .first()
+    )
+    if proof is None:
+        raise NotFound('No payment proof for this order.')
+
+    image_url = None
+    if proof['image']:
+        image_url = default_storage.url(proof['image'])
+        if request is not None:
+            image_url = request.build_absolute_uri(image_url)
+    return {
+        'order_id': int(order_id),
+        'payment_id': proof['payment_id'],
+        'proof_id': proof['id'],
+        'telegram_file_id': proof['telegram_file_id'],
+        'image_url': image_url,
+        'customer_telegram_id': proof['payment__order__telegram_user__telegram_id'],
+    }
+
+
+def already_processed(payment: Payment) -> ServiceError:
+    """Ответ проигравшему: платёж уже перевёл другой запрос (статус из памяти, без повторного чтения)"""
+    if payment.status == Payment.Status.PAID:
+        detail = 'Payment already approved.'
+    elif payment.status == Payment.Status.REJECTED:
+        detail = 'Payment already rejected.'
+    else:
+        detail = 'Payment already processed.'
+    return ServiceError(detail)
+
+
+def approve_payment(payment: Payment, reviewed_by: Optional[User] = None) -> dict:
+    with transaction.atomic():
+        if not payment.transition(Payment.Status.PAID, reviewed_by=reviewed_by, rejection_reason=''):
+            raise already_processed(payment)
+        if not payment.order.set_status(Order.Status.PAID, changed_by=reviewed_by) and payment.order.status != Order.Status.PAID:
+            # Заказ успели отменить: платёж тоже не трогаем (откат транзакции)
+            raise ServiceError('Order was changed by another request.', status.HTTP_409_CONFLICT)
+        send_telegram_notification(payment.order.telegram_user, payment_approved_message(payment.order.id))
+
+    return {'status': payment.status, 'order_status': payment.order.status}
+
+
+def reject_payment(payment: Payment, reason: str, reviewed_by: Optional[User] = None) -> dict:
+    with transaction.atomic():
+        if not payment.transition(Payment.Status.REJECTED, reviewed_by=reviewed_by, rejection_reason=reason):
+            raise already_processed(payment)
+        order_rejected = payment.order.set_status(Order.Status.REJECTED, changed_by=reviewed_by, comment=reason)
+        if not order_rejected and payment.order.status != Order.Status.REJECTED:
+            raise ServiceError('Order was changed by another request.', status.HTTP_409_CONFLICT)
+        send_telegram_notification(payment.order.telegram_user, payment_rejected_message(reason))
+
+    return {'status': payment.status, 'order_status': payment.order.status, 'reason': reason}
+
+
+def approve_payment_by_telegram(payment_id: int, telegram_admin_id) -> dict:
+    payment = get_payment(payment_id)
+    if not telegram_admin_id:
+        raise ServiceError('telegram_admin_id is required.')
+    # reviewed_by остаётся пустым: Telegram-админ — не Django пользователь
+    require_telegram_admin(telegram_admin_id)
+    return approve_payment(payment)
+
+
+def reject_payment_by_telegram(payment_id: int, telegram_admin_id, reason: Optional[str]) -> dict:
+    payment = get_payment(payment_id)
+    reason = (reason or '').strip()
+    if not telegram_admin_id:
+        raise ServiceError('telegram_admin_id is required.')
+    if not reason:
+        raise ServiceError('Reason is required for rejection.')
+    require_telegram_admin(telegram_admin_id)
+    return reject_payment(payment, reason)
+
+
+def cancel_order(order: Order, reason: str, changed_by: Optional[User] = None) -> dict:
+    with transaction.atomic():
+        if not order.set_status(Order.Status.CANCELED, changed_by=changed_by, comment=reason):
+            detail = 'Order already canceled.' if order.status == Order.Status.CANCELED else 'Order was changed by another request.'
+            raise ServiceError(detail, status.HTTP_409_CONFLICT)
+        active_payment = order.payments.filter(is_active=True).exclude(status=Payment.Status.PAID).first()
+        if active_payment:
+            active_payment.transition(Payment.Status.REJECTED, reviewed_by=changed_by, rejection_reason=reason)
+        send_telegram_notification(
+            order.telegram_user,
+            f"❌ Заказ №{order.id} отменён: {reason}",
+        )
+
+    return {'status': order.status, 'reason': reason}
@@ -0,0 +1,63 @@
+"""
+Хранилище медиа с хешем содержимого в имени: products/ball.3f2a9c01d4e5b6a7.jpg.
+Такой URL никогда не меняет содержимое, поэтому site_app.media отдаёт его с Cache-Control: immutable,
+а одинаковый файл, загруженный повторно, не пишется второй раз.
+"""
+import hashlib
+import posixpath
+import re
+from typing import Optional
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+HASH_LENGTH = 16
+HASHED_NAME_RE = re.compile(r'\.([0-9a-f]{%d})(\.[^./]+)?$' % HASH_LENGTH)
+
+
+def is_hashed_name(name: str) -> bool:
+    return bool(HASHED_NAME_RE.search(name))
+
+
+def full_digest(content) -> str:
+    """sha256 содержимого; уже посчитанный при приёме (site_app.uploads) не пересчитывается"""
+    precomputed = getattr(content, 'content_hash', None)
+    if precomputed:
+        return precomputed
+    digest = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk if isinstance(chunk, bytes) else chunk.encode())
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return digest.hexdigest()
+
+
+def content_digest(content) -> str:
+    return full_digest(content)[:HASH_LENGTH]
+
+
+def hashed_name(name: str, digest: str, max_length: Optional[int] = None) -> str:
+    directory, filename = posixpath.split(name)
+    filename = HASHED_NAME_RE.sub(r'\2', filename)
+    stem, ext = posixpath.splitext(filename)
+    result = posixpath.join(directory, f'{stem}.{digest}{ext}')
+    if max_length and len(result) > max_length:
+        # Укорачиваем исходное имя, а не хеш (иначе FileField обрежет его сам)
+        stem = stem[:max(1, len(stem) - (len(result) - max_length))]
+        result = posixpath.join(directory, f'{stem}.{digest}{ext}')
+    return result
+
+
+class ContentHashedStorage(FileSystemStorage):
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = hashed_name(name, content_digest(content), max_length)
+        if self.exists(name):
+            # Тот же файл уже лежит под этим именем
+            return name
+        return super().save(name, content, max_length=max_length)
@@ -1,11 +1,53 @@
-from datetime import timedelta
+import gzip
+import io
+import json
+import sys
+import tempfile
+import threading
+import uuid
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
 from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock, skipUnless
+
 from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APITestCase
+
+from site_proj.schema import build_schema, clear_cache as clear_schema_cache, code_version
 
-from .models import Category, Product, Order, Payment, TelegramUser, PaymentProof
+from . import background, catalog, events, fastjson, rollups, services
+from .storage import ContentHashedStorage
+from .models import (
+    Category,
+    Product,
+    CartItem,
+    Favorite,
+    Order,
+    OrderProduct,
+    Payment,
+    TelegramUser,
+    PaymentProof,
+    DailySourceRevenue,
+    DailyProductSales,
+    DailyOrderStatusCount,
+    StockReservation,
+    IdempotencyKey,
+    OrderStatusHistory,
+)
+from .serializers import OrderSerializer, ProductListSerializer
+from .services import ServiceError
 
 
 class PaymentFlowTests(APITestCase):
@@ -118,3 +160,1406 @@ class PaymentFlowTests(APITestCase):
         order.refresh_from_db()
         self.assertEqual(payment.status, Payment.Status.REJECTED)
         self.assertEqual(order.status, Order.Status.REJECTED)
+
+    def test_telegram_admin_gets_latest_proof_only(self):
+        admin = TelegramUser.objects.create(telegram_id=555000999, name="Admin", is_admin=True)
+        order = Order.objects.create(
+            telegram_user=self.telegram_user,
+            status=Order.Status.AWAITING_PROOF,
+            total_price=Decimal("125000.00"),
+            total_uzs=Decimal("125000.00"),
+        )
+        payment = Payment.objects.create(
+            order=order, amount_uzs=Decimal("125000.00"), provider="test", status=Payment.Status.AWAITING_PROOF,
+        )
+        url = f"/api/telegram/orders/{order.id}/proof/"
+        self.assertEqual(
+            self.client.get(url, {"telegram_admin_id": admin.telegram_id}).status_code, status.HTTP_404_NOT_FOUND,
+        )
+        for file_id in ("OLD", "NEW"):
+            PaymentProof.objects.create(payment=payment, telegram_file_id=file_id, submitted_by_telegram=self.telegram_user)
+
+        self.assertEqual(
+            self.client.get(url, {"telegram_admin_id": self.telegram_user.telegram_id}).status_code,
+            status.HTTP_403_FORBIDDEN,
+        )
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {"telegram_admin_id": admin.telegram_id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {
+            "order_id": order.id,
+            "payment_id": payment.id,
+            "proof_id": PaymentProof.objects.get(telegram_file_id="NEW").id,
+            "telegram_file_id": "NEW",
+            "image_url": None,
+            "customer_telegram_id": self.telegram_user.telegram_id,
+        })
+
+
+    def test_stale_approval_loses_without_reads(self):
+        order = Order.objects.create(
+            telegram_user=self.telegram_user,
+            total_price=Decimal("125000.00"),
+            total_uzs=Decimal("125000.00"),
+            status=Order.Status.UNDER_REVIEW,
+        )
+        payment = Payment.objects.create(
+            order=order, amount_uzs=Decimal("125000.00"), provider="test", status=Payment.Status.UNDER_REVIEW,
+        )
+        first, second = services.get_payment(payment.id), services.get_payment(payment.id)
+        services.approve_payment(first)
+        with CaptureQueriesContext(connection) as queries, self.assertRaisesMessage(ServiceError, "already processed"):
+            services.reject_payment(second, "duplicate")
+        self.assertFalse([query for query in queries.captured_queries if query["sql"].startswith("SELECT")])
+
+        payment.refresh_from_db()
+        self.assertEqual((payment.status, payment.rejection_reason), (Payment.Status.PAID, ""))
+        self.assertIsNotNone(payment.reviewed_at)
+        self.assertEqual(list(order.status_history.values_list("new_status", flat=True)), [Order.Status.PAID])
+
+        # Переход не из таблицы — без запросов
+        with self.assertNumQueries(0):
+            self.assertFalse(second.order.set_status(Order.Status.AWAITING_PROOF))
+
+
+    def test_moderation_write_path_query_counts(self):
+        order = Order.objects.create(
+            telegram_user=self.telegram_user,
+            total_price=Decimal("125000.00"),
+            total_uzs=Decimal("125000.00"),
+            status=Order.Status.AWAITING_PROOF,
+        )
+        # Новый платёж: снять активность со старых и вставить; без exists() и загрузки связей
+        with CaptureQueriesContext(connection) as queries:
+            payment = Payment.objects.create(
+                order=order, amount_uzs=Decimal("125000.00"), provider="test", status=Payment.Status.AWAITING_PROOF,
+            )
+        self.assertEqual([query["sql"].split()[0] for query in queries.captured_queries if "SAVEPOINT" not in query["sql"]], ["UPDATE", "INSERT"])
+
+        def table_writes(queries, table):
+            return [query["sql"].split()[0] for query in queries.captured_queries if f'"{table}"' in query["sql"].split("WHERE")[0]]
+
+        payload = {"order_id": order.id, "telegram_user_id": self.telegram_user.telegram_id, "telegram_file_id": "F-1", "message_id": "M-1"}
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post("/api/telegram/payment/proof/", payload, format="json")
+        self.assertEqual(table_writes(queries, "site_app_paymentproof"), ["INSERT"])
+        self.assertEqual(table_writes(queries, "site_app_payment"), ["SELECT", "UPDATE"])
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post("/api/telegram/payment/proof/", payload, format="json")
+        self.assertEqual(table_writes(queries, "site_app_paymentproof"), ["INSERT"])
+        self.assertEqual(PaymentProof.objects.filter(payment=payment).count(), 1)
+
+        payment = services.get_payment(payment.id)
+        with CaptureQueriesContext(connection) as queries:
+            services.approve_payment(payment)
+        self.assertEqual(table_writes(queries, "site_app_payment"), ["UPDATE"])
+        self.assertEqual(table_writes(queries, "site_app_order"), ["UPDATE"])
+        self.assertEqual(table_writes(queries, "site_app_orderstatushistory"), ["INSERT"])
+
+        # Частичное сохранение без статуса: ни проверок связей, ни снятия активности
+        payment.provider = "click"
+        with CaptureQueriesContext(connection) as queries:
+            payment.save(update_fields=["provider"])
+        self.assertEqual([query["sql"].split()[0] for query in queries.captured_queries if "SAVEPOINT" not in query["sql"]], ["UPDATE"])
+
+    def test_second_active_payment_is_refused_by_index(self):
+        order = Order.objects.create(total_price=Decimal("1000.00"), total_uzs=Decimal("1000.00"))
+        first = Payment.objects.create(order=order, amount_uzs=Decimal("1000.00"), provider="test")
+        second = Payment.objects.create(order=order, amount_uzs=Decimal("1000.00"), provider="test")
+        first.refresh_from_db()
+        self.assertEqual((first.is_active, second.is_active), (False, True))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Payment.objects.filter(pk=first.pk).update(is_active=True)
+
+    def test_only_paid_payments_become_inactive(self):
+        # Одно правило для transition(), save() и массовой модерации: оплаченный закрыт, отклонённый — нет
+        rejected, paid = self._payment_under_review(), self._payment_under_review()
+        self.assertTrue(rejected.transition(Payment.Status.REJECTED, rejection_reason="blurry"))
+        self.assertTrue(paid.transition(Payment.Status.PAID))
+        saved_rejected, saved_paid = self._payment_under_review(), self._payment_under_review()
+        saved_rejected.status, saved_rejected.rejection_reason = Payment.Status.REJECTED, "blurry"
+        saved_rejected.save(update_fields=["status", "rejection_reason"])
+        saved_paid.status = Payment.Status.PAID
+        saved_paid.save(update_fields=["status"])
+        bulk_rejected, bulk_paid = self._payment_under_review(), self._payment_under_review()
+        services.moderate_payments([
+            {"payment_id": bulk_rejected.id, "action": "reject", "reason": "blurry"},
+            {"payment_id": bulk_paid.id, "action": "approve", "reason": ""},
+        ])
+        REJECTED, PAID = Payment.Status.REJECTED, Payment.Status.PAID
+        for payment, expected in ((rejected, (REJECTED, True)), (paid, (PAID, False)), (saved_rejected, (REJECTED, True)),
+                                  (saved_paid, (PAID, False)), (bulk_rejected, (REJECTED, True)), (bulk_paid, (PAID, False))):
+            payment.refresh_from_db()
+            self.assertEqual((payment.status, payment.is_active), expected)
+            self.assertIsNotNone(payment.reviewed_at)
+
+        # Отклонённый платёж принимает новый чек
+        response = self.client.post("/api/telegram/payment/proof/", {
+            "order_id": saved_rejected.order_id, "telegram_user_id": self.telegram_user.telegram_id, "telegram_file_id": "AGAIN",
+        }, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["order_status"], Order.Status.UNDER_REVIEW)
+
+    def test_proof_for_canceled_or_paid_order_is_refused(self):
+        order = Order.objects.create(
+            telegram_user=self.telegram_user,
+            total_price=Decimal("125000.00"),
+            total_uzs=Decimal("125000.00"),
+            status=Order.Status.AWAITING_PROOF,
+        )
+        payment = Payment.objects.create(
+            order=order, amount_uzs=Decimal("125000.00"), provider="test", status=Payment.Status.AWAITING_PROOF,
+        )
+        services.cancel_order(order, "no stock")
+        payload = {"order_id": order.id, "telegram_user_id": self.telegram_user.telegram_id, "telegram_file_id": "LATE"}
+        response = self.client.post("/api/telegram/payment/proof/", payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()["detail"], "Order already canceled.")
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Payment.Status.REJECTED)
+        self.assertFalse(payment.proofs.exists())
+        self.assertFalse(Payment.objects.filter(status=Payment.Status.UNDER_REVIEW).exists())
+
+        paid = self._payment_under_review()
+        services.approve_payment(services.get_payment(paid.id))
+        for data in ({"order_id": paid.order_id}, {"payment_id": paid.id}):
+            response = self.client.post(
+                "/api/telegram/payment/proof/",
+                {**data, "telegram_user_id": self.telegram_user.telegram_id, "telegram_file_id": f"PAID-{len(data)}"},
+                format="json",
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.json()["detail"], "Order already paid.")
+
+        # Заказ отменили между проверкой и переходом: чек и статус платежа откатываются
+        racing = self._payment_under_review()
+        racing.order.status = Order.Status.REJECTED
+        racing.order.save(update_fields=["status"])
+        racing.status = Payment.Status.REJECTED
+        racing.rejection_reason = "blurry"
+        racing.save(update_fields=["status", "rejection_reason"])
+        original_set_status = Order.set_status
+
+        def cancel_first(order, *args, **kwargs):
+            Order.objects.filter(pk=order.pk).update(status=Order.Status.CANCELED)
+            return original_set_status(order, *args, **kwargs)
+
+        with mock.patch.object(Order, "set_status", cancel_first):
+            response = self.client.post("/api/telegram/payment/proof/", {
+                "order_id": racing.order_id, "telegram_user_id": self.telegram_user.telegram_id, "telegram_file_id": "RACE",
+            }, format="json")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        racing.refresh_from_db()
+        self.assertEqual((racing.status, racing.proofs.count()), (Payment.Status.REJECTED, 0))
+
+    def _payment_under_review(self, telegram_user=None):
+        order = Order.objects.create(
+            telegram_user=telegram_user or self.telegram_user,
+            total_price=Decimal("125000.00"),
+            total_uzs=Decimal("125000.00"),
+            status=Order.Status.UNDER_REVIEW,
+        )
+        return Payment.objects.create(
+            order=order, amount_uzs=Decimal("125000.00"), provider="test", status=Payment.Status.UNDER_REVIEW,
+        )
+
+    @override_settings(BOT_TOKEN="TEST", NOTIFICATION_WORKERS=0)
+    def test_bulk_moderation_applies_batch_in_one_transaction(self):
+        admin = User.objects.create_superuser(username="bulk", email="bulk@example.com", password="adminpass")
+        approve = [self._payment_under_review() for _ in range(3)]
+        reject = self._payment_under_review()
+        done = self._payment_under_review()
+        done.transition(Payment.Status.PAID)
+        canceled = self._payment_under_review()
+        canceled.order.set_status(Order.Status.CANCELED)
+        decisions = [{"payment_id": payment.id, "action": "approve"} for payment in approve] + [
+            {"payment_id": reject.id, "action": "reject", "reason": "Сумма не совпадает"},
+            {"payment_id": done.id, "action": "reject", "reason": "late"},
+            {"payment_id": canceled.id, "action": "approve"},
+            {"payment_id": 999999, "action": "approve"},
+        ]
+        self.client.force_authenticate(user=admin)
+
+        with mock.patch("site_app.services.notifications.requests.Session") as session, \
+                self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            response = self.client.post("/api/admin/payments/bulk/", {"decisions": decisions}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.json()
+        self.assertEqual([item["payment_id"] for item in body["results"]], [item["payment_id"] for item in decisions])
+        self.assertEqual(
+            [item["result"] for item in body["results"]],
+            ["approved"] * 3 + ["rejected", "already_processed", "order_changed", "not_found"],
+        )
+        self.assertEqual((body["approved"], body["rejected"], body["skipped"], body["notifications_queued"]), (3, 1, 3, 4))
+
+        # Платежи — по одному UPDATE на действие, заказы — один UPDATE на пару статусов, история — одна вставка
+        writes = [query["sql"].split()[0] + " " + query["sql"].split()[2 if query["sql"].startswith("INSERT") else 1]
+                  for query in queries.captured_queries if query["sql"].startswith(("UPDATE", "INSERT"))]
+        self.assertEqual(writes.count('UPDATE "site_app_payment"'), 2)
+        self.assertEqual(writes.count('UPDATE "site_app_order"'), 2)
+        self.assertEqual(writes.count('INSERT "site_app_orderstatushistory"'), 1)
+
+        for payment in approve:
+            payment.refresh_from_db()
+            self.assertEqual((payment.status, payment.reviewed_by, payment.order.status), (Payment.Status.PAID, admin, Order.Status.PAID))
+            self.assertEqual(payment.order.status_history.get().changed_by, admin)
+        reject.refresh_from_db()
+        self.assertEqual((reject.status, reject.rejection_reason, reject.order.status), (Payment.Status.REJECTED, "Сумма не совпадает", Order.Status.REJECTED))
+        self.assertEqual(reject.order.status_history.get().comment, "Сумма не совпадает")
+        canceled.refresh_from_db()
+        self.assertEqual(canceled.status, Payment.Status.UNDER_REVIEW)
+
+        # Все уведомления — одной задачей через одно соединение
+        session.assert_called_once()
+        self.assertEqual(session.return_value.__enter__.return_value.post.call_count, 4)
+
+    def test_bulk_moderation_validation_and_telegram_admin(self):
+        payment = self._payment_under_review()
+        admin = TelegramUser.objects.create(telegram_id=555000777, name="Admin", is_admin=True)
+        url = "/api/telegram/payment/bulk/"
+        cases = [
+            {"decisions": []},
+            {"decisions": [{"payment_id": payment.id, "action": "reject"}], "telegram_admin_id": admin.telegram_id},
+            {"decisions": [{"payment_id": payment.id, "action": "approve"}] * 2, "telegram_admin_id": admin.telegram_id},
+        ]
+        for payload in cases:
+            self.assertEqual(self.client.post(url, payload, format="json").status_code, status.HTTP_400_BAD_REQUEST)
+        payload = {"decisions": [{"payment_id": payment.id, "action": "approve"}]}
+        self.assertEqual(
+            self.client.post(url, {**payload, "telegram_admin_id": self.telegram_user.telegram_id}, format="json").status_code,
+            status.HTTP_403_FORBIDDEN,
+        )
+        self.assertEqual(
+            self.client.post("/api/admin/payments/bulk/", payload, format="json").status_code,
+            status.HTTP_401_UNAUTHORIZED,
+        )
+
+        response = self.client.post(url, {**payload, "telegram_admin_id": admin.telegram_id}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["results"][0]["order_status"], Order.Status.PAID)
+        payment.refresh_from_db()
+        self.assertEqual((payment.status, payment.reviewed_by), (Payment.Status.PAID, None))
+
+        # Проигравший гонку UPDATE откатывает всю пачку
+        second, third = self._payment_under_review(), self._payment_under_review()
+        decisions = [{"payment_id": second.id, "action": "approve"}, {"payment_id": third.id, "action": "approve"}]
+        original_in_bulk = type(Payment.objects.all()).in_bulk
+
+        def in_bulk_then_race(queryset, *args, **kwargs):
+            loaded = original_in_bulk(queryset, *args, **kwargs)
+            Payment.objects.filter(pk=third.id).update(status=Payment.Status.REJECTED)
+            return loaded
+
+        with mock.patch.object(type(Payment.objects.all()), "in_bulk", in_bulk_then_race):
+            response = self.client.post(url, {"decisions": decisions, "telegram_admin_id": admin.telegram_id}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        second.refresh_from_db()
+        self.assertEqual((second.status, second.order.status), (Payment.Status.UNDER_REVIEW, Order.Status.UNDER_REVIEW))
+
+
+class SchemaCacheTests(APITestCase):
+    def setUp(self):
+        clear_schema_cache()
+
+    def test_schema_is_built_once_and_revalidated_with_etag(self):
+        with mock.patch("site_proj.schema.build_schema", wraps=build_schema) as build:
+            first = self.client.get("/swagger.json")
+            second = self.client.get("/swagger.json")
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(build.call_count, 1)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first["ETag"], second["ETag"])
+
+        not_modified = self.client.get("/swagger.json", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_code_version_covers_nested_modules(self):
+        with tempfile.TemporaryDirectory() as base_dir:
+            nested = Path(base_dir, "site_app", "services", "orders.py")
+            nested.parent.mkdir(parents=True)
+            nested.write_text("A = 1\n")
+            with override_settings(BASE_DIR=Path(base_dir), API_SCHEMA_VERSION=""):
+                clear_schema_cache()
+                before = code_version()
+                nested.write_text("A = 2\n")
+                clear_schema_cache()
+                self.assertNotEqual(code_version(), before)
+        clear_schema_cache()
+
+
+class AdminChangelistTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.force_login(self.admin)
+        self.telegram_user = TelegramUser.objects.create(telegram_id=777000111, name="Buyer")
+        self.orders = [
+            Order.objects.create(
+                telegram_user=self.telegram_user,
+                total_price=Decimal("1000.00"),
+                total_uzs=Decimal("1000.00"),
+                customer_phone=f"+99890000000{i}",
+            )
+            for i in range(3)
+        ]
+        for order in self.orders:
+            Payment.objects.create(order=order, amount_uzs=Decimal("1000.00"), provider="test")
+
+    def test_order_search_matches_exact_id_and_phone(self):
+        order = self.orders[1]
+        by_id = self.client.get("/admin/site_app/order/", {"q": str(order.pk)})
+        self.assertEqual(list(by_id.context["cl"].result_list), [order])
+
+        by_phone = self.client.get("/admin/site_app/order/", {"q": "998900000001"})
+        self.assertEqual(list(by_phone.context["cl"].result_list), [order])
+
+        partial = self.client.get("/admin/site_app/order/", {"q": "99890"})
+        self.assertEqual(list(partial.context["cl"].result_list), [])
+
+    def test_order_filters_by_telegram_id_input(self):
+        response = self.client.get("/admin/site_app/order/", {"telegram_id": self.telegram_user.telegram_id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.context["cl"].result_count, 3)
+        self.assertContains(response, 'name="telegram_id"')
+
+    def test_payment_changelist_query_count_does_not_grow_with_rows(self):
+        self.client.get("/admin/site_app/payment/")
+        with self.assertNumQueries(6):
+            response = self.client.get("/admin/site_app/payment/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        for payment in Payment.objects.all():
+            for file_id in ("A", "B"):
+                PaymentProof.objects.create(
+                    payment=payment, telegram_file_id=f"{file_id}-{payment.pk}", submitted_by_telegram=self.telegram_user,
+                )
+        self.client.get("/admin/site_app/paymentproof/")
+        with self.assertNumQueries(5):
+            response = self.client.get("/admin/site_app/paymentproof/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.context["cl"].result_count, 6)
+
+
+class SalesRollupTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser("rollup-admin", "rollup@example.com", "password")
+        category = Category.objects.create(name="Balloons", slug="balloons")
+        self.product = Product.objects.create(category=category, title="Balloon", price=Decimal("5000.00"))
+        self.telegram_user = TelegramUser.objects.create(telegram_id=888000111, name="Buyer")
+
+    def _checkout(self, quantity):
+        response = self.client.post("/api/checkout/", {
+            "telegram_user_id": self.telegram_user.telegram_id,
+            "cart_items": [{"product_id": self.product.id, "quantity": quantity}],
+            "address": "Test address",
+        }, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return Order.objects.get(pk=response.data["order_id"])
+
+    def _snapshot(self):
+        return (
+            sorted(DailySourceRevenue.objects.filter(orders_count__gt=0).values_list("date", "source", "orders_count", "revenue_uzs")),
+            sorted(DailyProductSales.objects.filter(units__gt=0).values_list("date", "product_id", "units", "revenue_uzs")),
+            sorted(DailyOrderStatusCount.objects.filter(count__gt=0).values_list("date", "status", "count")),
+        )
+
+    def test_rollups_follow_payment_and_cancellation(self):
+        paid_order = self._checkout(3)
+        canceled_order = self._checkout(1)
+        self._checkout(2)
+
+        self.client.force_authenticate(user=self.admin)
+        for order in (paid_order, canceled_order):
+            payment = order.payments.get()
+            response = self.client.post(f"/api/admin/payments/{payment.id}/approve/")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post(f"/api/admin/orders/{canceled_order.id}/cancel/", {"reason": "Out of stock"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        summary = rollups.dashboard_summary(days=7)
+        self.assertEqual(summary["total_orders"], 1)
+        self.assertEqual(summary["total_revenue"], Decimal("15000.00"))
+        self.assertEqual(summary["top_products"][0]["units"], 3)
+        counts = {row["status"]: row["count"] for row in summary["by_status"]}
+        self.assertEqual(counts[Order.Status.PAID], 1)
+        self.assertEqual(counts[Order.Status.CANCELED], 1)
+        self.assertEqual(counts[Order.Status.PENDING_PAYMENT_LINK], 1)
+
+        incremental = self._snapshot()
+        rollups.rebuild()
+        self.assertEqual(self._snapshot(), incremental)
+
+    def test_dashboard_reads_only_rollups(self):
+        self._checkout(1)
+        self.client.force_login(self.admin)
+        with self.assertNumQueries(6):
+            response = self.client.get("/admin/site_app/dailysourcerevenue/", {"days": 90})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertContains(response, "Sales dashboard")
+
+
+class StockReservationTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser("stock-admin", "stock@example.com", "password")
+        category = Category.objects.create(name="Sets", slug="sets")
+        self.product = Product.objects.create(category=category, title="Party set", price=Decimal("90000.00"), stock=5)
+        self.telegram_user = TelegramUser.objects.create(telegram_id=999000111, name="Buyer")
+
+    def _checkout(self, quantity):
+        return self.client.post("/api/checkout/", {
+            "telegram_user_id": self.telegram_user.telegram_id,
+            "cart_items": [{"product_id": self.product.id, "quantity": quantity}],
+            "address": "Test address",
+        }, format="json")
+
+    def test_checkout_reserves_and_refuses_oversell(self):
+        response = self._checkout(4)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.reserved), (1, 4))
+
+        response = self._checkout(2)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("Not enough stock", response.data["detail"])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_payment_commits_and_cancellation_releases(self):
+        paid = Order.objects.get(pk=self._checkout(2).data["order_id"])
+        expired = Order.objects.get(pk=self._checkout(3).data["order_id"])
+
+        self.client.force_authenticate(user=self.admin)
+        payment = paid.payments.get()
+        self.client.post(f"/api/admin/payments/{payment.id}/approve/")
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.reserved), (0, 3))
+
+        Order.objects.filter(pk=expired.pk).update(payment_deadline_at=timezone.now() - timedelta(minutes=1))
+        call_command("cancel_expired_orders", stdout=mock.MagicMock())
+        call_command("cancel_expired_orders", stdout=mock.MagicMock())
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.reserved), (3, 0))
+        self.assertEqual(
+            dict(StockReservation.objects.values_list("order_id", "status")),
+            {paid.id: StockReservation.Status.COMMITTED, expired.id: StockReservation.Status.RELEASED},
+        )
+
+    def test_untracked_products_are_not_limited(self):
+        Product.objects.filter(pk=self.product.pk).update(stock=None)
+        response = self._checkout(50)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(StockReservation.objects.exists())
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    def test_parallel_checkouts_never_oversell(self):
+        category = Category.objects.create(name="Limited", slug="limited")
+        product = Product.objects.create(category=category, title="Last sets", price=Decimal("50000.00"), stock=3)
+        buyers = [TelegramUser.objects.create(telegram_id=100000 + i, name=f"Buyer {i}") for i in range(12)]
+        barrier = threading.Barrier(len(buyers))
+        results = []
+
+        def checkout(buyer):
+            client = APIClient()
+            barrier.wait()
+            try:
+                response = client.post("/api/checkout/", {
+                    "telegram_user_id": buyer.telegram_id,
+                    "cart_items": [{"product_id": product.id, "quantity": 1}],
+                    "address": "Test address",
+                }, format="json")
+                results.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout, args=(buyer,)) for buyer in buyers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        self.assertEqual(results.count(status.HTTP_201_CREATED), 3)
+        self.assertEqual(results.count(status.HTTP_400_BAD_REQUEST), len(buyers) - 3)
+        self.assertEqual((product.stock, product.reserved), (0, 3))
+        self.assertEqual(StockReservation.objects.count(), 3)
+
+    def test_parallel_cart_adds_make_one_line(self):
+        user = User.objects.create_user("double-tap", password="secret")
+        category = Category.objects.create(name="Cups", slug="cups")
+        product = Product.objects.create(category=category, title="Cup", price=Decimal("1000.00"))
+        barrier = threading.Barrier(8)
+        results = []
+
+        def add(path, payload):
+            client = APIClient()
+            client.force_authenticate(user)
+            barrier.wait()
+            try:
+                results.append(client.post(path, payload, format="json").status_code)
+            finally:
+                connection.close()
+
+        calls = [("/api/cart/add/", {"product_id": product.id, "quantity": 2})] * 6
+        calls += [("/api/favorites/add/", {"product_id": product.id})] * 2
+        threads = [threading.Thread(target=add, args=call) for call in calls]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [status.HTTP_201_CREATED] * len(calls))
+        self.assertEqual(list(CartItem.objects.filter(user=user).values_list("quantity", flat=True)), [12])
+        self.assertEqual(Favorite.objects.filter(user=user).count(), 1)
+
+
+    def test_parallel_approvals_win_once(self):
+        admins = [TelegramUser.objects.create(telegram_id=200000 + i, is_admin=True) for i in range(6)]
+        order = Order.objects.create(
+            total_price=Decimal("90000.00"), total_uzs=Decimal("90000.00"), status=Order.Status.UNDER_REVIEW,
+        )
+        payment = Payment.objects.create(
+            order=order, amount_uzs=Decimal("90000.00"), provider="test", status=Payment.Status.UNDER_REVIEW,
+        )
+        barrier = threading.Barrier(len(admins))
+        results = []
+
+        def approve(admin):
+            client = APIClient()
+            barrier.wait()
+            try:
+                response = client.post(
+                    f"/api/telegram/payment/{payment.id}/approve/", {"telegram_admin_id": admin.telegram_id}, format="json",
+                )
+                results.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=approve, args=(admin,)) for admin in admins]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(results), [status.HTTP_200_OK] + [status.HTTP_400_BAD_REQUEST] * (len(admins) - 1))
+        self.assertEqual(OrderStatusHistory.objects.filter(order=order, new_status=Order.Status.PAID).count(), 1)
+
+
+class IdempotentCheckoutTests(APITestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Cakes", slug="cakes")
+        self.product = Product.objects.create(category=category, title="Cake", price=Decimal("70000.00"))
+        self.payload = {
+            "telegram_user_id": 444000111,
+            "cart_items": [{"product_id": self.product.id, "quantity": 1}],
+            "address": "Test address",
+        }
+
+    def _checkout(self, key, payload=None):
+        return self.client.post("/api/checkout/", payload or self.payload, format="json", HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_repeated_key_replays_response_without_new_order(self):
+        with mock.patch("site_app.services.checkout.notify_admin_new_order") as notify:
+            first = self._checkout("key-1")
+            second = self._checkout("key-1")
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Payment.objects.count(), 1)
+        self.assertEqual(notify.call_count, 1)
+
+    def test_key_reused_with_different_request_is_rejected(self):
+        self._checkout("key-2")
+        other = dict(self.payload, cart_items=[{"product_id": self.product.id, "quantity": 2}])
+        response = self._checkout("key-2", other)
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_in_progress_key_conflicts_and_expired_key_is_reusable(self):
+        self._checkout("key-3")
+        # Как будто первый запрос ещё не закончился
+        IdempotencyKey.objects.filter(key="key-3").update(status_code=None, response_body=None)
+        response = self._checkout("key-3")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        self._checkout("key-4")
+        IdempotencyKey.objects.filter(key="key-4").update(expires_at=timezone.now() - timedelta(seconds=1))
+        response = self._checkout("key-4")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn("Idempotent-Replayed", response)
+        self.assertEqual(Order.objects.count(), 3)
+
+
+class ProductBulkTests(APITestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Candles", slug="candles")
+        self.products = [
+            Product.objects.create(category=category, title=f"Candle {index}", price=Decimal("5000.00"))
+            for index in range(3)
+        ]
+
+    def test_returns_requested_products_in_order_with_one_query(self):
+        first, second, third = self.products
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/products/bulk/", {"ids": f"{third.id},{first.id},999999,{third.id}"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([product["id"] for product in response.json()], [third.id, first.id])
+
+        response = self.client.post("/api/products/bulk/", {"ids": [second.id]}, format="json")
+        self.assertEqual([product["id"] for product in response.json()], [second.id])
+        response = self.client.post("/api/products/bulk/", [third.id, second.id], format="json")
+        self.assertEqual([product["id"] for product in response.json()], [third.id, second.id])
+
+    def test_rejects_bad_or_too_many_ids(self):
+        self.assertEqual(self.client.get("/api/products/bulk/").status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            self.client.get("/api/products/bulk/", {"ids": "1,x"}).status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
+        with self.settings(PRODUCT_BULK_MAX_IDS=2):
+            response = self.client.get("/api/products/bulk/", {"ids": "1,2,3"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        for body in ([1, {"id": 2}], 5, [], None):
+            response = self.client.post("/api/products/bulk/", body, format="json")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, body)
+            self.assertIn("ids", response.json())
+
+
+class CartSyncTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("cart-user", password="secret")
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(name="Cups", slug="cups")
+        self.kept, self.changed, self.removed, self.added = [
+            Product.objects.create(category=category, title=f"Cup {index}", price=Decimal("1000.00"))
+            for index in range(4)
+        ]
+        for product, quantity in ((self.kept, 1), (self.changed, 1), (self.removed, 3)):
+            CartItem.objects.create(user=self.user, product=product, quantity=quantity)
+
+    def test_replaces_cart_and_returns_priced_items(self):
+        payload = {"items": [
+            {"product_id": self.kept.id, "quantity": 1},
+            {"product_id": self.changed.id, "quantity": 2},
+            {"product_id": self.added.id, "quantity": 1},
+            {"product_id": self.added.id, "quantity": 1},
+            {"product_id": 999999, "quantity": 1},
+        ]}
+        response = self.client.put("/api/cart/sync/", payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        quantities = {item["product"]["id"]: item["quantity"] for item in data["items"]}
+        self.assertEqual(quantities, {self.kept.id: 1, self.changed.id: 2, self.added.id: 2})
+        self.assertEqual(Decimal(data["total_price"]), Decimal("5000.00"))
+        self.assertEqual(data["unknown_product_ids"], [999999])
+        self.assertFalse(CartItem.objects.filter(user=self.user, product=self.removed).exists())
+
+        response = self.client.put("/api/cart/sync/", {"items": []}, format="json")
+        self.assertEqual(response.json()["items"], [])
+        self.assertFalse(CartItem.objects.filter(user=self.user).exists())
+
+    def test_rejects_invalid_lines(self):
+        response = self.client.put(
+            "/api/cart/sync/", {"items": [{"product_id": self.kept.id, "quantity": -1}]}, format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        with self.settings(CART_SYNC_MAX_ITEMS=1):
+            response = self.client.put("/api/cart/sync/", {"items": [
+                {"product_id": self.kept.id}, {"product_id": self.added.id},
+            ]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(CartItem.objects.filter(user=self.user).count(), 3)
+
+    @mock.patch("site_app.services.checkout.notify_admin_new_order")
+    def test_checkout_moves_cart_lines_to_order(self, _notify):
+        response = self.client.post("/api/checkout/", {"address": "Test address"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        order = Order.objects.get(pk=response.json()["order_id"])
+        self.assertEqual(
+            sorted(order.order_products.values_list("product_id", "quantity")),
+            [(self.kept.id, 1), (self.changed.id, 1), (self.removed.id, 3)],
+        )
+        self.assertFalse(CartItem.objects.filter(user=self.user).exists())
+
+        self.client.post("/api/cart/add/", {"product_id": self.kept.id}, format="json")
+        self.assertEqual(len(self.client.get("/api/cart/").json()["items"]), 1)
+
+
+class OrderHistoryTests(APITestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Balloons", slug="balloons")
+        products = [
+            Product.objects.create(category=category, title=f"Balloon {index}", price=Decimal("1000.00"))
+            for index in range(4)
+        ]
+        self.telegram_user = TelegramUser.objects.create(telegram_id=444555666, name="History")
+        other = TelegramUser.objects.create(telegram_id=444555667, name="Other")
+        Order.objects.create(telegram_user=other, total_price=Decimal("1000.00"))
+        self.orders = []
+        for index in range(7):
+            order = Order.objects.create(telegram_user=self.telegram_user, total_price=Decimal("4000.00"))
+            for product in products[:index % 4 + 1]:
+                OrderProduct.objects.create(
+                    order=order, product=product, product_title=product.title, quantity=2, price_uzs=product.price,
+                )
+            self.orders.append(order)
+        # Одинаковое время создания: порядок внутри решает id
+        same_time = self.orders[3].created_at
+        Order.objects.filter(pk__in=[self.orders[2].pk, self.orders[4].pk]).update(created_at=same_time)
+
+    def expected_ids(self):
+        return list(
+            Order.objects.filter(telegram_user=self.telegram_user).order_by("-created_at", "-id").values_list("id", flat=True)
+        )
+
+    def test_keyset_pages_with_fixed_query_count(self):
+        seen, cursor = [], None
+        while True:
+            params = {"telegram_user_id": self.telegram_user.telegram_id, "limit": 3}
+            if cursor:
+                params["cursor"] = cursor
+            with self.assertNumQueries(2):
+                response = self.client.get("/api/telegram/orders/", params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            page = response.json()
+            seen.extend(order["id"] for order in page["results"])
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+        self.assertEqual(seen, self.expected_ids())
+
+        first = self.client.get("/api/telegram/orders/", {"telegram_user_id": self.telegram_user.telegram_id}).json()
+        newest = first["results"][0]
+        self.assertEqual(newest["id"], self.orders[-1].id)
+        self.assertEqual(newest["items_count"], 6)
+        self.assertEqual(newest["summary"], "Balloon 0 ×2, Balloon 1 ×2, Balloon 2 ×2")
+        self.assertEqual(newest["formatted_total"], "4 000 сум")
+
+        # Сумма — как Order.formatted_total: total_uzs важнее total_price
+        Order.objects.filter(pk=newest["id"]).update(total_uzs=Decimal("4500.00"))
+        newest = self.client.get("/api/telegram/orders/", {"telegram_user_id": self.telegram_user.telegram_id}).json()["results"][0]
+        self.assertEqual(newest["formatted_total"], Order.objects.get(pk=newest["id"]).formatted_total)
+        self.assertEqual(newest["formatted_total"], "4 500 сум")
+
+    def test_rejects_bad_parameters(self):
+        self.assertEqual(self.client.get("/api/telegram/orders/").status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(
+            "/api/telegram/orders/", {"telegram_user_id": self.telegram_user.telegram_id, "cursor": "oops"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class OrderDeadlinesTests(APITestCase):
+    def setUp(self):
+        self.telegram_user = TelegramUser.objects.create(telegram_id=121212121, name="Deadlines")
+        other = TelegramUser.objects.create(telegram_id=121212122, name="Other")
+        self.orders = [
+            Order.objects.create(
+                telegram_user=self.telegram_user,
+                total_price=Decimal("1000.00"),
+                status=Order.Status.AWAITING_PROOF,
+                payment_deadline_at=timezone.now() + timedelta(minutes=minutes),
+            )
+            for minutes in (30, -5)
+        ]
+        self.foreign = Order.objects.create(telegram_user=other, total_price=Decimal("1000.00"))
+
+    def test_many_orders_in_one_query(self):
+        ids = [self.orders[1].id, self.foreign.id, 999999, self.orders[0].id]
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                "/api/orders/deadlines/",
+                {"ids": ",".join(map(str, ids)), "telegram_user_id": self.telegram_user.telegram_id},
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual([item["order_id"] for item in data], [self.orders[1].id, self.orders[0].id])
+        self.assertTrue(data[0]["is_expired"])
+        self.assertFalse(data[1]["is_expired"])
+        self.assertGreater(data[1]["seconds_left"], 0)
+        self.assertEqual(data[1]["status"], Order.Status.AWAITING_PROOF)
+
+        # Без владельца — пустой ответ, без ids — 400
+        self.assertEqual(self.client.get("/api/orders/deadlines/", {"ids": self.orders[0].id}).json(), [])
+        self.assertEqual(self.client.get("/api/orders/deadlines/").status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(ORDER_EVENTS_HEARTBEAT=0.05, ORDER_EVENTS_STREAM_SECONDS=1)
+class OrderEventsTests(APITestCase):
+    def setUp(self):
+        self.telegram_user = TelegramUser.objects.create(telegram_id=777888999, name="Events")
+        self.order = Order.objects.create(
+            telegram_user=self.telegram_user,
+            total_price=Decimal("5000.00"),
+            total_uzs=Decimal("5000.00"),
+            status=Order.Status.AWAITING_PROOF,
+            payment_deadline_at=timezone.now() + timedelta(hours=1),
+        )
+        self.url = f"/api/orders/{self.order.id}/events/"
+
+    @staticmethod
+    def parse(chunk: bytes) -> dict:
+        fields = dict(line.split(": ", 1) for line in chunk.decode().strip().splitlines())
+        return {"id": int(fields["id"]), "event": fields["event"], "data": json.loads(fields["data"])}
+
+    def test_snapshot_then_live_updates(self):
+        response = self.client.get(
+            self.url, {"telegram_user_id": self.telegram_user.telegram_id}, HTTP_ACCEPT="text/event-stream",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        chunks = iter(response.streaming_content)
+        self.assertEqual(next(chunks), b"retry: 3000\n\n")
+        snapshot = self.parse(next(chunks))
+        self.assertEqual(snapshot["event"], "snapshot")
+        self.assertEqual(snapshot["data"]["status"], Order.Status.AWAITING_PROOF)
+        self.assertIsNone(snapshot["data"]["payment_status"])
+
+        # Без событий соединение поддерживается комментариями
+        self.assertEqual(next(chunks), b": ping\n\n")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.set_status(Order.Status.UNDER_REVIEW)
+        update = self.parse(next(chunks))
+        self.assertEqual(update["event"], "status")
+        self.assertEqual(update["data"]["status"], Order.Status.UNDER_REVIEW)
+        self.assertGreater(update["id"], snapshot["id"])
+        # До конца ORDER_EVENTS_STREAM_SECONDS — только ping, затем поток закрывается
+        self.assertEqual(set(chunks), {b": ping\n\n"})
+
+    def test_reconnect_replays_only_missed_events(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            payment = Payment.objects.create(
+                order=self.order, amount_uzs=Decimal("5000.00"), provider="test", status=Payment.Status.AWAITING_PROOF,
+            )
+        seen = events.get_broker().last_id
+        with self.captureOnCommitCallbacks(execute=True):
+            payment.status = Payment.Status.UNDER_REVIEW
+            payment.save()
+
+        response = self.client.get(
+            self.url, {"telegram_user_id": self.telegram_user.telegram_id}, HTTP_LAST_EVENT_ID=str(seen),
+        )
+        chunks = iter(response.streaming_content)
+        next(chunks)
+        replayed = self.parse(next(chunks))
+        self.assertEqual(replayed["event"], "payment")
+        self.assertEqual(replayed["data"]["status"], Payment.Status.UNDER_REVIEW)
+        self.assertEqual(set(chunks), {b": ping\n\n"})
+
+    def test_replay_beyond_history_asks_for_snapshot(self):
+        broker = events.InProcessBroker(history_size=2)
+        first = broker.publish("order:1", "status", {"status": "a"})
+        for index in range(3):
+            broker.publish("order:1", "status", {"status": index})
+        self.assertIsNone(broker.replay("order:1", first.id))
+        self.assertEqual(broker.replay("order:1", broker.last_id), [])
+        # Неизвестный канал: события старше запуска брокера не повторить
+        self.assertIsNone(broker.replay("order:2", 0))
+
+    def test_foreign_order_is_not_streamed(self):
+        response = self.client.get(self.url, {"telegram_user_id": 1}, HTTP_ACCEPT="text/event-stream")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@skipUnless(fastjson.orjson, "orjson is not installed")
+class FastJSONTests(APITestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Шары", slug="balloons")
+        product = Product.objects.create(category=category, title="Шар «звезда»", price=Decimal("12500.50"))
+        self.order = Order.objects.create(
+            total_price=Decimal("25001.00"),
+            total_uzs=Decimal("25001.00"),
+            payment_deadline_at=timezone.now() + timedelta(hours=1),
+        )
+        OrderProduct.objects.create(
+            order=self.order, product=product, product_title=product.title, quantity=2, price_uzs=product.price,
+        )
+        Payment.objects.create(order=self.order, amount_uzs=self.order.total_uzs, provider="test")
+        self.order.set_status(Order.Status.AWAITING_PROOF)
+
+    def assertSameBytes(self, data):
+        self.assertEqual(fastjson.ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_output_matches_drf_renderer(self):
+        self.assertSameBytes(ProductListSerializer(Product.objects.all(), many=True).data)
+        self.assertSameBytes(OrderSerializer(self.order, context={"include_status_history": True}).data)
+        # Сырые значения в Response (без сериализатора) — как у rest_framework JSONEncoder
+        self.assertSameBytes({
+            "decimal": Decimal("125000.50"),
+            "utc": datetime(2025, 1, 2, 3, 4, 5, 678901, tzinfo=dt_timezone.utc),
+            "tashkent": datetime(2025, 1, 2, 8, 4, 5, tzinfo=dt_timezone(timedelta(hours=5))),
+            "naive": datetime(2025, 1, 2, 3, 4, 5),
+            "date": date(2025, 1, 2),
+            "time": time(13, 30, 15, 250),
+            "uuid": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+            "lazy": Order.Status.PAID.label,
+            "status": Order.Status.PAID,
+            "tuple": (1, 2.5, None, True),
+            1: "int key",
+            "separators": "line\u2028paragraph\u2029",
+        })
+        # orjson не умеет int > 64 бит — рендерит stdlib
+        self.assertSameBytes({"huge": 2 ** 70})
+        self.assertEqual(fastjson.ORJSONRenderer().render(None), b"")
+
+    def test_floats_match_drf_renderer_except_exponents(self):
+        # Координаты и обычные дроби — байт в байт
+        for value in (0.0, -0.0, 41.311081, 69.240562, 1e-4, 1e15, 9.9e15):
+            self.assertSameBytes({"latitude": value, "list": [1, value], "decimal": Decimal(value)})
+        # Экспоненты orjson пишет короче, но число то же; NaN/inf — null, а не ValueError
+        renderer = fastjson.ORJSONRenderer()
+        for value, expected in ((1e16, b"1e16"), (1e-7, b"1e-7"), (-1e22, b"-1e22"), (float("nan"), b"null")):
+            rendered = renderer.render({"longitude": value})
+            self.assertEqual(rendered, b'{"longitude":' + expected + b"}")
+            if value == value:
+                self.assertEqual(json.loads(rendered), json.loads(JSONRenderer().render({"longitude": value})))
+
+    def test_parser_matches_drf_parser(self):
+        body = '{"ids": [1, 2], "name": "Шар", "price": 1.5, "nested": {"ok": true, "none": null}}'.encode()
+        self.assertEqual(
+            fastjson.ORJSONParser().parse(io.BytesIO(body)), JSONParser().parse(io.BytesIO(body)),
+        )
+        # Текст ошибки разбора клиент получает тот же
+        errors = []
+        for parser in (fastjson.ORJSONParser(), JSONParser()):
+            with self.assertRaises(ParseError) as error:
+                parser.parse(io.BytesIO(b'{"ids": [1,'))
+            errors.append(str(error.exception))
+        self.assertEqual(errors[0], errors[1])
+
+
+class BootstrapTests(APITestCase):
+    def setUp(self):
+        catalog.clear_cache()
+        self.root = Category.objects.create(name="Шары", name_uz="Sharlar", slug="balls")
+        self.child = Category.objects.create(name="Фольга", slug="foil", parent=self.root)
+        self.product = Product.objects.create(
+            category=self.child, title="Шар", title_uz="Shar", price=Decimal("9000.00"), stock=5,
+        )
+        TelegramUser.objects.create(telegram_id=777000111, language="uz", name="Aziz")
+
+    def test_returns_tree_products_and_profile(self):
+        response = self.client.get("/api/bootstrap/", {"telegram_user_id": 777000111})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data["language"], "uz")
+        self.assertEqual(data["user"]["name"], "Aziz")
+        self.assertEqual([node["slug"] for node in data["categories"]], ["balls"])
+        self.assertEqual(data["categories"][0]["label"], "Sharlar")
+        self.assertEqual(data["categories"][0]["children"][0]["slug"], "foil")
+        items = data["products"][str(self.root.id)]["items"]
+        self.assertEqual([(item["id"], item["label"]) for item in items], [(self.product.id, "Shar")])
+        self.assertNotIn("stock", items[0])
+        self.assertIn("private", response["Cache-Control"])
+
+    def test_etag_and_cached_fragments(self):
+        first = self.client.get("/api/bootstrap/", {"lang": "ru"})
+        self.assertIn("public", first["Cache-Control"])
+        # Тёплый кэш: только запрос версии каталога
+        with self.assertNumQueries(2):
+            repeat = self.client.get("/api/bootstrap/", {"lang": "ru"}, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(repeat.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.assertNotEqual(self.client.get("/api/bootstrap/", {"lang": "uz"})["ETag"], first["ETag"])
+
+        self.product.title = "Большой шар"
+        self.product.save()
+        changed = self.client.get("/api/bootstrap/", {"lang": "ru"}, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(changed.status_code, status.HTTP_200_OK)
+        self.assertEqual(changed.json()["products"][str(self.root.id)]["items"][0]["title"], "Большой шар")
+
+
+@override_settings(RESPONSE_COMPRESSION_MIN_BYTES=100)
+class CompressionTests(APITestCase):
+    def setUp(self):
+        catalog.clear_cache()
+        category = Category.objects.create(name="Шары", slug="balls")
+        for index in range(5):
+            Product.objects.create(category=category, title=f"Шар {index}", price=Decimal("1000.00"))
+
+    def test_gzip_json_with_weak_etag_revalidation(self):
+        response = self.client.get("/api/bootstrap/", HTTP_ACCEPT_ENCODING="gzip, br;q=0")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertTrue(response["ETag"].startswith('W/"'))
+
+        repeat = self.client.get("/api/bootstrap/", HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(repeat.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        plain = self.client.get("/api/bootstrap/")
+        self.assertFalse(plain.has_header("Content-Encoding"))
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        with override_settings(RESPONSE_COMPRESSION_MIN_BYTES=10 ** 6):
+            small = self.client.get("/api/bootstrap/", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertFalse(small.has_header("Content-Encoding"))
+
+
+class MediaServingTests(APITestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        overrides = override_settings(MEDIA_ROOT=media_root.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.storage = ContentHashedStorage(location=media_root.name)
+        self.body = bytes(range(256)) * 40
+        self.name = self.storage.save("products/ball.jpg", ContentFile(self.body))
+
+    def test_hashed_names_are_deduplicated(self):
+        self.assertRegex(self.name, r"^products/ball\.[0-9a-f]{16}\.jpg$")
+        self.assertEqual(self.storage.save("products/copy.jpg", ContentFile(self.body)).split(".")[1], self.name.split(".")[1])
+        self.assertEqual(self.storage.save("products/ball.jpg", ContentFile(self.body)), self.name)
+
+    def test_conditional_and_range_requests(self):
+        url = f"/media/{self.name}"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(response.streaming_content), self.body)
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]).status_code, 304,
+        )
+
+        partial = self.client.get(url, HTTP_RANGE="bytes=100-199")
+        self.assertEqual(partial.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(partial["Content-Range"], f"bytes 100-199/{len(self.body)}")
+        self.assertEqual(b"".join(partial.streaming_content), self.body[100:200])
+        suffix = self.client.get(url, HTTP_RANGE="bytes=-10")
+        self.assertEqual(b"".join(suffix.streaming_content), self.body[-10:])
+        # If-Range с устаревшим ETag — весь файл
+        stale = self.client.get(url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(stale.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(url, HTTP_RANGE=f"bytes={len(self.body)}-").status_code, 416)
+
+    def test_unhashed_private_and_sendfile(self):
+        self.assertEqual(self.client.get("/media/products/missing.jpg").status_code, 404)
+        legacy = FileSystemStorage(location=self.storage.location).save("payment_proofs/check.jpg", ContentFile(b"proof"))
+        response = self.client.get(f"/media/{legacy}")
+        self.assertIn("private", response["Cache-Control"])
+        self.assertNotIn("immutable", response["Cache-Control"])
+
+        with override_settings(MEDIA_SENDFILE="x-accel-redirect"):
+            accel = self.client.get(f"/media/{self.name}")
+        self.assertEqual(accel["X-Accel-Redirect"], f"/protected-media/{self.name}")
+        self.assertEqual(accel.content, b"")
+        self.assertEqual(accel["Content-Type"], "image/jpeg")
+
+
+def jpeg_with_orientation(width: int, height: int, orientation: int) -> bytes:
+    from PIL import Image
+
+    image = Image.new("RGB", (width, height), (200, 30, 30))
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", exif=exif)
+    return buffer.getvalue()
+
+
+@override_settings(IMAGE_DERIVATIVE_WORKERS=0)
+class ImageVariantsTests(APITestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        overrides = override_settings(MEDIA_ROOT=media_root.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.category = Category.objects.create(name="Шары", slug="balls")
+
+    def create_product(self) -> Product:
+        product = Product(category=self.category, title="Шар", price=Decimal("1000.00"))
+        # Снято «боком»: 400x200, в EXIF поворот на 90°
+        product.image.save("ball.jpg", ContentFile(jpeg_with_orientation(400, 200, 6)), save=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        product.refresh_from_db()
+        return product
+
+    def test_variants_built_on_upload_and_exposed_as_srcset(self):
+        product = self.create_product()
+        self.assertEqual(product.image_variants["source"], product.image.name)
+        self.assertEqual((product.image_variants["thumb"]["width"], product.image_variants["thumb"]["height"]), (80, 160))
+        self.assertEqual(product.image_variants["full"]["height"], 400)
+
+        data = self.client.get(f"/api/products/{product.id}/").json()["image_variants"]
+        self.assertEqual(set(data), {"thumb", "card", "full", "srcset"})
+        self.assertRegex(data["thumb"]["webp"], r"/media/variants/products/ball-thumb\.[0-9a-f]{16}\.webp$")
+        self.assertIn(" 80w, ", data["srcset"]["jpeg"])
+        self.assertEqual(
+            self.client.get(data["card"]["webp"].split("testserver", 1)[1])["Cache-Control"],
+            "public, max-age=31536000, immutable",
+        )
+
+        # Новая картинка: старые копии не отдаются, пока не готовы новые
+        Product.objects.filter(pk=product.pk).update(image="products/other.jpg")
+        product.refresh_from_db()
+        self.assertEqual(self.client.get(f"/api/products/{product.id}/").json()["image_variants"], {})
+
+    def test_backfill_command(self):
+        product = self.create_product()
+        Product.objects.filter(pk=product.pk).update(image_variants={})
+        out = io.StringIO()
+        call_command("build_image_variants", "--model", "product", "--workers", "1", stdout=out)
+        self.assertIn("built 1 of 1", out.getvalue())
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants["source"], product.image.name)
+
+
+@override_settings(IMAGE_DERIVATIVE_WORKERS=0)
+class PaymentProofUploadTests(APITestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        overrides = override_settings(MEDIA_ROOT=media_root.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.media_root = Path(media_root.name)
+        self.telegram_user = TelegramUser.objects.create(telegram_id=777000111)
+        self.screenshot = jpeg_with_orientation(300, 600, 1)
+
+    def create_payment(self) -> Payment:
+        order = Order.objects.create(
+            telegram_user=self.telegram_user,
+            total_price=Decimal("50000.00"),
+            total_uzs=Decimal("50000.00"),
+            status=Order.Status.AWAITING_PROOF,
+            payment_deadline_at=timezone.now() + timedelta(hours=2),
+        )
+        return Payment.objects.create(
+            order=order, amount_uzs=Decimal("50000.00"), provider="test", status=Payment.Status.AWAITING_PROOF,
+        )
+
+    def upload(self, payment, filename):
+        image = ContentFile(self.screenshot, name=filename)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                "/api/telegram/payment/proof/",
+                {"payment_id": payment.id, "telegram_user_id": self.telegram_user.telegram_id, "image": image},
+                format="multipart",
+            )
+
+    def test_same_screenshot_is_stored_once(self):
+        payment = self.create_payment()
+        self.assertEqual(self.upload(payment, "IMG_0001.jpg").status_code, status.HTTP_200_OK)
+        with mock.patch("site_app.services.payments.validate_proof_image") as validate:
+            self.assertEqual(self.upload(payment, "photo.jpeg").status_code, status.HTTP_200_OK)
+        validate.assert_not_called()
+        proof = PaymentProof.objects.get(payment=payment)
+        self.assertRegex(proof.image.name, r"^payment_proofs/proof\.[0-9a-f]{16}\.jpg$")
+        self.assertEqual(len(proof.content_hash), 64)
+
+        # Другой платёж с тем же файлом — своя запись, но тот же файл на диске
+        other = self.create_payment()
+        self.assertEqual(self.upload(other, "again.jpg").status_code, status.HTTP_200_OK)
+        self.assertEqual(PaymentProof.objects.get(payment=other).image.name, proof.image.name)
+        self.assertEqual(len(list((self.media_root / "payment_proofs").iterdir())), 1)
+
+    def test_oversized_and_broken_uploads_are_rejected(self):
+        payment = self.create_payment()
+        with override_settings(PAYMENT_PROOF_MAX_BYTES=1024):
+            response = self.upload(payment, "big.jpg")
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        self.screenshot = b"not an image"
+        response = self.upload(payment, "fake.jpg")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("image", response.json())
+        self.assertFalse(PaymentProof.objects.filter(payment=payment).exists())
+
+
+class StubTelegramHandler(BaseHTTPRequestHandler):
+    """Bot API для тестов: getFile и раздача файлов; запросы складываются в server.requests"""
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        path, _, query = self.path.partition("?")
+        if path == "/botTEST/getFile":
+            file_id = query.partition("file_id=")[2]
+            if file_id not in self.server.files:
+                return self._send(400, json.dumps({"ok": False, "description": "Bad Request: invalid file_id"}).encode())
+            result = {"file_id": file_id, "file_path": f"photos/{file_id}.jpg", "file_size": len(self.server.files[file_id])}
+            return self._send(200, json.dumps({"ok": True, "result": result}).encode())
+        if path.startswith("/file/botTEST/photos/"):
+            return self._send(200, self.server.files[path.rsplit("/", 1)[1][:-len(".jpg")]])
+        self._send(404, b"")
+
+    def _send(self, code, body):
+        self.send_response(code)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class BackgroundTests(APITestCase):
+    @override_settings(IMAGE_DERIVATIVE_WORKERS=0)
+    def test_zero_workers_runs_inline(self):
+        calls = []
+        self.assertIsNone(background.submit("test-inline", "IMAGE_DERIVATIVE_WORKERS", calls.append, 1))
+        self.assertEqual(calls, [1])
+
+    @override_settings(IMAGE_DERIVATIVE_WORKERS=2)
+    def test_pool_runs_job_in_worker_thread_and_logs_failures(self):
+        future = background.submit("test-pool", "IMAGE_DERIVATIVE_WORKERS", lambda: threading.current_thread().name)
+        self.assertTrue(future.result(timeout=5).startswith("test-pool"))
+
+        def fail():
+            raise RuntimeError("boom")
+
+        with self.assertLogs("site_app.background", "ERROR"):
+            self.assertIsNone(background.submit("test-pool", "IMAGE_DERIVATIVE_WORKERS", fail).result(timeout=5))
+
+
+@override_settings(BOT_TOKEN="TEST", PROOF_MIRROR_WORKERS=0, IMAGE_DERIVATIVE_WORKERS=0)
+class ProofMirrorTests(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StubTelegramHandler)
+        cls.server.files = {"AgAC-photo": jpeg_with_orientation(300, 600, 1)}
+        cls.server.requests = []
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.addClassCleanup(cls.server.server_close)
+        cls.addClassCleanup(cls.server.shutdown)
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        overrides = override_settings(MEDIA_ROOT=media_root.name, TELEGRAM_API_URL=f"http://127.0.0.1:{self.server.server_port}")
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.server.requests.clear()
+        self.telegram_user = TelegramUser.objects.create(telegram_id=777000222)
+
+    def submit_proof(self, file_id):
+        order = Order.objects.create(
+            telegram_user=self.telegram_user,
+            total_price=Decimal("50000.00"),
+            total_uzs=Decimal("50000.00"),
+            status=Order.Status.AWAITING_PROOF,
+            payment_deadline_at=timezone.now() + timedelta(hours=2),
+        )
+        payment = Payment.objects.create(
+            order=order, amount_uzs=Decimal("50000.00"), provider="test", status=Payment.Status.AWAITING_PROOF,
+        )
+        payload = {"payment_id": payment.id, "telegram_user_id": self.telegram_user.telegram_id, "telegram_file_id": file_id}
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/telegram/payment/proof/", payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return PaymentProof.objects.get(payment=payment)
+
+    def test_telegram_photo_is_downloaded_once_and_previewed(self):
+        first = self.submit_proof("AgAC-photo")
+        second = self.submit_proof("AgAC-photo")
+        self.assertEqual(self.server.requests, ["/botTEST/getFile?file_id=AgAC-photo", "/file/botTEST/photos/AgAC-photo.jpg"])
+        self.assertRegex(first.image.name, r"^payment_proofs/proof\.[0-9a-f]{16}\.jpg$")
+        self.assertEqual(second.image.name, first.image.name)
+        self.assertEqual(first.content_hash, second.content_hash)
+        self.assertEqual(first.image_variants["source"], first.image.name)
+
+        admin = User.objects.create_superuser(username="mirror-admin", email="m@example.com", password="pass")
+        self.client.force_authenticate(user=admin)
+        payments = self.client.get("/api/admin/payments/", {"status": Payment.Status.UNDER_REVIEW}).json()
+        self.assertEqual(len(payments), 2)
+        for payment in payments:
+            self.assertRegex(payment["proof_preview"], r"/media/variants/payment_proofs/proof-thumb\.[0-9a-f]{16}\.jpeg$")
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_unknown_file_is_left_for_later(self):
+        with self.assertLogs("site_app.proof_mirror", "WARNING") as logs:
+            proof = self.submit_proof("missing")
+        self.assertIn("invalid file_id", logs.output[0])
+        self.assertFalse(proof.image)
+        self.assertEqual(self.server.requests, ["/botTEST/getFile?file_id=missing"])
+
+        self.server.files["missing"] = jpeg_with_orientation(100, 100, 1)
+        self.addCleanup(self.server.files.pop, "missing")
+        out = io.StringIO()
+        call_command("mirror_payment_proofs", "--workers", "1", stdout=out)
+        self.assertIn("Mirrored 1 of 1", out.getvalue())
+        proof.refresh_from_db()
+        self.assertTrue(proof.image.name.startswith("payment_proofs/proof."))
+
+
+class InProcessTransportTests(APITestCase):
+    """In-process транспорт бота должен отдавать то же, что и HTTP API"""
+
+    VOLATILE_KEYS = {'id', 'payment_link', 'message_id'}
+
+    def setUp(self):
+        bot_dir = str(Path(__file__).resolve().parents[2] / 'TG_bot')
+        if bot_dir not in sys.path:
+            sys.path.insert(0, bot_dir)
+        from inprocess_transport import InProcessSession
+
+        self.session = InProcessSession('http://testserver/api')
+        category = Category.objects.create(name="Balloons", slug="balloons")
+        self.product = Product.objects.create(category=category, title="Balloon", price=Decimal("15000.00"))
+        TelegramUser.objects.create(telegram_id=900000001, is_admin=True)
+        TelegramUser.objects.create(telegram_id=900000002)
+
+    def _via_http(self, method, endpoint, json=None, headers=None, params=None):
+        extra = {f"HTTP_{key.upper().replace('-', '_')}": value for key, value in (headers or {}).items()}
+        if method == 'GET':
+            response = self.client.get(f"/api/{endpoint}", params, **extra)
+        else:
+            response = self.client.post(f"/api/{endpoint}", json, format="json", **extra)
+        return response.status_code, response.json(), response.get("Idempotent-Replayed")
+
+    def _via_inprocess(self, method, endpoint, json=None, headers=None, params=None):
+        response = self.session.request(method, f"http://testserver/api/{endpoint}", json=json, headers=headers, params=params)
+        return response.status_code, response.json(), response.headers.get("Idempotent-Replayed")
+
+    def _normalize(self, value):
+        if isinstance(value, dict):
+            return {
+                key: None if key in self.VOLATILE_KEYS or key.endswith(('_id', '_at')) else self._normalize(item)
+                for key, item in value.items()
+            }
+        if isinstance(value, list):
+            return [self._normalize(item) for item in value]
+        if isinstance(value, str):
+            return ''.join('#' if char.isdigit() else char for char in value)
+        return value
+
+    def _scenario(self, call, key):
+        results = []
+        checkout = {
+            "telegram_user_id": 900000002,
+            "cart_items": [{"product_id": self.product.id, "quantity": 2}],
+            "address": "Tashkent",
+        }
+        results.append(call('POST', 'checkout/', checkout, {'Idempotency-Key': key}))
+        results.append(call('POST', 'checkout/', checkout, {'Idempotency-Key': key}))
+        results.append(call('POST', 'checkout/', {"telegram_user_id": 900000002}))
+        order_id, payment_id = results[0][1]['order_id'], results[0][1]['payment_id']
+
+        proof = {"order_id": order_id, "telegram_user_id": 900000002, "telegram_file_id": f"file-{key}"}
+        results.append(call('POST', 'telegram/payment/proof/', proof))
+        results.append(call('POST', 'telegram/payment/proof/', dict(proof, telegram_user_id=900000009)))
+        results.append(call('POST', 'telegram/order/remind/', {"order_id": order_id}))
+        results.append(call('POST', f'telegram/payment/{payment_id}/approve/', {"telegram_admin_id": 900000002}))
+        results.append(call('POST', f'telegram/payment/{payment_id}/reject/', {"telegram_admin_id": 900000001}))
+        results.append(call('POST', f'telegram/payment/{payment_id}/approve/', {"telegram_admin_id": 900000001}))
+        results.append(call('POST', f'telegram/payment/{payment_id}/approve/', {"telegram_admin_id": 900000001}))
+        results.append(call('POST', 'telegram/payment/999999/approve/', {"telegram_admin_id": 900000001}))
+        results.append(call('GET', f'telegram/orders/{order_id}/', params={"telegram_user_id": 900000002}))
+        return [(code, self._normalize(body), replayed) for code, body, replayed in results]
+
+    def test_inprocess_matches_http(self):
+        with mock.patch("site_app.services.checkout.notify_admin_new_order"):
+            over_http = self._scenario(self._via_http, "http-key")
+            in_process = self._scenario(self._via_inprocess, "inprocess-key")
+
+        self.assertEqual(
+            [code for code, _, _ in over_http],
+            [201, 201, 400, 200, 400, 400, 403, 400, 200, 400, 404, 200],
+        )
+        self.assertEqual(in_process, over_http)
+        self.assertEqual(over_http[1][2], "true")
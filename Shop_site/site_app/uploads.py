@@ -0,0 +1,48 @@
+"""
+Приём чеков оплаты потоком: multipart-файл пишется во временный файл кусками (не в память),
+по пути считается sha256 и проверяется PAYMENT_PROOF_MAX_BYTES. Хеш кладётся в file.content_hash —
+его берут site_app.storage (имя файла) и services.submit_payment_proof (повторная загрузка).
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.files.uploadhandler import StopUpload, TemporaryFileUploadHandler
+
+
+class HashingUploadHandler(TemporaryFileUploadHandler):
+    def __init__(self, request=None, max_size=None):
+        super().__init__(request)
+        self.max_size = max_size if max_size is not None else settings.PAYMENT_PROOF_MAX_BYTES
+        self.too_large = False
+        self.content_length = None
+        self._hash = None
+        self._received = 0
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.content_length = content_length
+        return None
+
+    def new_file(self, *args, **kwargs):
+        # Тело заведомо больше лимита — не читаем его вовсе (запас на остальные поля формы)
+        if self.content_length and self.content_length > self.max_size + settings.DATA_UPLOAD_MAX_MEMORY_SIZE:
+            self._reject()
+        super().new_file(*args, **kwargs)
+        self._hash = hashlib.sha256()
+        self._received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self._received += len(raw_data)
+        if self._received > self.max_size:
+            self._reject()
+        self._hash.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.content_hash = self._hash.hexdigest()
+        return file
+
+    def _reject(self):
+        self.too_large = True
+        # Временный файл удалит MultiPartParser (_close_files), остаток тела не дочитываем
+        raise StopUpload(connection_reset=True)
@@ -14,16 +14,23 @@ from .views import (
     TelegramAddressViewSet,
     CheckoutView,
     OrderDeadlineView,
+    OrderDeadlinesView,
+    OrderEventsView,
     TelegramPaymentProofView,
     TelegramOrderRemindView,
     AdminPaymentListView,
     AdminPaymentDetailView,
     AdminPaymentApproveView,
     AdminPaymentRejectView,
+    AdminPaymentBulkView,
     AdminOrderCancelView,
     TelegramOrderDetailView,
+    TelegramOrderHistoryView,
+    TelegramOrderProofView,
     TelegramPaymentApproveView,
     TelegramPaymentRejectView,
+    TelegramPaymentBulkView,
+    BootstrapView,
 )
 
 router = DefaultRouter()
@@ -36,15 +43,23 @@ router.register(r'telegram-users', TelegramUserViewSet, basename='telegram-user'
 router.register(r'telegram-addresses', TelegramAddressViewSet, basename='telegram-address')
 
 urlpatterns = [
+    # Раньше роутера, иначе 'deadlines' примет за pk в /orders/<pk>/
+    path('orders/deadlines/', OrderDeadlinesView.as_view(), name='order-deadlines'),
     path('', include(router.urls)),
+    path('bootstrap/', BootstrapView.as_view(), name='bootstrap'),
     path('checkout/', CheckoutView.as_view(), name='checkout'),
     path('orders/<int:order_id>/deadline/', OrderDeadlineView.as_view(), name='order-deadline'),
+    path('orders/<int:order_id>/events/', OrderEventsView.as_view(), name='order-events'),
+    path('telegram/orders/', TelegramOrderHistoryView.as_view(), name='telegram-order-history'),
     path('telegram/orders/<int:order_id>/', TelegramOrderDetailView.as_view(), name='telegram-order-detail'),
+    path('telegram/orders/<int:order_id>/proof/', TelegramOrderProofView.as_view(), name='telegram-order-proof'),
     path('telegram/payment/proof/', TelegramPaymentProofView.as_view(), name='telegram-payment-proof'),
     path('telegram/order/remind/', TelegramOrderRemindView.as_view(), name='telegram-order-remind'),
     path('telegram/payment/<int:payment_id>/approve/', TelegramPaymentApproveView.as_view(), name='telegram-payment-approve'),
     path('telegram/payment/<int:payment_id>/reject/', TelegramPaymentRejectView.as_view(), name='telegram-payment-reject'),
+    path('telegram/payment/bulk/', TelegramPaymentBulkView.as_view(), name='telegram-payment-bulk'),
     path('admin/payments/', AdminPaymentListView.as_view(), name='admin-payment-list'),
+    path('admin/payments/bulk/', AdminPaymentBulkView.as_view(), name='admin-payment-bulk'),
     path('admin/payments/<int:payment_id>/', AdminPaymentDetailView.as_view(), name='admin-payment-detail'),
     path('admin/payments/<int:payment_id>/approve/', AdminPaymentApproveView.as_view(), name='admin-payment-approve'),
     path('admin/payments/<int:payment_id>/reject/', AdminPaymentRejectView.as_view(), name='admin-payment-reject'),
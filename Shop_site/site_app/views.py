@@ -1,26 +1,28 @@
+import hashlib
 import logging
-import uuid
-from decimal import Decimal
-from datetime import timedelta
-from typing import List, Optional, Tuple
+from typing import List, Optional
 
-import requests
 from django.conf import settings
-from django.db import transaction
-from django.db.models import Sum, F
+from django.db.models import Q, Sum
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
-from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import viewsets, permissions, status, mixins
 from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.renderers import BaseRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from django.contrib.auth.models import User
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from rest_framework.exceptions import ValidationError, NotFound
 
-from .models import Category, Product, CartItem, Favorite, Order, OrderProduct, TelegramUser, TelegramAddress, Payment, PaymentProof, format_sum
+from .compression import etag_matches
+from .fastjson import ORJSONRenderer
+from .models import Category, Product, Favorite, Order, TelegramUser, TelegramAddress, Payment
+from .uploads import HashingUploadHandler
+from . import catalog, events, idempotency, services
 
 logger = logging.getLogger(__name__)
 from .serializers import (
@@ -30,6 +32,7 @@ from .serializers import (
     CartItemSerializer,
     CartItemCreateSerializer,
     CartSerializer,
+    CartSyncSerializer,
     FavoriteSerializer,
     FavoriteCreateSerializer,
     OrderSerializer,
@@ -38,301 +41,28 @@ from .serializers import (
     TelegramUserSerializer,
     TelegramAddressSerializer,
     CheckoutRequestSerializer,
-    CheckoutResponseSerializer,
     OrderDeadlineSerializer,
-    PaymentProofCreateSerializer,
     PaymentSerializer,
     PaymentModerationSerializer,
+    PaymentBulkModerationSerializer,
     OrderCancelSerializer,
 )
 
 
-DEFAULT_PAYMENT_DEADLINE_MINUTES = getattr(settings, 'PAYMENT_DEADLINE_MINUTES', 180)
-
-
-def generate_payment_link(provider: str = 'link') -> str:
-    base_url = getattr(settings, 'PAYMENT_LINK_BASE_URL', 'https://pay.partyland.uz/i/')
-    suffix = uuid.uuid4().hex[:10]
-    return f"{base_url}{suffix}"
-
-
-def send_telegram_notification(telegram_user: Optional[TelegramUser], message: str) -> None:
-    bot_token = getattr(settings, 'BOT_TOKEN', '')
-    if not telegram_user or not bot_token:
-        return
-    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+def parse_ids(raw, limit: int) -> List[int]:
+    """'1,2,3' или [1, 2, 3] -> [1, 2, 3] без повторов, не больше limit штук"""
+    if raw in (None, '', []):
+        raise ValidationError({'ids': 'This parameter is required.'})
+    parts = raw.split(',') if isinstance(raw, str) else raw
+    if not isinstance(parts, (list, tuple)):
+        raise ValidationError({'ids': 'Expected a comma-separated list of integers.'})
     try:
-        requests.post(url, json={"chat_id": telegram_user.telegram_id, "text": message}, timeout=10)
-    except requests.RequestException as exc:  # pragma: no cover
-        logger.warning("Failed to send telegram notification: %s", exc)
-
-
-def notify_admin_new_order(order: Order) -> None:
-    """
-    Отправляет уведомление всем админам в Telegram о новом заказе.
-    """
-    bot_token = getattr(settings, 'BOT_TOKEN', '')
-    if not bot_token:
-        logger.warning("BOT_TOKEN not configured, skipping admin notification")
-        return
-
-    # Получаем всех админов из базы данных
-    admin_users = TelegramUser.objects.filter(is_admin=True)
-    if not admin_users.exists():
-        # Fallback: используем ADMIN_TELEGRAM_CHAT_ID из settings если есть
-        admin_chat_id = getattr(settings, 'ADMIN_TELEGRAM_CHAT_ID', '')
-        if admin_chat_id:
-            admin_ids = [int(admin_chat_id)]
-        else:
-            logger.warning("No admin users found in database and ADMIN_TELEGRAM_CHAT_ID not set")
-            return
-    else:
-        admin_ids = [admin.telegram_id for admin in admin_users]
-
-    # Формируем сообщение
-    lines = [
-        f"🔔 <b>Новый заказ #{order.pk}</b>",
-    ]
-    
-    # Определяем источник заказа
-    source_label = order.source_label()
-    if source_label == "Website":
-        lines.append("🌐 Источник: Сайт")
-    elif source_label == "Telegram":
-        lines.append("💬 Источник: Telegram бот")
-    else:
-        lines.append(f"📱 Источник: {source_label}")
-
-    # Информация о клиенте
-    if order.telegram_user:
-        lines.append(f"👤 Клиент: {order.telegram_user.name or f'TG {order.telegram_user.telegram_id}'}")
-        if order.telegram_user.phone:
-            lines.append(f"📞 Телефон: {order.telegram_user.phone}")
-    elif order.customer_name:
-        lines.append(f"👤 Имя: {order.customer_name}")
-    if order.customer_phone:
-        lines.append(f"📞 Контакт: {order.customer_phone}")
-
-    # Адрес доставки
-    if order.address:
-        if order.latitude and order.longitude:
-            lines.append(f"📍 Адрес: {order.address} (координаты: {order.latitude:.6f}, {order.longitude:.6f})")
-        else:
-            lines.append(f"📍 Адрес: {order.address}")
-    else:
-        lines.append("📍 Адрес: Не указан")
-
-    # Время доставки
-    if order.delivery_time:
-        lines.append(f"⏰ Время доставки: {order.delivery_time}")
-    
-    # Комментарий
-    if order.payment_comment:
-        lines.append(f"💬 Комментарий: {order.payment_comment}")
-
-    lines.append("")
-    lines.append("🧾 Состав заказа:")
-
-    # Товары из заказа
-    for item in order.order_products.all():
-        lines.append(
-            f"• {item.product_title} × {item.quantity} — {format_sum(item.total_price)}"
-        )
-
-    lines.append("")
-    lines.append(f"💰 Итого: <b>{order.formatted_total}</b>")
-    
-    if order.payment_link:
-        lines.append(f"🔗 Ссылка для оплаты: {order.payment_link}")
-    
-    if order.payment_deadline_at:
-        deadline_str = order.payment_deadline_at.strftime('%d.%m.%Y %H:%M')
-        lines.append(f"⏳ Срок оплаты: {deadline_str}")
-
-    message_text = "\n".join(lines)
-    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-
-    # Получаем активный payment для заказа
-    active_payment = order.payments.filter(is_active=True).first()
-    payment_id = active_payment.pk if active_payment else None
-
-    # Создаем inline клавиатуру с кнопками подтверждения/отклонения
-    reply_markup = None
-    if payment_id:
-        reply_markup = {
-            "inline_keyboard": [
-                [
-                    {
-                        "text": "✅ Подтвердить оплату",
-                        "callback_data": f"approve_order:{order.pk}:{payment_id}"
-                    },
-                    {
-                        "text": "❌ Отклонить",
-                        "callback_data": f"reject_order:{order.pk}:{payment_id}"
-                    }
-                ]
-            ]
-        }
-
-    # Отправляем сообщение всем админам
-    success_count = 0
-    for admin_id in admin_ids:
-        try:
-            payload = {
-                "chat_id": admin_id,
-                "text": message_text,
-                "parse_mode": "HTML"
-            }
-            if reply_markup:
-                payload["reply_markup"] = reply_markup
-
-            response = requests.post(
-                url,
-                json=payload,
-                timeout=10
-            )
-            response.raise_for_status()
-            success_count += 1
-            logger.info(f"Admin notification sent to {admin_id} for order {order.pk}")
-        except requests.RequestException as exc:
-            logger.warning(f"Failed to notify admin {admin_id} about order {order.pk}: {exc}")
-    
-    if success_count == 0:
-        logger.error(f"Failed to notify any admin about order {order.pk}")
-    else:
-        logger.info(f"Successfully notified {success_count} admin(s) about order {order.pk}")
-
-
-def calculate_manual_total(cart_items: List[dict]) -> Tuple[Decimal, List[Tuple[Product, int]]]:
-    total = Decimal('0')
-    detailed_items = []
-    for item in cart_items:
-        product_id = item.get('product_id')
-        quantity = item.get('quantity', 1)
-        product = get_object_or_404(Product, pk=product_id)
-        qty = int(quantity)
-        line_total = Decimal(product.price) * qty
-        total += line_total
-        detailed_items.append((product, qty))
-    return total, detailed_items
-
-
-def create_checkout_order(
-    *,
-    user: Optional[User],
-    telegram_user: Optional[TelegramUser],
-    cart_items_query: Optional[List[CartItem]],
-    manual_items: Optional[List[Tuple[Product, int]]],
-    comment: str,
-    payment_link: str | None,
-    provider: str,
-    deadline_minutes: int | None,
-    address: Optional[str],
-    latitude: Optional[float],
-    longitude: Optional[float],
-    delivery_time: Optional[str],
-    customer_name: str = '',
-    customer_phone: str = '',
-) -> Tuple[Order, Payment]:
-    deadline_minutes = deadline_minutes or DEFAULT_PAYMENT_DEADLINE_MINUTES
-    payment_deadline = timezone.now() + timedelta(minutes=deadline_minutes)
-
-    if cart_items_query:
-        total = sum([Decimal(item.get_total_price()) for item in cart_items_query])
-    else:
-        total = sum([Decimal(product.price) * qty for product, qty in (manual_items or [])])
-
-    if total <= 0:
-        raise ValueError("Order total must be positive.")
-
-    link = payment_link or generate_payment_link(provider)
-
-    with transaction.atomic():
-        order = Order.objects.create(
-            user=user,
-            telegram_user=telegram_user,
-            total_price=total,
-            total_uzs=total,
-            payment_link=link,
-            payment_comment=comment,
-            payment_deadline_at=payment_deadline,
-            status=Order.Status.PENDING_PAYMENT_LINK,
-            address=address,
-            latitude=latitude,
-            longitude=longitude,
-            delivery_time=delivery_time,
-            customer_name=customer_name.strip(),
-            customer_phone=customer_phone.strip(),
-        )
-
-        if cart_items_query:
-            order.items.set(cart_items_query)
-            for cart_item in cart_items_query:
-                OrderProduct.objects.create(
-                    order=order,
-                    product=cart_item.product,
-                    product_title=cart_item.product.title,
-                    quantity=cart_item.quantity,
-                    price_uzs=cart_item.product.price,
-                )
-        elif manual_items:
-            for product, qty in manual_items:
-                OrderProduct.objects.create(
-                    order=order,
-                    product=product,
-                    product_title=product.title,
-                    quantity=qty,
-                    price_uzs=product.price,
-                )
-
-        payment = Payment.objects.create(
-            order=order,
-            amount_uzs=total,
-            provider=provider or 'link',
-            status=Payment.Status.AWAITING_PROOF,
-        )
-
-    return order, payment
-
-
-def process_checkout(request, validated_data) -> Tuple[Order, Payment]:
-    user = request.user if request.user.is_authenticated else None
-    telegram_user = None
-    if validated_data.get('telegram_user_id'):
-        telegram_user, _ = TelegramUser.objects.get_or_create(telegram_id=validated_data['telegram_user_id'])
-
-    manual_items_details = None
-    cart_items_query = None
-
-    if validated_data.get('cart_items'):
-        _, manual_items_details = calculate_manual_total(validated_data['cart_items'])
-    else:
-        if not user:
-            raise ValueError("Authenticated user is required when cart_items are not provided.")
-        cart_items_query = list(CartItem.objects.filter(user=user, order__isnull=True).select_related('product'))
-        if not cart_items_query:
-            raise ValueError("Cart is empty.")
-
-    order, payment = create_checkout_order(
-        user=user,
-        telegram_user=telegram_user,
-        cart_items_query=cart_items_query,
-        manual_items=manual_items_details,
-        comment=validated_data.get('comment', ''),
-        payment_link=validated_data.get('payment_link'),
-        provider=validated_data.get('payment_provider', 'link'),
-        deadline_minutes=validated_data.get('deadline_minutes'),
-        address=validated_data.get('address'),
-        latitude=validated_data.get('latitude'),
-        longitude=validated_data.get('longitude'),
-        delivery_time=validated_data.get('delivery_time'),
-        customer_name=validated_data.get('customer_name', ''),
-        customer_phone=validated_data.get('customer_phone', ''),
-    )
-
-    notify_admin_new_order(order)
-
-    return order, payment
+        ids = list(dict.fromkeys(int(str(part).strip()) for part in parts if str(part).strip()))
+    except ValueError:
+        raise ValidationError({'ids': 'Expected a comma-separated list of integers.'})
+    if len(ids) > limit:
+        raise ValidationError({'ids': f'At most {limit} ids per request.'})
+    return ids
 
 
 class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
@@ -353,6 +83,21 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
             return ProductListSerializer
         return ProductDetailSerializer
 
+    @action(detail=False, methods=['get', 'post'], url_path='bulk')
+    def bulk(self, request):
+        """Несколько товаров одним запросом: ?ids=1,2,3, {"ids": [1, 2, 3]} или [1, 2, 3]. Ненайденные id пропускаются"""
+        if request.method != 'POST':
+            raw = request.query_params.get('ids')
+        elif isinstance(request.data, dict):
+            raw = request.data.get('ids')
+        else:
+            # Тело — сам список id (или что-то иное: тогда 400 из parse_ids)
+            raw = request.data
+        ids = parse_ids(raw, settings.PRODUCT_BULK_MAX_IDS)
+        products = {product.pk: product for product in self.get_queryset().filter(pk__in=ids)}
+        serializer = self.get_serializer([products[pk] for pk in ids if pk in products], many=True)
+        return Response(serializer.data)
+
 
 class CartViewSet(viewsets.GenericViewSet,
                   mixins.ListModelMixin,
@@ -362,24 +107,22 @@ class CartViewSet(viewsets.GenericViewSet,
 
     def get_queryset(self):
         # Exclude items already included in orders so the cart reflects only pending items
-        return CartItem.objects.filter(user=self.request.user, order__isnull=True).select_related('product')
+        return services.pending_cart_items(self.request.user).select_related('product')
 
     def get_serializer_class(self):
         if self.action in ['create', 'add']:
             return CartItemCreateSerializer
+        if self.action == 'sync':
+            return CartSyncSerializer
         return CartItemSerializer
 
     def perform_create(self, serializer):
-        # If item exists for user+product, increase quantity, else create
-        product = serializer.validated_data['product']
-        quantity = serializer.validated_data.get('quantity', 1)
-        item, created = CartItem.objects.get_or_create(user=self.request.user, product=product,
-                                                       defaults={'quantity': quantity})
-        if not created:
-            item.quantity = F('quantity') + quantity
-            item.save()
-            item.refresh_from_db()
-        return item
+        # If item exists for user+product, increase quantity, else create (one upsert)
+        return services.add_to_cart(
+            self.request.user,
+            serializer.validated_data['product'],
+            serializer.validated_data.get('quantity', 1),
+        )
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -414,6 +157,17 @@ class CartViewSet(viewsets.GenericViewSet,
         data = CartSerializer({'items': items, 'total_price': total}).data
         return Response(data)
 
+    @action(detail=False, methods=['put'], url_path='sync')
+    def sync(self, request):
+        """Заменяет корзину целиком: {"items": [{"product_id": 1, "quantity": 2}, ...]}"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = services.sync_cart(request.user, serializer.validated_data['items'])
+        total = sum(item.get_total_price() for item in result.items)
+        data = CartSerializer({'items': result.items, 'total_price': total}).data
+        data['unknown_product_ids'] = result.unknown_product_ids
+        return Response(data)
+
     @action(detail=False, methods=['post'])
     def clear(self, request):
         self.get_queryset().delete()
@@ -435,12 +189,12 @@ class FavoriteViewSet(viewsets.GenericViewSet,
         return FavoriteSerializer
 
     def perform_create(self, serializer):
-        Favorite.objects.get_or_create(user=self.request.user, product=serializer.validated_data['product'])
+        return services.add_favorite(self.request.user, serializer.validated_data['product'])
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        favorite, _ = Favorite.objects.get_or_create(user=request.user, product=serializer.validated_data['product'])
+        favorite = self.perform_create(serializer)
         output = FavoriteSerializer(favorite)
         headers = self.get_success_headers(output.data)
         return Response(output.data, status=status.HTTP_201_CREATED, headers=headers)
@@ -466,7 +220,7 @@ class OrderViewSet(viewsets.GenericViewSet,
 
     def get_queryset(self):
         return Order.objects.filter(user=self.request.user).prefetch_related(
-            'items__product',
+            'order_products__product',
             'payments',
             'payments__proofs',
             'status_history',
@@ -490,7 +244,10 @@ class OrderViewSet(viewsets.GenericViewSet,
         serializer = CheckoutRequestSerializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
         try:
-            order, _ = process_checkout(request, serializer.validated_data)
+            order, _ = services.process_checkout(
+                request.user if request.user.is_authenticated else None,
+                serializer.validated_data,
+            )
         except ValueError as exc:
             return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
         response_data = OrderSerializer(
@@ -504,62 +261,146 @@ class OrderViewSet(viewsets.GenericViewSet,
     def create_from_cart(self, request):
         return self.create(request)
 
+    @action(detail=False, methods=['get'], url_path='history')
+    def history(self, request):
+        """Компактная история заказов: ?cursor=&limit=, строки заказа из OrderProduct"""
+        page = services.order_history(
+            Q(user=request.user),
+            cursor=request.query_params.get('cursor'),
+            limit=services.page_limit(request.query_params.get('limit')),
+        )
+        return Response(page)
+
 
 class CheckoutView(APIView):
     permission_classes = [AllowAny]
 
     def post(self, request, *args, **kwargs):
-        serializer = CheckoutRequestSerializer(data=request.data, context={'request': request})
-        serializer.is_valid(raise_exception=True)
-        try:
-            order, payment = process_checkout(request, serializer.validated_data)
-        except ValueError as exc:
-            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
-
-        response_serializer = CheckoutResponseSerializer({
-            'order_id': order.id,
-            'status': order.status,
-            'total_uzs': order.total_uzs,
-            'formatted_total': order.formatted_total,
-            'payment_link': order.payment_link,
-            'payment_deadline_at': order.payment_deadline_at,
-            'payment_id': payment.id,
-        })
-        return Response(response_serializer.data, status=status.HTTP_201_CREATED)
+        result = services.place_order(
+            request.data,
+            user=request.user if request.user.is_authenticated else None,
+            idempotency_key=request.headers.get(idempotency.HEADER, ''),
+        )
+        response = Response(result.data, status=result.status_code)
+        if result.replayed:
+            response['Idempotent-Replayed'] = 'true'
+        return response
+
+
+def customer_orders_filter(request) -> Optional[Q]:
+    """Заказы текущего пользователя сайта и/или Telegram-пользователя из ?telegram_user_id=; None — никого"""
+    owner = None
+    if request.user.is_authenticated:
+        owner = Q(user=request.user)
+    telegram_id = str(request.query_params.get('telegram_user_id', ''))
+    if telegram_id.isdigit():
+        by_telegram = Q(telegram_user__telegram_id=int(telegram_id))
+        owner = owner | by_telegram if owner else by_telegram
+    return owner
+
+
+def get_customer_order(request, order_id: int) -> Order:
+    owner = customer_orders_filter(request)
+    order = Order.objects.filter(owner, pk=order_id).first() if owner else None
+    if order is None:
+        raise NotFound("Order not found.")
+    return order
+
+
+def order_deadline_payload(order: Order) -> dict:
+    deadline = order.payment_deadline_at
+    if not deadline:
+        deadline = timezone.now()
+    seconds_left = int((deadline - timezone.now()).total_seconds())
+    seconds_left = max(0, seconds_left)
+    is_expired = seconds_left <= 0 or order.status in [Order.Status.CANCELED, Order.Status.PAID]
+
+    serializer = OrderDeadlineSerializer({
+        'payment_deadline_at': deadline,
+        'seconds_left': seconds_left,
+        'is_expired': is_expired,
+    })
+    payload = serializer.data
+    payload['status'] = order.status
+    return payload
 
 
 class OrderDeadlineView(APIView):
     permission_classes = [AllowAny]
 
     def get(self, request, order_id: int, *args, **kwargs):
-        order = get_object_or_404(Order, pk=order_id)
-        telegram_id = request.query_params.get('telegram_user_id')
-        user = request.user if request.user.is_authenticated else None
-
-        if user and order.user_id == user.id:
-            pass
-        elif telegram_id and order.telegram_user and str(order.telegram_user.telegram_id) == str(telegram_id):
-            pass
-        else:
-            raise NotFound("Order not found.")
-
-        deadline = order.payment_deadline_at
-        if not deadline:
-            deadline = timezone.now()
-        seconds_left = int((deadline - timezone.now()).total_seconds())
-        seconds_left = max(0, seconds_left)
-        is_expired = seconds_left <= 0 or order.status in [Order.Status.CANCELED, Order.Status.PAID]
-
-        serializer = OrderDeadlineSerializer({
-            'payment_deadline_at': deadline,
-            'seconds_left': seconds_left,
-            'is_expired': is_expired,
-        })
-        payload = serializer.data
-        payload['status'] = order.status
+        order = get_customer_order(request, order_id)
+        return Response(order_deadline_payload(order))
+
+
+class OrderDeadlinesView(APIView):
+    """
+    Сроки оплаты нескольких заказов одним запросом: ?ids=1,2,3 (+ telegram_user_id для бота).
+    Чужие и несуществующие заказы пропускаются; порядок — как в ids.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        ids = parse_ids(request.query_params.get('ids'), settings.ORDER_DEADLINES_MAX_IDS)
+        owner = customer_orders_filter(request)
+        if owner is None:
+            return Response([])
+        orders = {
+            order.pk: order
+            for order in Order.objects.filter(owner, pk__in=ids).only('id', 'status', 'payment_deadline_at')
+        }
+        payload = []
+        for order_id in ids:
+            if order_id in orders:
+                payload.append({'order_id': order_id, **order_deadline_payload(orders[order_id])})
         return Response(payload)
 
 
+class EventStreamRenderer(BaseRenderer):
+    """Чтобы DRF принял Accept: text/event-stream; ошибки (404 и т.п.) отдаются как JSON"""
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return ORJSONRenderer().render(data)
+
+
+class OrderEventsView(APIView):
+    """
+    SSE: смена статуса заказа и оплаты.
+    Первым событием идёт snapshot (как /deadline/ + статус активной оплаты), дальше status/payment.
+    После переподключения с Last-Event-ID досылаются только пропущенные события.
+    """
+    permission_classes = [AllowAny]
+    renderer_classes = [EventStreamRenderer, ORJSONRenderer]
+
+    def get(self, request, order_id: int, *args, **kwargs):
+        order = get_customer_order(request, order_id)
+        raw_last_id = request.headers.get('Last-Event-ID') or request.query_params.get('last_event_id')
+        last_id = int(raw_last_id) if raw_last_id and raw_last_id.isdigit() else None
+
+        def snapshot() -> dict:
+            fresh = Order.objects.get(pk=order.pk)
+            payload = order_deadline_payload(fresh)
+            payload['order_id'] = fresh.pk
+            payload['payment_status'] = (
+                Payment.objects.filter(order_id=fresh.pk, is_active=True).values_list('status', flat=True).first()
+            )
+            return payload
+
+        channel = events.order_channel(order.pk)
+        # Под ASGI — корутина без потока на соединение, под WSGI — обычный генератор
+        if isinstance(request._request, ASGIRequest):
+            content = events.astream(channel, last_id, snapshot)
+        else:
+            content = events.stream(channel, last_id, snapshot)
+        response = StreamingHttpResponse(content, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
 class TelegramOrderDetailView(APIView):
     permission_classes = [AllowAny]
 
@@ -582,97 +423,54 @@ class TelegramOrderDetailView(APIView):
         return Response(serializer.data)
 
 
-class TelegramPaymentProofView(APIView):
+class TelegramOrderHistoryView(APIView):
+    """История заказов Telegram-пользователя: ?telegram_user_id=&cursor=&limit="""
     permission_classes = [AllowAny]
 
-    def post(self, request, *args, **kwargs):
-        serializer = PaymentProofCreateSerializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        data = serializer.validated_data
-        telegram_user, _ = TelegramUser.objects.get_or_create(telegram_id=data['telegram_user_id'])
+    def get(self, request, *args, **kwargs):
+        telegram_user_id = request.query_params.get('telegram_user_id', '')
+        if not telegram_user_id.isdigit():
+            raise ValidationError({'telegram_user_id': 'This parameter is required.'})
+        page = services.order_history(
+            Q(telegram_user__telegram_id=telegram_user_id),
+            cursor=request.query_params.get('cursor'),
+            limit=services.page_limit(request.query_params.get('limit')),
+        )
+        return Response(page)
 
-        payment = None
-        if data.get('payment_id'):
-            payment = get_object_or_404(Payment.objects.select_related('order', 'order__telegram_user'), pk=data['payment_id'])
-        else:
-            order = get_object_or_404(Order.objects.select_related('telegram_user'), pk=data['order_id'])
-            payment = order.payments.filter(is_active=True).order_by('-created_at').first()
-            if not payment:
-                raise ValidationError("Active payment not found for order.")
-
-        order = payment.order
-        if order.telegram_user and order.telegram_user.telegram_id != telegram_user.telegram_id:
-            raise ValidationError("Order does not belong to this Telegram user.")
-        if not order.telegram_user:
-            order.telegram_user = telegram_user
-            order.save(update_fields=['telegram_user'])
-
-        existing_proof = None
-        if data.get('telegram_file_id'):
-            existing_proof = payment.proofs.filter(telegram_file_id=data['telegram_file_id']).first()
-        if not existing_proof and data.get('message_id'):
-            existing_proof = payment.proofs.filter(message_id=data['message_id']).first()
-
-        if existing_proof:
-            proof = existing_proof
-        else:
-            with transaction.atomic():
-                proof = PaymentProof(
-                    payment=payment,
-                    telegram_file_id=data.get('telegram_file_id'),
-                    submitted_by_telegram=telegram_user,
-                    submitted_by_user=None,
-                    comment=data.get('comment', ''),
-                    message_id=data.get('message_id'),
-                )
-                image = data.get('image') or request.FILES.get('image')
-                if image:
-                    proof.image = image
-                try:
-                    proof.full_clean()
-                except DjangoValidationError as exc:
-                    raise ValidationError(exc.message_dict or exc.messages)
-                proof.save()
-
-        with transaction.atomic():
-            if payment.status != Payment.Status.UNDER_REVIEW:
-                payment.status = Payment.Status.UNDER_REVIEW
-                payment.save(update_fields=['status', 'updated_at'])
-            if order.status != Order.Status.UNDER_REVIEW:
-                order.set_status(Order.Status.UNDER_REVIEW, comment=data.get('comment', ''))
-
-        return Response({
-            'status': payment.status,
-            'message': 'Чек получен. Ожидайте подтверждения.',
-            'payment_id': payment.id,
-            'order_status': order.status,
-        }, status=status.HTTP_200_OK)
 
+class TelegramOrderProofView(APIView):
+    """Для админа в боте: активный платёж, последний чек (file_id или URL картинки) и покупатель"""
+    permission_classes = [AllowAny]
 
-class TelegramOrderRemindView(APIView):
+    def get(self, request, order_id: int, *args, **kwargs):
+        payload = services.latest_payment_proof(order_id, request.query_params.get('telegram_admin_id'), request=request)
+        return Response(payload)
+
+
+class TelegramPaymentProofView(APIView):
     permission_classes = [AllowAny]
 
     def post(self, request, *args, **kwargs):
-        order_id = request.data.get('order_id')
-        telegram_user_id = request.data.get('telegram_user_id')
-        if not order_id or not telegram_user_id:
-            raise ValidationError("order_id and telegram_user_id are required.")
+        # Файл чека идёт на диск кусками с подсчётом sha256 (site_app/uploads.py), а не в память
+        upload_handler = HashingUploadHandler(request._request)
+        request._request.upload_handlers = [upload_handler]
+        data = request.data
+        if upload_handler.too_large:
+            raise services.ServiceError(
+                f"Image is too large (max {settings.PAYMENT_PROOF_MAX_BYTES // (1024 * 1024)} MB).",
+                status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+        payload = services.submit_payment_proof(data, image=request.FILES.get('image'))
+        return Response(payload, status=status.HTTP_200_OK)
 
-        order = get_object_or_404(Order.objects.select_related('telegram_user'), pk=order_id)
-        if not order.telegram_user or str(order.telegram_user.telegram_id) != str(telegram_user_id):
-            raise NotFound("Order not found for this user.")
 
-        if order.status == Order.Status.PENDING_PAYMENT_LINK:
-            order.set_status(Order.Status.AWAITING_PROOF)
+class TelegramOrderRemindView(APIView):
+    permission_classes = [AllowAny]
 
-        response = {
-            'order_id': order.id,
-            'status': order.status,
-            'payment_link': order.payment_link,
-            'payment_deadline_at': order.payment_deadline_at,
-            'formatted_total': order.formatted_total,
-        }
-        return Response(response, status=status.HTTP_200_OK)
+    def post(self, request, *args, **kwargs):
+        payload = services.remind_order(request.data.get('order_id'), request.data.get('telegram_user_id'))
+        return Response(payload, status=status.HTTP_200_OK)
 
 
 class AdminPaymentListView(APIView):
@@ -688,7 +486,7 @@ class AdminPaymentListView(APIView):
         serializer = PaymentSerializer(
             payments.order_by('-created_at'),
             many=True,
-            context={'request': request, 'include_proofs': False},
+            context={'request': request, 'include_proofs': False, 'include_proof_preview': True},
         )
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -713,52 +511,35 @@ class AdminPaymentApproveView(APIView):
     permission_classes = [IsAuthenticated, IsAdminUser]
 
     def post(self, request, payment_id: int, *args, **kwargs):
-        payment = get_object_or_404(Payment.objects.select_related('order'), pk=payment_id)
-        if payment.status == Payment.Status.PAID:
-            return Response({'detail': 'Payment already approved.'}, status=status.HTTP_400_BAD_REQUEST)
-        if payment.status == Payment.Status.REJECTED:
-            return Response({'detail': 'Payment already rejected.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        with transaction.atomic():
-            payment.status = Payment.Status.PAID
-            payment.reviewed_by = request.user
-            payment.rejection_reason = ''
-            payment.save(update_fields=['status', 'reviewed_by', 'rejection_reason', 'updated_at'])
-            payment.order.set_status(Order.Status.PAID, changed_by=request.user)
-            send_telegram_notification(
-                payment.order.telegram_user,
-                f"🎉 Оплата подтверждена! Заказ №{payment.order.id} перешёл в обработку.",
-            )
-
-        return Response({'status': payment.status, 'order_status': payment.order.status}, status=status.HTTP_200_OK)
+        payment = services.get_payment(payment_id)
+        payload = services.approve_payment(payment, reviewed_by=request.user)
+        return Response(payload, status=status.HTTP_200_OK)
 
 
 class AdminPaymentRejectView(APIView):
     permission_classes = [IsAuthenticated, IsAdminUser]
 
     def post(self, request, payment_id: int, *args, **kwargs):
-        payment = get_object_or_404(Payment.objects.select_related('order'), pk=payment_id)
+        payment = services.get_payment(payment_id)
         serializer = PaymentModerationSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         reason = serializer.validated_data.get('reason', '').strip()
         if not reason:
             raise ValidationError("Reason is required for rejection.")
 
-        if payment.status == Payment.Status.PAID:
-            return Response({'detail': 'Cannot reject an approved payment.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        with transaction.atomic():
-            payment.status = Payment.Status.REJECTED
-            payment.reviewed_by = request.user
-            payment.rejection_reason = reason
-            payment.save(update_fields=['status', 'reviewed_by', 'rejection_reason', 'updated_at'])
-            payment.order.set_status(Order.Status.REJECTED, changed_by=request.user, comment=reason)
-            send_telegram_notification(
-                payment.order.telegram_user,
-                f"❌ Чек отклонён: {reason}. Пожалуйста, пришлите корректный чек или свяжитесь с поддержкой.",
-            )
+        payload = services.reject_payment(payment, reason, reviewed_by=request.user)
+        return Response(payload, status=status.HTTP_200_OK)
+
+
+class AdminPaymentBulkView(APIView):
+    """Несколько решений approve/reject за одну транзакцию; ответ — результат по каждому payment_id"""
+    permission_classes = [IsAuthenticated, IsAdminUser]
 
-        return Response({'status': payment.status, 'order_status': payment.order.status, 'reason': reason}, status=status.HTTP_200_OK)
+    def post(self, request, *args, **kwargs):
+        serializer = PaymentBulkModerationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        payload = services.moderate_payments(serializer.validated_data['decisions'], reviewed_by=request.user)
+        return Response(payload, status=status.HTTP_200_OK)
 
 
 class TelegramPaymentApproveView(APIView):
@@ -766,37 +547,8 @@ class TelegramPaymentApproveView(APIView):
     permission_classes = [AllowAny]
 
     def post(self, request, payment_id: int, *args, **kwargs):
-        payment = get_object_or_404(Payment.objects.select_related('order', 'order__telegram_user'), pk=payment_id)
-        telegram_admin_id = request.data.get('telegram_admin_id')
-        
-        if not telegram_admin_id:
-            return Response({'detail': 'telegram_admin_id is required.'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Проверяем, что пользователь является админом
-        try:
-            admin_user = TelegramUser.objects.get(telegram_id=telegram_admin_id)
-            if not admin_user.is_admin:
-                return Response({'detail': 'User is not an admin.'}, status=status.HTTP_403_FORBIDDEN)
-        except TelegramUser.DoesNotExist:
-            return Response({'detail': 'Admin user not found.'}, status=status.HTTP_404_NOT_FOUND)
-        
-        if payment.status == Payment.Status.PAID:
-            return Response({'detail': 'Payment already approved.'}, status=status.HTTP_400_BAD_REQUEST)
-        if payment.status == Payment.Status.REJECTED:
-            return Response({'detail': 'Payment already rejected.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        with transaction.atomic():
-            payment.status = Payment.Status.PAID
-            payment.reviewed_by = None  # Не Django пользователь
-            payment.rejection_reason = ''
-            payment.save(update_fields=['status', 'reviewed_by', 'rejection_reason', 'updated_at'])
-            payment.order.set_status(Order.Status.PAID, changed_by=None)
-            send_telegram_notification(
-                payment.order.telegram_user,
-                f"🎉 Оплата подтверждена! Заказ №{payment.order.id} перешёл в обработку.",
-            )
-
-        return Response({'status': payment.status, 'order_status': payment.order.status}, status=status.HTTP_200_OK)
+        payload = services.approve_payment_by_telegram(payment_id, request.data.get('telegram_admin_id'))
+        return Response(payload, status=status.HTTP_200_OK)
 
 
 class TelegramPaymentRejectView(APIView):
@@ -804,39 +556,21 @@ class TelegramPaymentRejectView(APIView):
     permission_classes = [AllowAny]
 
     def post(self, request, payment_id: int, *args, **kwargs):
-        payment = get_object_or_404(Payment.objects.select_related('order', 'order__telegram_user'), pk=payment_id)
-        telegram_admin_id = request.data.get('telegram_admin_id')
-        reason = request.data.get('reason', '').strip()
-        
-        if not telegram_admin_id:
-            return Response({'detail': 'telegram_admin_id is required.'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        if not reason:
-            return Response({'detail': 'Reason is required for rejection.'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Проверяем, что пользователь является админом
-        try:
-            admin_user = TelegramUser.objects.get(telegram_id=telegram_admin_id)
-            if not admin_user.is_admin:
-                return Response({'detail': 'User is not an admin.'}, status=status.HTTP_403_FORBIDDEN)
-        except TelegramUser.DoesNotExist:
-            return Response({'detail': 'Admin user not found.'}, status=status.HTTP_404_NOT_FOUND)
-        
-        if payment.status == Payment.Status.PAID:
-            return Response({'detail': 'Cannot reject an approved payment.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        with transaction.atomic():
-            payment.status = Payment.Status.REJECTED
-            payment.reviewed_by = None  # Не Django пользователь
-            payment.rejection_reason = reason
-            payment.save(update_fields=['status', 'reviewed_by', 'rejection_reason', 'updated_at'])
-            payment.order.set_status(Order.Status.REJECTED, changed_by=None, comment=reason)
-            send_telegram_notification(
-                payment.order.telegram_user,
-                f"❌ Чек отклонён: {reason}. Пожалуйста, пришлите корректный чек или свяжитесь с поддержкой.",
-            )
+        payload = services.reject_payment_by_telegram(
+            payment_id,
+            request.data.get('telegram_admin_id'),
+            request.data.get('reason', ''),
+        )
+        return Response(payload, status=status.HTTP_200_OK)
+
 
-        return Response({'status': payment.status, 'order_status': payment.order.status, 'reason': reason}, status=status.HTTP_200_OK)
+class TelegramPaymentBulkView(APIView):
+    """Bulk approve/reject by Telegram admin"""
+    permission_classes = [AllowAny]
+
+    def post(self, request, *args, **kwargs):
+        payload = services.moderate_payments_by_telegram(request.data)
+        return Response(payload, status=status.HTTP_200_OK)
 
 
 class AdminOrderCancelView(APIView):
@@ -846,22 +580,8 @@ class AdminOrderCancelView(APIView):
         order = get_object_or_404(Order.objects.prefetch_related('payments'), pk=order_id)
         serializer = OrderCancelSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        reason = serializer.validated_data['reason']
-
-        with transaction.atomic():
-            order.set_status(Order.Status.CANCELED, changed_by=request.user, comment=reason)
-            active_payment = order.payments.filter(is_active=True).exclude(status=Payment.Status.PAID).first()
-            if active_payment:
-                active_payment.status = Payment.Status.REJECTED
-                active_payment.reviewed_by = request.user
-                active_payment.rejection_reason = reason
-                active_payment.save(update_fields=['status', 'reviewed_by', 'rejection_reason', 'updated_at'])
-            send_telegram_notification(
-                order.telegram_user,
-                f"❌ Заказ №{order.id} отменён: {reason}",
-            )
-
-        return Response({'status': order.status, 'reason': reason}, status=status.HTTP_200_OK)
+        payload = services.cancel_order(order, serializer.validated_data['reason'], changed_by=request.user)
+        return Response(payload, status=status.HTTP_200_OK)
 
 
 class TelegramUserViewSet(viewsets.ModelViewSet):
@@ -887,6 +607,52 @@ class TelegramAddressViewSet(viewsets.ModelViewSet):
         return TelegramAddress.objects.all()
 
 
+class BootstrapView(APIView):
+    """
+    Всё для первого экрана Mini App / бота одним ответом: категории, первые товары корневых
+    категорий, профиль Telegram-пользователя и версия каталога. Каталог берётся из готовых
+    JSON-фрагментов (site_app/catalog.py), ответ отдаётся с ETag.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        profile = None
+        telegram_user_id = request.query_params.get('telegram_user_id')
+        if telegram_user_id:
+            if not telegram_user_id.isdigit():
+                raise ValidationError({'telegram_user_id': 'A valid integer is required.'})
+            profile = TelegramUser.objects.filter(telegram_id=telegram_user_id).first()
+
+        language = catalog.normalize_language(
+            request.query_params.get('lang') or (profile.language if profile else None)
+        )
+        fragment = catalog.get_catalog(language, request)
+        renderer = ORJSONRenderer()
+        user_json = renderer.render(TelegramUserSerializer(profile).data) if profile else b'null'
+        etag = '"%s"' % hashlib.sha1(f'{fragment.digest}:{language}'.encode() + user_json).hexdigest()
+
+        if etag_matches(request, etag):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(
+                b''.join([
+                    b'{"catalog_version":', renderer.render(fragment.version),
+                    b',"language":', renderer.render(language),
+                    b',"categories":', fragment.categories,
+                    b',"products":', fragment.products,
+                    b',"user":', user_json,
+                    b'}',
+                ]),
+                content_type='application/json',
+            )
+        response['ETag'] = etag
+        if profile:
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(response, public=True, max_age=settings.BOOTSTRAP_MAX_AGE)
+        return response
+
+
 class RegisterView(APIView):
     permission_classes = [AllowAny]
 
@@ -0,0 +1,122 @@
+"""
+OpenAPI schema served from a build-once cache.
+
+The schema is generated on first use (or loaded from the file written by
+``manage.py export_api_schema`` at deploy time) and kept in memory, keyed by
+the code version, so swagger.json/yaml hits never walk the viewsets again.
+"""
+import hashlib
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.test import RequestFactory
+from django.utils.cache import patch_cache_control
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+from drf_yasg.renderers import _SpecRenderer
+from drf_yasg.views import get_schema_view
+from rest_framework.permissions import AllowAny
+from rest_framework.request import Request
+
+from site_app.compression import etag_matches
+
+SCHEMA_INFO = openapi.Info(
+    title="Shop API",
+    default_version='v1',
+    description="API documentation",
+)
+
+CODECS = {
+    'json': OpenAPICodecJson,
+    'yaml': OpenAPICodecYaml,
+}
+
+_lock = threading.Lock()
+_code_version: Optional[str] = None
+_documents: Dict[Tuple[str, str, str], Tuple[bytes, str]] = {}
+
+
+def code_version() -> str:
+    """Version the schema is keyed by: API_SCHEMA_VERSION or a digest of the API source files."""
+    global _code_version
+    if _code_version is None:
+        configured = getattr(settings, 'API_SCHEMA_VERSION', '')
+        if configured:
+            _code_version = configured
+        else:
+            digest = hashlib.sha1()
+            for path in sorted(Path(settings.BASE_DIR).glob('site_*/**/*.py')):
+                digest.update(path.read_bytes())
+            _code_version = digest.hexdigest()[:12]
+    return _code_version
+
+
+def schema_path(fmt: str) -> Path:
+    return Path(settings.API_SCHEMA_DIR) / f"swagger-{code_version()}.{fmt}"
+
+
+def _anonymous_request(url: Optional[str]) -> Request:
+    # Views inspect self.request while the schema is generated, so give them an anonymous one
+    parts = urlsplit(url or 'http://localhost/')
+    return Request(RequestFactory().get('/swagger.json', HTTP_HOST=parts.netloc or 'localhost', secure=parts.scheme == 'https'))
+
+
+def build_schema(fmt: str, url: Optional[str] = None) -> bytes:
+    """Walk the API and encode the schema; this is the expensive part."""
+    url = url or settings.API_SCHEMA_URL or None
+    generator = SchemaView.generator_class(SCHEMA_INFO, '', url)
+    schema = generator.get_schema(request=_anonymous_request(url), public=True)
+    return CODECS[fmt](validators=[]).encode(schema)
+
+
+def get_document(fmt: str, base_url: str) -> Tuple[bytes, str]:
+    """Return (content, etag), building or loading it at most once per code version and host."""
+    key = (code_version(), fmt, '' if settings.API_SCHEMA_URL else base_url)
+    document = _documents.get(key)
+    if document is not None:
+        return document
+    with _lock:
+        document = _documents.get(key)
+        if document is None:
+            path = schema_path(fmt)
+            content = path.read_bytes() if path.exists() else build_schema(fmt, url=settings.API_SCHEMA_URL or base_url)
+            document = (content, '"%s"' % hashlib.sha1(content).hexdigest())
+            _documents[key] = document
+    return document
+
+
+def clear_cache():
+    global _code_version
+    with _lock:
+        _documents.clear()
+        _code_version = None
+
+
+_BaseSchemaView = get_schema_view(
+    SCHEMA_INFO,
+    public=True,
+    permission_classes=(AllowAny,),
+)
+
+
+class SchemaView(_BaseSchemaView):
+    def get(self, request, version='', format=None):
+        renderer = request.accepted_renderer
+        if not isinstance(renderer, _SpecRenderer):
+            # UI pages only carry an empty schema; the spec itself is fetched separately
+            return super().get(request, version=version, format=format)
+
+        fmt = 'yaml' if renderer.codec_class is OpenAPICodecYaml else 'json'
+        content, etag = get_document(fmt, request.build_absolute_uri('/'))
+
+        if etag_matches(request, etag):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type=f"{renderer.media_type}; charset=utf-8")
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, max_age=settings.API_SCHEMA_MAX_AGE)
+        return response
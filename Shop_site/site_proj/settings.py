@@ -54,6 +54,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'site_app.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -88,7 +89,16 @@ WSGI_APPLICATION = 'site_proj.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.getenv('DJANGO_DB_PATH', BASE_DIR / 'db.sqlite3'),
+        # Писатели сразу берут блокировку и ждут друг друга, а не падают с "database is locked"
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # Файловая тестовая БД: в in-memory (shared cache) параллельные транзакции не ждут блокировку
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -133,6 +143,43 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Загрузки получают хеш содержимого в имени (site_app/storage.py)
+STORAGES = {
+    'default': {'BACKEND': 'site_app.storage.ContentHashedStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+# Раздача медиа (site_app/media.py): имена с хешем кэшируются навсегда, остальные — на MEDIA_MAX_AGE;
+# чеки оплаты — только в браузере клиента (private)
+MEDIA_MAX_AGE = 3600
+MEDIA_HASHED_MAX_AGE = 60 * 60 * 24 * 365
+MEDIA_PRIVATE_PREFIXES = ('payment_proofs/', 'variants/payment_proofs/')
+# '' — файл отдаёт Django; 'x-accel-redirect' (nginx) или 'x-sendfile' (Apache) — веб-сервер
+MEDIA_SENDFILE = os.getenv('MEDIA_SENDFILE', '')
+MEDIA_ACCEL_PREFIX = os.getenv('MEDIA_ACCEL_PREFIX', '/protected-media/')
+
+# Уменьшенные копии картинок (site_app/imaging.py): размер по длинной стороне и число потоков
+# (0 — строить сразу в запросе)
+IMAGE_DERIVATIVE_SIZES = {'thumb': 160, 'card': 480, 'full': 1280}
+IMAGE_DERIVATIVE_WORKERS = int(os.getenv('IMAGE_DERIVATIVE_WORKERS', '2'))
+
+# Предел размера файла чека; загрузка пишется на диск кусками (site_app/uploads.py)
+PAYMENT_PROOF_MAX_BYTES = int(os.getenv('PAYMENT_PROOF_MAX_BYTES', str(10 * 1024 * 1024)))
+
+# Копии чеков из Telegram (site_app/proof_mirror.py): параллельные скачивания (0 — сразу в запросе)
+# и адрес Bot API (можно свой telegram-bot-api сервер)
+PROOF_MIRROR_WORKERS = int(os.getenv('PROOF_MIRROR_WORKERS', '4'))
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')
+
+# Массовая модерация оплат (site_app/services/moderation.py): решений в одном запросе и поток для
+# уведомлений клиентам (0 — отправлять сразу после commit в том же потоке)
+PAYMENT_BULK_MAX_DECISIONS = int(os.getenv('PAYMENT_BULK_MAX_DECISIONS', '100'))
+NOTIFICATION_WORKERS = int(os.getenv('NOTIFICATION_WORKERS', '1'))
+
+# Сжатие JSON-ответов (site_app/compression.py)
+RESPONSE_COMPRESSION_MIN_BYTES = 1024
+RESPONSE_COMPRESSION_TYPES = ('application/json', 'application/yaml')
+
 # DRF configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
@@ -141,6 +188,16 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.AllowAny',
     ),
+    # orjson, если установлен (pip install orjson); без него — стандартный JSON DRF, вывод тот же
+    'DEFAULT_RENDERER_CLASSES': (
+        'site_app.fastjson.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'site_app.fastjson.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
     'DEFAULT_FILTER_BACKENDS': [
@@ -150,6 +207,38 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Сколько часов хранится ответ на запрос с Idempotency-Key (checkout)
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.getenv('IDEMPOTENCY_KEY_TTL_HOURS', '24'))
+
+# Максимум id в /api/products/bulk/
+PRODUCT_BULK_MAX_IDS = 100
+
+# История заказов (/api/telegram/orders/, /api/orders/history/): размер страницы по умолчанию и максимум
+ORDER_HISTORY_PAGE_SIZE = 5
+ORDER_HISTORY_MAX_PAGE_SIZE = 50
+
+# Максимум id в /api/orders/deadlines/
+ORDER_DEADLINES_MAX_IDS = 50
+
+# Максимум позиций в PUT /api/cart/sync/
+CART_SYNC_MAX_ITEMS = 100
+
+# SSE /api/orders/<id>/events/ (site_app/events.py): класс брокера, секунды между ping
+# и сколько держать одно соединение (EventSource сам переподключится с Last-Event-ID)
+ORDER_EVENTS_BROKER = os.getenv('ORDER_EVENTS_BROKER', 'site_app.events.InProcessBroker')
+ORDER_EVENTS_HEARTBEAT = 15
+ORDER_EVENTS_STREAM_SECONDS = 300
+
+# /api/bootstrap/: товаров на корневую категорию и сколько секунд кэшировать анонимный ответ
+BOOTSTRAP_PRODUCTS_PER_CATEGORY = 10
+BOOTSTRAP_MAX_AGE = 60
+
+# OpenAPI schema cache (see site_proj/schema.py)
+API_SCHEMA_DIR = BASE_DIR / 'schema'
+API_SCHEMA_URL = os.getenv('API_SCHEMA_URL', '')
+API_SCHEMA_VERSION = os.getenv('API_SCHEMA_VERSION', '')
+API_SCHEMA_MAX_AGE = 300
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -191,6 +280,7 @@ CORS_ALLOW_HEADERS = [
     'accept',
     'accept-encoding',
     'authorization',
+    'idempotency-key',
     'content-type',
     'dnt',
     'origin',
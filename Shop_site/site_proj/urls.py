@@ -1,21 +1,13 @@
+import re
+
 from django.contrib import admin
 from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-from rest_framework.permissions import AllowAny
 from django.http import HttpResponse
 
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Shop API",
-        default_version='v1',
-        description="API documentation",
-    ),
-    public=True,
-    permission_classes=(AllowAny,),
-)
+from site_app.media import serve_media
+
+from .schema import SchemaView
 
 def home(request):
     return HttpResponse(
@@ -78,7 +70,8 @@ urlpatterns = [
     path('', home, name='home'),
     path('admin/', admin.site.urls),
     path('api/', include('site_app.urls')),
-    re_path(r'^swagger(?P<format>\.json|\.yaml)$', schema_view.without_ui(cache_timeout=0), name='schema-json'),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    re_path(r'^swagger(?P<format>\.json|\.yaml)$', SchemaView.without_ui(), name='schema-json'),
+    path('swagger/', SchemaView.with_ui('swagger'), name='schema-swagger-ui'),
+    path('redoc/', SchemaView.with_ui('redoc'), name='schema-redoc'),
+    re_path(r'^%s(?P<path>.+)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_media, name='media'),
+]
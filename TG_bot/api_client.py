@@ -3,23 +3,84 @@ API Client for Django REST API
 Connects the Telegram bot to the Django backend
 """
 import os
+import threading
+import time
+import uuid
 import requests
-from typing import Dict, Optional, List, Any, Union
+from typing import Dict, Iterable, Optional, List, Any, Union
 from decimal import Decimal
 
+from http_transport import CircuitBreaker, ResilientTransport
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+def _transport_class():
+    """DJANGO_API_TRANSPORT=inprocess — вызывать Django в этом же процессе вместо HTTP"""
+    kind = os.getenv('DJANGO_API_TRANSPORT', 'http').lower()
+    if kind == 'inprocess':
+        import django_setup  # noqa: F401  # side effect: configures Django
+        from inprocess_transport import InProcessTransport
+        return InProcessTransport
+    if kind != 'http':
+        raise ValueError(f"Unknown DJANGO_API_TRANSPORT: {kind!r} (expected 'http' or 'inprocess')")
+    return ResilientTransport
+
 
 class DjangoAPIClient:
     """Client for interacting with Django REST API"""
-    
-    def __init__(self, base_url: str = "http://localhost:8000/api"):
-        self.base_url = base_url
-        self.session = requests.Session()
+
+    CHECKOUT_RETRY_STATUSES = (409, 502, 503, 504)
+    # Совпадает с PRODUCT_BULK_MAX_IDS на сервере
+    PRODUCTS_BULK_MAX_IDS = 100
+
+    def __init__(self, base_url: str = "http://localhost:8000/api", transport: Optional[ResilientTransport] = None):
+        self.transport = transport or _transport_class()(
+            base_url,
+            pool_size=int(os.getenv('DJANGO_API_POOL_SIZE', '20')),
+            timeouts={
+                'GET': (_env_float('DJANGO_API_CONNECT_TIMEOUT', 3.05), _env_float('DJANGO_API_READ_TIMEOUT', 10)),
+                'POST': (_env_float('DJANGO_API_CONNECT_TIMEOUT', 3.05), _env_float('DJANGO_API_WRITE_TIMEOUT', 15)),
+                'PUT': (_env_float('DJANGO_API_CONNECT_TIMEOUT', 3.05), _env_float('DJANGO_API_WRITE_TIMEOUT', 15)),
+                'PATCH': (_env_float('DJANGO_API_CONNECT_TIMEOUT', 3.05), _env_float('DJANGO_API_WRITE_TIMEOUT', 15)),
+                'DELETE': (_env_float('DJANGO_API_CONNECT_TIMEOUT', 3.05), _env_float('DJANGO_API_READ_TIMEOUT', 10)),
+            },
+            retries=int(os.getenv('DJANGO_API_RETRIES', '2')),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv('DJANGO_API_BREAKER_THRESHOLD', '5')),
+                reset_timeout=_env_float('DJANGO_API_BREAKER_RESET', 30),
+            ),
+        )
+        self.session = self.transport.session
+        # product_id -> (истекает в, товар); цена в заказе всё равно считается на сервере
+        self.product_cache_ttl = _env_float('DJANGO_API_PRODUCT_CACHE_TTL', 60)
+        self._product_cache: Dict[int, tuple] = {}
+        self._product_cache_lock = threading.Lock()
+        # язык -> (ETag, ответ /bootstrap/)
+        self._bootstrap: Dict[str, tuple] = {}
+
+    @property
+    def base_url(self) -> str:
+        return self.transport.base_url
+
+    @base_url.setter
+    def base_url(self, value: str):
+        self.transport.base_url = value.rstrip('/')
+
+    def metrics(self) -> Dict[str, Any]:
+        """Latency/error counters per endpoint plus circuit breaker state"""
+        snapshot = self.transport.metrics.snapshot()
+        snapshot['circuit'] = self.transport.breaker.state
+        snapshot['transport'] = type(self.transport).__name__
+        return snapshot
         
     def _get(self, endpoint: str, **kwargs) -> Union[Dict, List]:
         """GET request"""
         url = f"{self.base_url}/{endpoint.lstrip('/')}"
         try:
-            response = self.session.get(url, **kwargs, timeout=10)
+            response = self.transport.request('GET', endpoint, **kwargs)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.Timeout:
@@ -33,29 +94,25 @@ class DjangoAPIClient:
     
     def _post(self, endpoint: str, data: Dict = None, **kwargs) -> Dict:
         """POST request"""
-        url = f"{self.base_url}/{endpoint.lstrip('/')}"
-        response = self.session.post(url, json=data, **kwargs)
+        response = self.transport.request('POST', endpoint, json=data, **kwargs)
         response.raise_for_status()
         return response.json()
     
     def _put(self, endpoint: str, data: Dict = None, **kwargs) -> Dict:
         """PUT request"""
-        url = f"{self.base_url}/{endpoint.lstrip('/')}"
-        response = self.session.put(url, json=data, **kwargs)
+        response = self.transport.request('PUT', endpoint, json=data, **kwargs)
         response.raise_for_status()
         return response.json()
     
     def _patch(self, endpoint: str, data: Dict = None, **kwargs) -> Dict:
         """PATCH request"""
-        url = f"{self.base_url}/{endpoint.lstrip('/')}"
-        response = self.session.patch(url, json=data, **kwargs)
+        response = self.transport.request('PATCH', endpoint, json=data, **kwargs)
         response.raise_for_status()
         return response.json()
     
     def _delete(self, endpoint: str, **kwargs) -> None:
         """DELETE request"""
-        url = f"{self.base_url}/{endpoint.lstrip('/')}"
-        response = self.session.delete(url, **kwargs)
+        response = self.transport.request('DELETE', endpoint, **kwargs)
         response.raise_for_status()
     
     # Telegram User operations
@@ -103,10 +160,57 @@ class DjangoAPIClient:
     
     def get_product(self, product_id: int) -> Optional[Dict]:
         """Get product by ID"""
+        cached = self._cached_products([product_id])
+        if product_id in cached:
+            return cached[product_id]
         try:
-            return self._get(f"products/{product_id}/")
+            product = self._get(f"products/{product_id}/")
         except requests.HTTPError:
             return None
+        self._cache_products([product])
+        return product
+
+    def get_products_by_ids(self, product_ids: Iterable[int]) -> Dict[int, Dict]:
+        """
+        Товары по id: {id: товар}. Сначала из кэша, недостающие — одним запросом
+        к products/bulk/ на каждые PRODUCTS_BULK_MAX_IDS id. Ненайденных id в ответе нет.
+        """
+        product_ids = list(dict.fromkeys(int(pid) for pid in product_ids))
+        found = self._cached_products(product_ids)
+        missing = [pid for pid in product_ids if pid not in found]
+        for start in range(0, len(missing), self.PRODUCTS_BULK_MAX_IDS):
+            chunk = missing[start:start + self.PRODUCTS_BULK_MAX_IDS]
+            products = self._get("products/bulk/", params={'ids': ','.join(map(str, chunk))})
+            self._cache_products(products)
+            found.update((product['id'], product) for product in products)
+        return found
+
+    def invalidate_products(self, product_ids: Optional[Iterable[int]] = None):
+        """Сбросить кэш товаров (все или указанные id) — после правки товара в боте"""
+        with self._product_cache_lock:
+            if product_ids is None:
+                self._product_cache.clear()
+            else:
+                for product_id in product_ids:
+                    self._product_cache.pop(int(product_id), None)
+
+    def _cached_products(self, product_ids: Iterable[int]) -> Dict[int, Dict]:
+        now = time.monotonic()
+        found = {}
+        with self._product_cache_lock:
+            for product_id in product_ids:
+                entry = self._product_cache.get(product_id)
+                if entry and entry[0] > now:
+                    found[product_id] = entry[1]
+        return found
+
+    def _cache_products(self, products: Iterable[Dict]):
+        if self.product_cache_ttl <= 0:
+            return
+        expires_at = time.monotonic() + self.product_cache_ttl
+        with self._product_cache_lock:
+            for product in products:
+                self._product_cache[product['id']] = (expires_at, product)
     
     def get_categories(self) -> List[Dict]:
         """Get all categories"""
@@ -128,14 +232,30 @@ class DjangoAPIClient:
             print(f"Unexpected error getting categories: {e}")
             raise
     
+    def get_bootstrap(self, language: str = 'ru') -> Dict:
+        """
+        Категории (деревом) и первые товары корневых категорий одним запросом.
+        Повторные вызовы отправляют If-None-Match и на 304 отдают сохранённый ответ.
+        """
+        cached = self._bootstrap.get(language)
+        headers = {'If-None-Match': cached[0]} if cached and cached[0] else {}
+        response = self.transport.request('GET', 'bootstrap/', params={'lang': language}, headers=headers)
+        if response.status_code == 304 and cached:
+            return cached[1]
+        response.raise_for_status()
+        data = response.json()
+        self._bootstrap[language] = (response.headers.get('ETag'), data)
+        return data
+
     # Cart operations (these would need to be adapted for Telegram users)
     # For now, we'll keep the bot's local cart functionality
     
     def calculate_order_total(self, items: List[Dict]) -> Decimal:
         """Calculate total for cart items"""
         total = Decimal(0)
+        products = self.get_products_by_ids(item['product_id'] for item in items)
         for item in items:
-            product = self.get_product(item['product_id'])
+            product = products.get(int(item['product_id']))
             if product:
                 total += Decimal(str(product['price'])) * item['quantity']
         return total
@@ -151,7 +271,12 @@ class DjangoAPIClient:
         latitude: Optional[float] = None,
         longitude: Optional[float] = None,
         delivery_time: Optional[str] = None,
+        idempotency_key: Optional[str] = None,
     ) -> Dict:
+        """
+        Оформить заказ. Все попытки идут с одним Idempotency-Key, поэтому повтор после таймаута
+        вернёт уже созданный заказ, а не создаст второй.
+        """
         data = {
             'telegram_user_id': telegram_user_id,
             'cart_items': cart_items,
@@ -167,14 +292,33 @@ class DjangoAPIClient:
             data['longitude'] = longitude
         if delivery_time:
             data['delivery_time'] = delivery_time
-        return self._post('checkout/', data=data)
+
+        # С ключом запрос идемпотентен: транспорт повторит его после таймаута или 409 (первая попытка ещё идёт)
+        headers = {'Idempotency-Key': idempotency_key or uuid.uuid4().hex}
+        return self._post('checkout/', data=data, headers=headers, retry_statuses=self.CHECKOUT_RETRY_STATUSES)
 
     def get_order_detail(self, order_id: int, telegram_user_id: int) -> Dict:
         return self._get(f'telegram/orders/{order_id}/', params={'telegram_user_id': telegram_user_id})
 
+    def get_order_history(self, telegram_user_id: int, cursor: Optional[str] = None, limit: Optional[int] = None) -> Dict:
+        """{'results': [...], 'next_cursor': str | None}; pass next_cursor back for the next page"""
+        params: Dict[str, Any] = {'telegram_user_id': telegram_user_id}
+        if cursor:
+            params['cursor'] = cursor
+        if limit:
+            params['limit'] = limit
+        return self._get('telegram/orders/', params=params)
+
     def get_order_deadline(self, order_id: int, telegram_user_id: int) -> Dict:
         return self._get(f'orders/{order_id}/deadline/', params={'telegram_user_id': telegram_user_id})
 
+    def get_order_deadlines(self, order_ids: List[int], telegram_user_id: int) -> List[Dict]:
+        """Сроки оплаты нескольких заказов одним запросом; чужие и неизвестные заказы в ответ не попадают"""
+        if not order_ids:
+            return []
+        params = {'ids': ','.join(str(order_id) for order_id in order_ids), 'telegram_user_id': telegram_user_id}
+        return self._get('orders/deadlines/', params=params)
+
     def submit_payment_proof(self, *, order_id: int, telegram_user_id: int, telegram_file_id: str, message_id: Optional[str] = None, comment: str = '') -> Dict:
         data = {
             'order_id': order_id,
@@ -203,35 +347,28 @@ class DjangoAPIClient:
         }
         return self._post(f'telegram/payment/{payment_id}/reject/', data=data)
     
-    def get_payment_proof(self, order_id: int) -> Optional[Dict]:
-        """Get payment proof file_id for order"""
-        try:
-            # Получаем информацию о заказе и платеже
-            order_data = self._get(f'telegram/orders/{order_id}/', params={})
-            if order_data and order_data.get('payments'):
-                # Берем последний активный платеж
-                for payment in order_data['payments']:
-                    if payment.get('is_active') and payment.get('proofs'):
-                        # Берем последний чек
-                        proof = payment['proofs'][-1]
-                        # Получаем telegram_user_id из заказа
-                        telegram_user_id = None
-                        if order_data.get('telegram_user'):
-                            # Если telegram_user это ID
-                            if isinstance(order_data['telegram_user'], int):
-                                telegram_user_id = order_data['telegram_user']
-                            # Если это объект с telegram_id
-                            elif isinstance(order_data['telegram_user'], dict):
-                                telegram_user_id = order_data['telegram_user'].get('telegram_id')
-                        
-                        return {
-                            'file_id': proof.get('telegram_file_id'),
-                            'payment_id': payment.get('id'),
-                            'user_id': telegram_user_id,
-                        }
-        except Exception as e:
-            print(f"Error getting payment proof: {e}")
-        return None
+    def moderate_payments_telegram(self, decisions: List[Dict], telegram_admin_id: int) -> Dict:
+        """Several approve/reject decisions in one request; per-payment results in 'results'"""
+        data = {'decisions': decisions, 'telegram_admin_id': telegram_admin_id}
+        return self._post('telegram/payment/bulk/', data=data)
+    
+    def get_payment_proof(self, order_id: int, telegram_admin_id: int) -> Optional[Dict]:
+        """Latest proof of the order's active payment (admin only); None if there is none"""
+        response = self.transport.request(
+            'GET',
+            f'telegram/orders/{order_id}/proof/',
+            params={'telegram_admin_id': telegram_admin_id},
+        )
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        proof = response.json()
+        return {
+            'file_id': proof.get('telegram_file_id'),
+            'image_url': proof.get('image_url'),
+            'payment_id': proof.get('payment_id'),
+            'user_id': proof.get('customer_telegram_id'),
+        }
 
 
 # Global API client instance
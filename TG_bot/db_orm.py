@@ -6,8 +6,9 @@ from datetime import datetime
 from typing import Optional, Dict, Any, List
 from decimal import Decimal
 
-from django_setup import TelegramUser, TelegramAddress, Order, Product, Category
+from django_setup import TelegramUser, TelegramAddress, Order, Payment, Product, Category
 from django.db.models import Q
+from site_app.services import order_history
 
 
 def now() -> datetime:
@@ -138,22 +139,30 @@ def get_user_addresses(telegram_id: int) -> List[Dict]:
 
 
 # Product operations (for temporary cart/orders in bot)
+def _product_dict(product: Product) -> Dict:
+    return {
+        'id': product.pk,
+        'name': product.title,
+        'description': product.description,
+        'price': float(product.price),
+        'category': 'product',  # Simplified
+        'image': product.image.url if product.image else None
+    }
+
+
 def get_product(product_id: int) -> Optional[Dict]:
     """Get product from Django"""
     try:
-        product = Product.objects.get(pk=product_id)
-        return {
-            'id': product.pk,
-            'name': product.title,
-            'description': product.description,
-            'price': float(product.price),
-            'category': 'product',  # Simplified
-            'image': product.image.url if product.image else None
-        }
+        return _product_dict(Product.objects.get(pk=product_id))
     except Product.DoesNotExist:
         return None
 
 
+def get_products(product_ids) -> Dict[int, Dict]:
+    """Several products in one query: {id: product}"""
+    return {product.pk: _product_dict(product) for product in Product.objects.filter(pk__in=list(product_ids))}
+
+
 def list_products(category: Optional[str] = None) -> List[Dict]:
     """List products from Django"""
     products = Product.objects.select_related('category').all().order_by('-created_at')
@@ -193,17 +202,31 @@ def add_cart_item(telegram_id: int, product_id: int, qty: int = 1):
         CART_STORAGE[telegram_id][product_id] = qty
 
 
+def replace_cart(telegram_id: int, items: List[Dict]) -> int:
+    """Replace the whole cart with [{'product_id', 'quantity'}, ...] (same rules as PUT /api/cart/sync/)"""
+    wanted: Dict[int, int] = {}
+    for item in items:
+        try:
+            product_id = int(item.get('product_id'))
+            quantity = int(item.get('quantity', 1))
+        except (TypeError, ValueError):
+            continue
+        wanted[product_id] = wanted.get(product_id, 0) + quantity
+    wanted = {product_id: qty for product_id, qty in wanted.items() if qty > 0}
+    # Одним запросом отбрасываем несуществующие товары
+    known = get_products(wanted) if wanted else {}
+    CART_STORAGE[telegram_id] = {product_id: qty for product_id, qty in wanted.items() if product_id in known}
+    return len(CART_STORAGE[telegram_id])
+
+
 def get_cart(telegram_id: int) -> List[tuple]:
     """Get cart items"""
     if telegram_id not in CART_STORAGE:
         return []
     
-    cart_items = []
-    for product_id, qty in CART_STORAGE[telegram_id].items():
-        product = get_product(product_id)
-        if product:
-            cart_items.append((product, qty))
-    return cart_items
+    cart = CART_STORAGE[telegram_id]
+    products = get_products(cart) if cart else {}
+    return [(products[product_id], qty) for product_id, qty in cart.items() if product_id in products]
 
 
 def clear_cart(telegram_id: int):
@@ -233,32 +256,29 @@ def cart_sum(telegram_id: int) -> int:
 
 def list_orders(telegram_id: int, limit: int = 5) -> List[Dict]:
     """Fetch recent orders for a Telegram user from Django"""
-    orders = (
-        Order.objects.filter(telegram_user__telegram_id=telegram_id)
-        .prefetch_related('items__product', 'payments')
-        .order_by('-created_at')[:limit]
-    )
-    result: List[Dict] = []
-    for order in orders:
-        order_items = []
-        for cart_item in order.items.all():
-            product = getattr(cart_item, 'product', None)
-            order_items.append({
-                'product_id': product.id if product else None,
-                'name': product.title if product else 'Товар',
-                'qty': cart_item.quantity,
-                'price': float(product.price) if product else 0,
-            })
-        result.append({
-            'order_id': order.id,
-            'status': order.status,
-            'sum': order.formatted_total,
-            'created_at': order.created_at.strftime('%Y-%m-%d %H:%M'),
-            'delivery_time': order.delivery_time or '',
-            'address': order.address or '',
-            'items': order_items,
-        })
-    return result
+    return order_history_page(telegram_id, limit=limit)['orders']
+
+
+def order_history_page(telegram_id: int, cursor: Optional[str] = None, limit: int = 5) -> Dict[str, Any]:
+    """One page of order history (2 queries): {'orders': [...], 'next_cursor': str | None}"""
+    page = order_history(Q(telegram_user__telegram_id=telegram_id), cursor=cursor, limit=limit)
+    orders = [
+        {
+            'order_id': order['id'],
+            'status': order['status'],
+            'sum': order['formatted_total'],
+            'created_at': order['created_at'].strftime('%Y-%m-%d %H:%M'),
+            'delivery_time': order['delivery_time'],
+            'address': order['address'],
+            'items': [
+                {'product_id': item['product_id'], 'name': item['title'] or 'Товар', 'qty': item['quantity']}
+                for item in order['items']
+            ],
+            'summary': order['summary'],
+        }
+        for order in page['results']
+    ]
+    return {'orders': orders, 'next_cursor': page['next_cursor']}
 
 
 def get_order_with_items(order_id: int) -> Optional[Dict]:
@@ -298,6 +318,27 @@ def get_order_with_items(order_id: int) -> Optional[Dict]:
     }
 
 
+def list_payments_under_review(limit: int = 30) -> List[Dict]:
+    """Активные платежи с чеком на проверке, старые первыми (очередь «подтвердить выбранные»)"""
+    payments = (
+        Payment.objects
+        .filter(status=Payment.Status.UNDER_REVIEW, is_active=True)
+        .select_related('order', 'order__telegram_user')
+        .order_by('created_at')[:limit]
+    )
+    return [
+        {
+            'payment_id': payment.id,
+            'order_id': payment.order_id,
+            'amount': payment.formatted_amount,
+            'customer': payment.order.customer_name
+            or (payment.order.telegram_user.name if payment.order.telegram_user else '')
+            or 'Не указано',
+        }
+        for payment in payments
+    ]
+
+
 def init_db():
     """Initialize - no longer needed with ORM"""
     pass
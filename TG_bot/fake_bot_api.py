@@ -0,0 +1,165 @@
+"""
+Local fake of the Telegram Bot API
+Lets the bot handlers run without a real bot token (benchmarks, replay)
+"""
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Any
+from urllib.parse import parse_qs, urlparse
+
+import telebot
+
+
+BOT_USER = {'id': 1000000001, 'is_bot': True, 'first_name': 'PartyLand', 'username': 'partyland_fake_bot'}
+
+
+class FakeBotAPI:
+    """In-memory Bot API: queues updates for getUpdates and records every outbound call"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        self._lock = threading.Lock()
+        self._updates: List[Dict[str, Any]] = []
+        self._message_id = 0
+        self.calls: Counter = Counter()
+        self.log: List[Dict[str, Any]] = []
+        self.keep_log = False
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'FakeBotAPI':
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def install(self):
+        """Point pyTelegramBotAPI at this server instead of api.telegram.org"""
+        telebot.apihelper.API_URL = self.url + "/bot{0}/{1}"
+        telebot.apihelper.FILE_URL = self.url + "/file/bot{0}/{1}"
+
+    # Update queue
+
+    def push_update(self, update: Dict[str, Any]):
+        with self._lock:
+            self._updates.append(update)
+
+    def _take_updates(self, offset: int, limit: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            if offset:
+                self._updates = [u for u in self._updates if u['update_id'] >= offset]
+            return self._updates[:limit]
+
+    # Call accounting
+
+    def total_calls(self) -> int:
+        with self._lock:
+            return sum(count for method, count in self.calls.items() if method != 'getUpdates')
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls.clear()
+            self.log.clear()
+
+    def _record(self, method: str, params: Dict[str, Any]):
+        with self._lock:
+            self.calls[method] += 1
+            if self.keep_log:
+                self.log.append({'method': method, 'params': params})
+
+    def _next_message(self, params: Dict[str, Any], **extra) -> Dict[str, Any]:
+        with self._lock:
+            self._message_id += 1
+            message_id = self._message_id
+        chat_id = int(params.get('chat_id') or 0)
+        message = {
+            'message_id': message_id,
+            'from': BOT_USER,
+            'chat': {'id': chat_id, 'type': 'private'},
+            'date': int(time.time()),
+        }
+        message.update(extra)
+        return message
+
+    # Bot API methods
+
+    def handle(self, method: str, params: Dict[str, Any]) -> Any:
+        if method == 'getUpdates':
+            offset = int(params.get('offset') or 0)
+            limit = int(params.get('limit') or 100)
+            return self._take_updates(offset, limit)
+
+        self._record(method, params)
+
+        if method == 'getMe':
+            return BOT_USER
+        if method == 'sendMessage':
+            return self._next_message(params, text=params.get('text', ''))
+        if method in ('sendPhoto', 'sendDocument'):
+            photo = [{'file_id': f'fake-photo-{self._message_id + 1}', 'file_unique_id': 'u', 'width': 1, 'height': 1}]
+            return self._next_message(params, photo=photo, caption=params.get('caption', ''))
+        if method == 'sendLocation':
+            location = {'latitude': float(params.get('latitude', 0)), 'longitude': float(params.get('longitude', 0))}
+            return self._next_message(params, location=location)
+        if method.startswith('editMessage'):
+            if params.get('inline_message_id'):
+                return True
+            message = self._next_message(params, text=params.get('text', ''))
+            message['message_id'] = int(params.get('message_id') or message['message_id'])
+            return message
+        if method == 'getFile':
+            file_id = params.get('file_id', '')
+            return {'file_id': file_id, 'file_unique_id': file_id, 'file_size': 0, 'file_path': f'photos/{file_id}.jpg'}
+        # answerCallbackQuery, deleteMessage and friends
+        return True
+
+    def _make_handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _params(self) -> Dict[str, Any]:
+                parsed = urlparse(self.path)
+                params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                content_type = self.headers.get('Content-Type', '')
+                if body and content_type.startswith('application/json'):
+                    params.update(json.loads(body))
+                elif body and content_type.startswith('application/x-www-form-urlencoded'):
+                    params.update({k: v[-1] for k, v in parse_qs(body.decode()).items()})
+                return params
+
+            def _respond(self):
+                parts = urlparse(self.path).path.strip('/').split('/')
+                if parts and parts[0] == 'file':
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'image/jpeg')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                method = parts[-1] if len(parts) >= 2 else ''
+                payload = json.dumps({'ok': True, 'result': api.handle(method, self._params())}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = _respond
+            do_POST = _respond
+
+        return Handler
@@ -0,0 +1,225 @@
+"""
+HTTP transport for DjangoAPIClient
+Pooled session, per-method timeouts, retries with jitter for idempotent calls,
+a circuit breaker and latency/error metrics
+"""
+import random
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, Iterable, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+RETRY_STATUSES = frozenset({502, 503, 504})
+
+# (connect, read) в секундах
+DEFAULT_TIMEOUTS: Dict[str, Tuple[float, float]] = {
+    'GET': (3.05, 10),
+    'POST': (3.05, 15),
+    'PUT': (3.05, 15),
+    'PATCH': (3.05, 15),
+    'DELETE': (3.05, 10),
+}
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Django считается недоступным — запрос даже не отправлялся"""
+
+
+class CircuitBreaker:
+    """
+    closed -> open после failure_threshold ошибок подряд;
+    через reset_timeout пропускает один пробный запрос (half-open):
+    успех закрывает цепь, ошибка снова открывает
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class TransportMetrics:
+    """Счётчики и последние задержки по каждому 'METHOD /endpoint/{id}/'"""
+
+    def __init__(self, window: int = 500):
+        self._lock = threading.Lock()
+        self._window = window
+        self.requests: Dict[str, int] = defaultdict(int)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.retries: Dict[str, int] = defaultdict(int)
+        self.rejected = 0
+        self._latencies: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=self._window))
+
+    def observe(self, key: str, seconds: float, failed: bool):
+        with self._lock:
+            self.requests[key] += 1
+            self._latencies[key].append(seconds)
+            if failed:
+                self.errors[key] += 1
+
+    def retried(self, key: str):
+        with self._lock:
+            self.retries[key] += 1
+
+    def circuit_rejected(self):
+        with self._lock:
+            self.rejected += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            endpoints = {}
+            for key, count in self.requests.items():
+                ordered = sorted(self._latencies[key])
+                endpoints[key] = {
+                    'requests': count,
+                    'errors': self.errors.get(key, 0),
+                    'retries': self.retries.get(key, 0),
+                    'p50_ms': round(_percentile(ordered, 0.50) * 1000, 1),
+                    'p95_ms': round(_percentile(ordered, 0.95) * 1000, 1),
+                    'max_ms': round((ordered[-1] if ordered else 0.0) * 1000, 1),
+                }
+            return {
+                'requests': sum(self.requests.values()),
+                'errors': sum(self.errors.values()),
+                'circuit_rejected': self.rejected,
+                'endpoints': endpoints,
+            }
+
+
+def _percentile(ordered, q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+_ID_RE = re.compile(r'/\d+(?=/|$)')
+
+
+def endpoint_label(method: str, endpoint: str) -> str:
+    path = '/' + endpoint.split('?', 1)[0].strip('/') + '/'
+    return f"{method} {_ID_RE.sub('/{id}', path)}"
+
+
+class ResilientTransport:
+    """Sends requests to one base URL through a shared connection pool"""
+
+    def __init__(
+        self,
+        base_url: str,
+        pool_size: int = 20,
+        timeouts: Optional[Dict[str, Tuple[float, float]]] = None,
+        retries: int = 2,
+        backoff_base: float = 0.2,
+        backoff_max: float = 2.0,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.base_url = base_url.rstrip('/')
+        self.timeouts = dict(DEFAULT_TIMEOUTS, **(timeouts or {}))
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.metrics = TransportMetrics()
+        self.session = self.build_session(pool_size)
+
+    def build_session(self, pool_size: int):
+        session = requests.Session()
+        # Повторы делаем сами, чтобы учитывать идемпотентность и circuit breaker
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True, max_retries=0)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter: случайная пауза от 0 до base * 2^attempt (не больше backoff_max)"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def request(
+        self,
+        method: str,
+        endpoint: str,
+        *,
+        idempotent: Optional[bool] = None,
+        retry_statuses: Iterable[int] = RETRY_STATUSES,
+        **kwargs,
+    ) -> requests.Response:
+        method = method.upper()
+        url = f"{self.base_url}/{endpoint.lstrip('/')}"
+        label = endpoint_label(method, endpoint)
+        if idempotent is None:
+            headers = kwargs.get('headers') or {}
+            idempotent = method in IDEMPOTENT_METHODS or 'Idempotency-Key' in headers
+        kwargs.setdefault('timeout', self.timeouts.get(method, DEFAULT_TIMEOUTS['GET']))
+        retry_statuses = frozenset(retry_statuses)
+        attempts = 1 + (self.retries if idempotent else 0)
+
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                self.metrics.circuit_rejected()
+                raise CircuitOpenError(f"Circuit open for {self.base_url}, not calling {url}")
+
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self.metrics.observe(label, time.perf_counter() - started, failed=True)
+                self.breaker.record_failure()
+                if attempt + 1 >= attempts:
+                    raise
+            else:
+                server_error = response.status_code >= 500
+                self.metrics.observe(label, time.perf_counter() - started, failed=server_error)
+                if server_error:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                if response.status_code not in retry_statuses or attempt + 1 >= attempts:
+                    return response
+                response.close()
+
+            self.metrics.retried(label)
+            time.sleep(self.backoff(attempt))
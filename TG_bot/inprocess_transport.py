@@ -0,0 +1,178 @@
+"""
+In-process transport for DjangoAPIClient
+Instead of HTTP calls site_app.services (or the API views) inside the bot process.
+Responses are rendered by DRF exactly as over HTTP, so api_client code does not change.
+Django must already be configured (import django_setup first).
+"""
+import logging
+import re
+from http import HTTPStatus
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from django.test import RequestFactory
+from django.urls import Resolver404, resolve
+from rest_framework.settings import api_settings
+from rest_framework.views import exception_handler
+
+from site_app import services
+from site_app.idempotency import HEADER as IDEMPOTENCY_HEADER
+
+from http_transport import ResilientTransport
+
+logger = logging.getLogger(__name__)
+
+# Ответ сервиса: (статус, тело, дополнительные заголовки)
+ServiceResult = Tuple[int, Any, Dict[str, str]]
+
+
+def _checkout(body: dict, headers: CaseInsensitiveDict) -> ServiceResult:
+    result = services.place_order(body, idempotency_key=headers.get(IDEMPOTENCY_HEADER, ''))
+    return result.status_code, result.data, {'Idempotent-Replayed': 'true'} if result.replayed else {}
+
+
+def _payment_proof(body: dict, headers: CaseInsensitiveDict) -> ServiceResult:
+    return 200, services.submit_payment_proof(body), {}
+
+
+def _remind(body: dict, headers: CaseInsensitiveDict) -> ServiceResult:
+    return 200, services.remind_order(body.get('order_id'), body.get('telegram_user_id')), {}
+
+
+def _approve(body: dict, headers: CaseInsensitiveDict, payment_id: str) -> ServiceResult:
+    return 200, services.approve_payment_by_telegram(int(payment_id), body.get('telegram_admin_id')), {}
+
+
+def _reject(body: dict, headers: CaseInsensitiveDict, payment_id: str) -> ServiceResult:
+    payload = services.reject_payment_by_telegram(int(payment_id), body.get('telegram_admin_id'), body.get('reason', ''))
+    return 200, payload, {}
+
+
+# Горячие вызовы бота идут прямо в сервисы; остальное — через resolve() и настоящие views
+SERVICE_ROUTES: List[Tuple[str, re.Pattern, Callable[..., ServiceResult]]] = [
+    ('POST', re.compile(r'^checkout$'), _checkout),
+    ('POST', re.compile(r'^telegram/payment/proof$'), _payment_proof),
+    ('POST', re.compile(r'^telegram/order/remind$'), _remind),
+    ('POST', re.compile(r'^telegram/payment/(\d+)/approve$'), _approve),
+    ('POST', re.compile(r'^telegram/payment/(\d+)/reject$'), _reject),
+]
+
+
+class InProcessSession:
+    """Same request() signature as requests.Session, but nothing leaves the process"""
+
+    def __init__(self, base_url: str):
+        self.factory = RequestFactory()
+        self.renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+        self.configure(base_url)
+
+    def configure(self, base_url: str):
+        # Хост нужен views, которые строят абсолютные URL (картинки товаров)
+        parsed = urlsplit(base_url)
+        self.host = parsed.netloc or 'localhost'
+        self.secure = parsed.scheme == 'https'
+        self.prefix = parsed.path.rstrip('/')
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        json: Any = None,
+        headers: Optional[Dict[str, str]] = None,
+        **kwargs,
+    ) -> requests.Response:
+        method = method.upper()
+        headers = CaseInsensitiveDict(headers or {})
+        parsed = urlsplit(url)
+        endpoint = parsed.path[len(self.prefix):] if parsed.path.startswith(self.prefix) else parsed.path
+
+        handler, args = self._match(method, endpoint)
+        if handler is not None and not params and not parsed.query:
+            return self._call_service(url, handler, args, json or {}, headers)
+        return self._call_view(method, url, parsed.path, parsed.query, params, json, headers)
+
+    def _match(self, method: str, endpoint: str):
+        path = endpoint.strip('/')
+        for route_method, pattern, handler in SERVICE_ROUTES:
+            match = pattern.match(path)
+            if route_method == method and match:
+                return handler, match.groups()
+        return None, ()
+
+    def _call_service(self, url, handler, args, body, headers) -> requests.Response:
+        try:
+            status_code, data, extra_headers = handler(body, headers, *args)
+        except Exception as exc:
+            # Те же ответы на ошибки, что отдаёт APIView.handle_exception
+            response = exception_handler(exc, {})
+            if response is None:
+                logger.exception("In-process call to %s failed", url)
+                return self._build_response(url, 500, b'<h1>Server Error (500)</h1>', {'Content-Type': 'text/html'})
+            status_code, data, extra_headers = response.status_code, response.data, {}
+        content = self.renderer.render(data)
+        response_headers = {'Content-Type': self.renderer.media_type}
+        response_headers.update(extra_headers)
+        return self._build_response(url, status_code, content, response_headers)
+
+    def _call_view(self, method, url, path, query, params, json, headers) -> requests.Response:
+        query_string = '&'.join(part for part in (query, urlencode(params or {}, doseq=True)) if part)
+        request = self.factory.generic(
+            method,
+            f"{path}?{query_string}" if query_string else path,
+            data=self.renderer.render(json) if json is not None else b'',
+            content_type='application/json',
+            secure=self.secure,
+            headers=dict(headers),
+            HTTP_HOST=self.host,
+        )
+        try:
+            match = resolve(path)
+        except Resolver404:
+            return self._build_response(url, 404, b'', {'Content-Type': 'text/html'})
+
+        try:
+            response = match.func(request, *match.args, **match.kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+        except Exception:
+            logger.exception("In-process call to %s failed", url)
+            return self._build_response(url, 500, b'<h1>Server Error (500)</h1>', {'Content-Type': 'text/html'})
+        return self._build_response(url, response.status_code, response.content, dict(response.items()))
+
+    @staticmethod
+    def _build_response(url: str, status_code: int, content: bytes, headers: Dict[str, str]) -> requests.Response:
+        response = requests.Response()
+        response.status_code = status_code
+        response._content = content
+        response.headers = CaseInsensitiveDict(headers)
+        response.url = url
+        response.encoding = 'utf-8'
+        try:
+            response.reason = HTTPStatus(status_code).phrase
+        except ValueError:
+            response.reason = ''
+        return response
+
+    def close(self):
+        pass
+
+
+class InProcessTransport(ResilientTransport):
+    """ResilientTransport whose session calls Django directly: metrics, breaker and retries stay the same"""
+
+    def build_session(self, pool_size: int):
+        return InProcessSession(self.base_url)
+
+    @property
+    def base_url(self) -> str:
+        return self._base_url
+
+    @base_url.setter
+    def base_url(self, value: str):
+        self._base_url = value.rstrip('/')
+        if isinstance(getattr(self, 'session', None), InProcessSession):
+            self.session.configure(self._base_url)
@@ -70,11 +70,21 @@ LANG = {
         'payment_approved': '🎉 Ваш заказ №{order_id} подтвержден! Спасибо за оплату.',
         'payment_rejected': '❌ К сожалению, ваш чек к заказу №{order_id} был отклонен. Пожалуйста, пришлите корректный чек или свяжитесь с поддержкой.',
         'payment_deadline_expired': '⏰ Срок оплаты истёк. Если вы уже оплатили, свяжитесь с поддержкой.',
+        'payment_order_paid': '✅ Этот заказ уже оплачен — чек больше не нужен.',
+        'payment_order_canceled': '❌ Этот заказ отменён. Если вы уже оплатили, свяжитесь с поддержкой.',
         'payment_under_review': 'Статус: на проверке.',
         'payment_paid': '🎉 Оплата подтверждена! Заказ №{order_id} перешёл в обработку.',
         'payment_rejected': '❌ Чек отклонён: {reason}. Пожалуйста, пришлите корректный чек или свяжитесь с поддержкой.',
         'payment_canceled': 'Заказ отменён. Если это ошибка, оформите новый заказ.',
         'payment_error': 'Не удалось обработать запрос. Попробуйте позже или свяжитесь с поддержкой.',
+        'payment_already_processed': '⚠️ Этот платёж уже обработал другой администратор.',
+        'admin_review_queue': '🧾 Чеки на проверке',
+        'admin_review_empty': 'Чеков на проверке нет.',
+        'admin_review_header': '🧾 Чеки на проверке: {count}. Отметьте платежи и нажмите «Подтвердить выбранные».',
+        'admin_select_all': '☑️ Выбрать все',
+        'admin_approve_selected': '✅ Подтвердить выбранные ({count})',
+        'admin_nothing_selected': 'Ничего не выбрано.',
+        'admin_bulk_done': 'Подтверждено: {approved}. Пропущено: {skipped}.',
         'status_pending_payment_link': 'Ожидает оплаты',
         'status_awaiting_proof': 'Ждём чек',
         'status_under_review': 'На проверке',
@@ -88,6 +98,9 @@ LANG = {
 
         'order_confirmed': 'Ваш заказ на сумму {sum} сум успешно оформлен!\nВремя доставки: {time}.\nСпасибо за заказ ❤️',
         'orders_none': 'Вы ещё не делали заказов.',
+        'orders_more': '⬇️ Показать ещё',
+        'orders_open_title': '⏳ <b>Ждут оплаты</b>',
+        'order_open_line': '№{order_id} — {status}, до {deadline}',
 
         'settings': 'Настройки',
         'settings_language': '🌐 Изменить язык',
@@ -206,11 +219,21 @@ LANG = {
         'payment_approved': '🎉 Sizning №{order_id} buyurtmangiz tasdiqlandi! To\'lov uchun rahmat.',
         'payment_rejected': '❌ Afsuski, №{order_id} buyurtmangiz uchun chek rad etildi. Iltimos, to\'g\'ri chek yuboring yoki qo\'llab-quvvatlashga murojaat qiling.',
         'payment_deadline_expired': '⏰ To‘lov muddati tugagan. Agar allaqachon to‘lagan bo‘lsangiz, qo‘llab-quvvatlashga murojaat qiling.',
+        'payment_order_paid': '✅ Bu buyurtma allaqachon to‘langan — chek endi kerak emas.',
+        'payment_order_canceled': '❌ Bu buyurtma bekor qilingan. Agar allaqachon to‘lagan bo‘lsangiz, qo‘llab-quvvatlashga murojaat qiling.',
         'payment_under_review': 'Holat: tekshiruvda.',
         'payment_paid': '🎉 To‘lov tasdiqlandi! №{order_id} buyurtma qayta ishlanmoqda.',
         'payment_rejected': '❌ Chek rad etildi: {reason}. Iltimos, to‘g‘ri chek yuboring yoki qo‘llab-quvvatlashga murojaat qiling.',
         'payment_canceled': 'Buyurtma bekor qilindi. Agar bu xato bo‘lsa, yangi buyurtma yarating.',
         'payment_error': 'So‘rovni bajarib bo‘lmadi. Keyinroq urinib ko‘ring yoki qo‘llab-quvvatlashga yozing.',
+        'payment_already_processed': '⚠️ Bu to‘lovni boshqa administrator allaqachon ko‘rib chiqqan.',
+        'admin_review_queue': '🧾 Tekshiruvdagi cheklar',
+        'admin_review_empty': 'Tekshiruvda chek yo‘q.',
+        'admin_review_header': '🧾 Tekshiruvdagi cheklar: {count}. To‘lovlarni belgilang va «Tanlanganlarni tasdiqlash» tugmasini bosing.',
+        'admin_select_all': '☑️ Hammasini tanlash',
+        'admin_approve_selected': '✅ Tanlanganlarni tasdiqlash ({count})',
+        'admin_nothing_selected': 'Hech narsa tanlanmagan.',
+        'admin_bulk_done': 'Tasdiqlandi: {approved}. O‘tkazib yuborildi: {skipped}.',
         'status_pending_payment_link': 'To‘lov havolasi kutilmoqda',
         'status_awaiting_proof': 'Chek kutilmoqda',
         'status_under_review': 'Tekshiruvda',
@@ -224,6 +247,9 @@ LANG = {
 
         'order_confirmed': 'Sizning {sum} so‘mga teng buyurtmangiz rasmiylashtirildi!\nYetkazib berish vaqti: {time}.\nBuyurtma uchun rahmat ❤️',
         'orders_none': 'Siz hali buyurtma qilmagansiz.',
+        'orders_more': '⬇️ Yana ko‘rsatish',
+        'orders_open_title': '⏳ <b>To‘lov kutilmoqda</b>',
+        'order_open_line': '№{order_id} — {status}, muddati: {deadline}',
 
         'settings': 'Sozlamalar',
         'settings_language': '🌐 Tilni o‘zgartirish',
@@ -441,6 +467,13 @@ def ikb_payment_actions(tr: Dict[str, str], payment_link: str, order_id: int) ->
     return kb
 
 
+def ikb_orders_more(tr: Dict[str, str], cursor: str) -> types.InlineKeyboardMarkup:
+    """Следующая страница истории заказов"""
+    kb = types.InlineKeyboardMarkup()
+    kb.add(types.InlineKeyboardButton(tr['orders_more'], callback_data=f'orders_more:{cursor}'))
+    return kb
+
+
 def ikb_admin_view_proof(tr: Dict[str, str], order_id: int) -> types.InlineKeyboardMarkup:
     """Клавиатура для админа: кнопка просмотра чека"""
     kb = types.InlineKeyboardMarkup()
@@ -458,6 +491,22 @@ def ikb_admin_proof_actions(tr: Dict[str, str], order_id: int, payment_id: int)
     return kb
 
 
+def ikb_admin_review_queue(tr: Dict[str, str], payments: List[Dict], selected: List[int]) -> types.InlineKeyboardMarkup:
+    """Очередь чеков на проверке: отметки по платежам и «подтвердить выбранные» одним запросом"""
+    kb = types.InlineKeyboardMarkup()
+    for payment in payments:
+        mark = '☑️' if payment['payment_id'] in selected else '⬜️'
+        kb.add(types.InlineKeyboardButton(
+            f"{mark} №{payment['order_id']} • {payment['amount']} • {payment['customer']}",
+            callback_data=f"bulk_toggle:{payment['payment_id']}",
+        ))
+    kb.add(
+        types.InlineKeyboardButton(tr['admin_select_all'], callback_data='bulk_all'),
+        types.InlineKeyboardButton(tr['admin_approve_selected'].format(count=len(selected)), callback_data='bulk_approve'),
+    )
+    return kb
+
+
 def kb_settings(tr: Dict[str, str]) -> types.ReplyKeyboardMarkup:
     kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
     kb.add(types.KeyboardButton(tr['settings_language']))
@@ -473,5 +522,6 @@ def kb_admin(tr: Dict[str, str]) -> types.ReplyKeyboardMarkup:
     kb.add(types.KeyboardButton(tr['admin_edit']))
     kb.add(types.KeyboardButton(tr['admin_delete']))
     kb.add(types.KeyboardButton(tr['admin_list']))
+    kb.add(types.KeyboardButton(tr['admin_review_queue']))
     kb.add(types.KeyboardButton(tr['back']))
     return kb
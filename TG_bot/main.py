@@ -12,6 +12,7 @@
 import os
 import re
 import json
+import uuid
 from datetime import datetime, timezone, timedelta
 from typing import Dict, Any, Optional, List, Tuple
 
@@ -64,6 +65,7 @@ def clear_state(user_id: int):
     if user_id in STATE:
         pending_raw = STATE[user_id]['data'].get('pending_orders') if 'data' in STATE[user_id] else {}
         submitted_raw = STATE[user_id]['data'].get('submitted_proof_ids') if 'data' in STATE[user_id] else []
+        checkout_key = STATE[user_id]['data'].get('checkout_key') if 'data' in STATE[user_id] else None
         pending = dict(pending_raw) if pending_raw else {}
         submitted = list(submitted_raw) if submitted_raw else []
         STATE[user_id] = {'step': None, 'data': {}}
@@ -71,6 +73,51 @@ def clear_state(user_id: int):
             STATE[user_id]['data']['pending_orders'] = pending
         if submitted:
             STATE[user_id]['data']['submitted_proof_ids'] = submitted
+        if checkout_key:
+            # Ключ переживает сбой связи при оформлении: повторное нажатие не создаст второй заказ
+            STATE[user_id]['data']['checkout_key'] = checkout_key
+
+
+def checkout_idempotency_key(user_id: int, payload_items: List[Dict[str, Any]]) -> str:
+    """Один ключ на одну корзину: пока заказ не оформлен, повторы получают тот же заказ"""
+    data = get_state(user_id)['data']
+    saved = data.get('checkout_key')
+    if saved and saved['items'] == payload_items:
+        return saved['key']
+    key = uuid.uuid4().hex
+    data['checkout_key'] = {'items': payload_items, 'key': key}
+    return key
+
+
+def forget_checkout_key(user_id: int, key: str):
+    data = get_state(user_id)['data']
+    if (data.get('checkout_key') or {}).get('key') == key:
+        del data['checkout_key']
+
+
+def _checkout_retryable(error: Exception) -> bool:
+    """Сервер мог создать заказ (или ещё создаёт) — повтор должен идти с тем же ключом"""
+    if isinstance(error, requests.HTTPError):
+        return error.response is not None and error.response.status_code in api_client.CHECKOUT_RETRY_STATUSES
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+def place_checkout(user_id: int, payload_items: List[Dict[str, Any]], **fields) -> Dict[str, Any]:
+    """
+    api_client.create_checkout с ключом корзины. Ключ хранится только пока ответ сервера неизвестен:
+    после созданного заказа или окончательного отказа такая же корзина оформляется новым заказом
+    """
+    key = checkout_idempotency_key(user_id, payload_items)
+    try:
+        response = api_client.create_checkout(
+            telegram_user_id=user_id, cart_items=payload_items, idempotency_key=key, **fields,
+        )
+    except Exception as error:
+        if not _checkout_retryable(error):
+            forget_checkout_key(user_id, key)
+        raise
+    forget_checkout_key(user_id, key)
+    return response
 
 
 # Message formatting
@@ -96,11 +143,13 @@ def format_cart(user_id: int) -> str:
     return '\n'.join(lines)
 
 
-def format_orders(user_id: int) -> str:
+def format_orders(user_id: int, cursor: Optional[str] = None) -> Tuple[str, Optional[str]]:
+    """Страница истории заказов и курсор следующей страницы"""
     tr = get_tr(user_id)
-    orders = db.list_orders(user_id, limit=5)
+    page = db.order_history_page(user_id, cursor=cursor, limit=5)
+    orders = page['orders']
     if not orders:
-        return tr['orders_none']
+        return tr['orders_none'], None
     lines = []
     for order in orders:
         status_key = f"status_{order.get('status', '')}"
@@ -116,7 +165,57 @@ def format_orders(user_id: int) -> str:
             for it in order['items']:
                 lines.append(f"• {it['name']} x{it['qty']}")
         lines.append('')
-    return '\n'.join(lines).strip()
+    return '\n'.join(lines).strip(), page['next_cursor']
+
+
+def is_already_processed(exc: Exception) -> bool:
+    """API ответил, что платёж уже подтверждён/отклонён (другой админ успел раньше)"""
+    response = getattr(exc, 'response', None)
+    if response is None or response.status_code not in (400, 409):
+        return False
+    try:
+        detail = response.json().get('detail', '')
+    except ValueError:
+        return False
+    return 'already' in str(detail)
+
+
+def format_open_orders(user_id: int) -> str:
+    """Неоплаченные заказы из pending_orders со сроками — один запрос на все; истёкшие забываем"""
+    pending = get_state(user_id)['data'].get('pending_orders', {})
+    if not pending:
+        return ''
+    try:
+        deadlines = {item['order_id']: item for item in api_client.get_order_deadlines(list(pending), user_id)}
+    except requests.RequestException:
+        return ''
+    tr = get_tr(user_id)
+    lines = []
+    for order_id in list(pending):
+        item = deadlines.get(order_id)
+        if not item or item.get('is_expired'):
+            pending.pop(order_id, None)
+            continue
+        update_pending_order(user_id, order_id, deadline=item.get('payment_deadline_at'), status=item.get('status'))
+        lines.append(tr['order_open_line'].format(
+            order_id=order_id,
+            status=tr.get(f"status_{item.get('status', '')}", item.get('status', '')),
+            deadline=format_deadline(item.get('payment_deadline_at')),
+        ))
+    if not lines:
+        return ''
+    return '\n'.join([tr['orders_open_title'], *lines])
+
+
+def send_orders(user_id: int, cursor: Optional[str] = None):
+    tr = get_tr(user_id)
+    text, next_cursor = format_orders(user_id, cursor)
+    if not cursor:
+        open_orders = format_open_orders(user_id)
+        if open_orders:
+            text = f"{open_orders}\n\n{text}"
+    markup = kb.ikb_orders_more(tr, next_cursor) if next_cursor else (None if cursor else kb.kb_main(tr))
+    bot.send_message(user_id, text, reply_markup=markup)
 
 
 def format_order_for_admin(admin_id: int, order_id: int) -> Optional[Dict]:
@@ -344,9 +443,19 @@ def process_payment_proof(user_id: int, message: types.Message, file_id: Optiona
             message_id=str(message.message_id),
         )
     except (requests.HTTPError, requests.RequestException) as exc:
-        status_code = getattr(getattr(exc, 'response', None), 'status_code', None)
+        response = getattr(exc, 'response', None)
+        status_code = getattr(response, 'status_code', None)
         if status_code == 400:
-            bot.send_message(user_id, tr['payment_deadline_expired'])
+            try:
+                detail = str(response.json().get('detail', ''))
+            except (ValueError, AttributeError):
+                detail = ''
+            if detail == 'Order already paid.':
+                bot.send_message(user_id, tr['payment_order_paid'])
+            elif detail == 'Order already canceled.':
+                bot.send_message(user_id, tr['payment_order_canceled'])
+            else:
+                bot.send_message(user_id, tr['payment_deadline_expired'])
         else:
             bot.send_message(user_id, tr['payment_error'])
         return
@@ -448,6 +557,27 @@ def cmd_become_admin(message: types.Message):
         bot.send_message(user_id, t(user_id, 'admin_login_failed'))
 
 
+@bot.message_handler(commands=['api_stats'])
+def cmd_api_stats(message: types.Message):
+    """Задержки и ошибки запросов бота к Django API (только для админов)"""
+    user_id = message.from_user.id
+    if not db.is_admin(user_id):
+        return
+    stats = api_client.metrics()
+    lines = [
+        f"🔌 Django API: circuit <b>{stats['circuit']}</b>",
+        f"Запросов: {stats['requests']}, ошибок: {stats['errors']}, отклонено circuit breaker: {stats['circuit_rejected']}",
+        "",
+    ]
+    endpoints = sorted(stats['endpoints'].items(), key=lambda item: item[1]['requests'], reverse=True)
+    for label, row in endpoints[:15]:
+        lines.append(
+            f"<code>{label}</code>: {row['requests']} req, {row['errors']} err, {row['retries']} retry, "
+            f"p50 {row['p50_ms']} ms, p95 {row['p95_ms']} ms"
+        )
+    bot.send_message(user_id, "\n".join(lines))
+
+
 @bot.message_handler(content_types=['contact'])
 def on_contact(message: types.Message):
     user_id = message.from_user.id
@@ -486,9 +616,9 @@ def on_contact(message: types.Message):
             payload_items.append({'product_id': product['id'], 'quantity': qty})
 
         try:
-            checkout_resp = api_client.create_checkout(
-                telegram_user_id=user_id,
-                cart_items=payload_items,
+            checkout_resp = place_checkout(
+                user_id,
+                payload_items,
                 comment=state_data.get('comment', ''),
                 address=addr,
                 latitude=state_data.get('lat'),
@@ -679,17 +809,8 @@ def on_web_app_data(message: types.Message):
         cart_data = data
         print(f"Received cart data from web app for user {user_id}: {cart_data}")
         
-        # Очищаем текущую корзину
-        db.clear_cart(user_id)
-        
-        # Добавляем товары из веб-аппа в корзину бота
-        items_added = 0
-        for item in cart_data.get('items', []):
-            product_id = item.get('product_id')
-            quantity = item.get('quantity', 1)
-            if product_id and quantity > 0:
-                db.add_cart_item(user_id, product_id, quantity)
-                items_added += 1
+        # Заменяем корзину бота содержимым веб-аппа целиком
+        items_added = db.replace_cart(user_id, cart_data.get('items', []))
         
         if items_added == 0:
             bot.send_message(user_id, tr.get('error', 'Не удалось добавить товары в корзину.'))
@@ -811,6 +932,14 @@ def on_callback(call: types.CallbackQuery):
             bot.answer_callback_query(call.id, 'Error')
         return
 
+    if data.startswith('orders_more:'):
+        bot.answer_callback_query(call.id)
+        try:
+            send_orders(user_id, data.split(':', 1)[1])
+        except Exception:
+            bot.send_message(user_id, tr.get('error', 'Произошла ошибка. Попробуйте позже.'))
+        return
+
     if data.startswith('send_proof:'):
         try:
             order_id = int(data.split(':', 1)[1])
@@ -870,9 +999,9 @@ def on_callback(call: types.CallbackQuery):
         # Если нет в state, пытаемся получить из API
         if not proof_data:
             try:
-                proof_info = api_client.get_payment_proof(order_id)
+                proof_info = api_client.get_payment_proof(order_id, user_id)
                 if proof_info:
-                    file_id = proof_info.get('file_id')
+                    file_id = proof_info.get('file_id') or proof_info.get('image_url')
                     payment_id = proof_info.get('payment_id')
                     if file_id and payment_id:
                         # Сохраняем в state для будущего использования
@@ -910,6 +1039,67 @@ def on_callback(call: types.CallbackQuery):
         return
 
     # Обработка подтверждения оплаты админом
+    # Очередь чеков: отметки и «подтвердить выбранные» одним запросом к API
+    if data.startswith('bulk_toggle:') or data in ('bulk_all', 'bulk_approve'):
+        if not db.is_admin(user_id):
+            bot.answer_callback_query(call.id, tr.get('not_admin', 'У вас нет прав администратора.'), show_alert=True)
+            return
+        admin_state = get_state(user_id)
+        queue = admin_state['data'].get('review_queue', [])
+        selected = admin_state['data'].setdefault('review_selected', [])
+
+        if data != 'bulk_approve':
+            if data == 'bulk_all':
+                selected[:] = [payment['payment_id'] for payment in queue]
+            else:
+                try:
+                    payment_id = int(data.split(':')[1])
+                except (ValueError, IndexError):
+                    bot.answer_callback_query(call.id)
+                    return
+                if payment_id in selected:
+                    selected.remove(payment_id)
+                else:
+                    selected.append(payment_id)
+            try:
+                bot.edit_message_reply_markup(
+                    chat_id=user_id,
+                    message_id=call.message.message_id,
+                    reply_markup=kb.ikb_admin_review_queue(tr, queue, selected),
+                )
+            except Exception:
+                pass
+            bot.answer_callback_query(call.id)
+            return
+
+        if not selected:
+            bot.answer_callback_query(call.id, tr['admin_nothing_selected'], show_alert=True)
+            return
+        try:
+            # Клиентов уведомляет сервер (одной фоновой задачей после commit)
+            result = api_client.moderate_payments_telegram(
+                [{'payment_id': payment_id, 'action': 'approve'} for payment_id in selected], user_id,
+            )
+        except (requests.HTTPError, requests.RequestException) as e:
+            print(f"Error approving payments in bulk: {e}")
+            message_key = 'payment_already_processed' if is_already_processed(e) else 'payment_error'
+            bot.answer_callback_query(call.id, tr[message_key], show_alert=True)
+            return
+
+        bot.answer_callback_query(call.id, "✅")
+        lines = [tr['admin_bulk_done'].format(approved=result['approved'], skipped=result['skipped'])]
+        for item in result['results']:
+            if item['result'] != 'approved':
+                lines.append(f"⚠️ #{item['payment_id']}: {item['detail']}")
+        done = {item['payment_id'] for item in result['results']}
+        admin_state['data']['review_queue'] = [payment for payment in queue if payment['payment_id'] not in done]
+        selected.clear()
+        try:
+            bot.edit_message_text('\n'.join(lines), chat_id=user_id, message_id=call.message.message_id)
+        except Exception:
+            bot.send_message(user_id, '\n'.join(lines))
+        return
+
     if data.startswith('approve_payment:'):
         if not db.is_admin(user_id):
             bot.answer_callback_query(call.id, tr.get('not_admin', 'У вас нет прав администратора.'), show_alert=True)
@@ -972,7 +1162,8 @@ def on_callback(call: types.CallbackQuery):
                 
         except (requests.HTTPError, requests.RequestException) as e:
             print(f"Error approving payment: {e}")
-            bot.answer_callback_query(call.id, tr['payment_error'], show_alert=True)
+            message_key = 'payment_already_processed' if is_already_processed(e) else 'payment_error'
+            bot.answer_callback_query(call.id, tr[message_key], show_alert=True)
         except Exception as e:
             print(f"Unexpected error approving payment: {e}")
             import traceback
@@ -1058,6 +1249,9 @@ def on_callback(call: types.CallbackQuery):
             
         except Exception as e:
             print(f"Error approving order: {e}")
+            if is_already_processed(e):
+                bot.answer_callback_query(call.id, tr['payment_already_processed'], show_alert=True)
+                return
             import traceback
             traceback.print_exc()
             bot.answer_callback_query(call.id, tr['payment_error'], show_alert=True)
@@ -1169,9 +1363,9 @@ def on_callback(call: types.CallbackQuery):
             payload_items.append({'product_id': product['id'], 'quantity': qty})
 
         try:
-            checkout_resp = api_client.create_checkout(
-                telegram_user_id=user_id,
-                cart_items=payload_items,
+            checkout_resp = place_checkout(
+                user_id,
+                payload_items,
                 comment=state_data.get('comment', ''),
                 address=addr,
                 latitude=state_data.get('lat'),
@@ -1293,9 +1487,9 @@ def on_text(message: types.Message):
             payload_items.append({'product_id': product['id'], 'quantity': qty})
 
         try:
-            checkout_resp = api_client.create_checkout(
-                telegram_user_id=user_id,
-                cart_items=payload_items,
+            checkout_resp = place_checkout(
+                user_id,
+                payload_items,
                 comment=state_data.get('comment', ''),
                 address=addr,
                 latitude=state_data.get('lat'),
@@ -1428,7 +1622,7 @@ def on_text(message: types.Message):
             bot.send_message(user_id, tr['ask_address'], reply_markup=kb.kb_location_request(tr))
             return
         if text == tr['menu_orders']:
-            bot.send_message(user_id, format_orders(user_id), reply_markup=kb.kb_main(tr))
+            send_orders(user_id)
             return
         if text == tr['menu_settings']:
             bot.send_message(user_id, tr['settings'], reply_markup=kb.kb_settings(tr))
@@ -1456,8 +1650,7 @@ def on_text(message: types.Message):
         if text == tr['catalog_cart']:
             set_state(user_id, 'cart')
             # Сохраняем клавиатуру категорий
-            categories = api_client.get_categories()
-            parent_cats = [cat for cat in categories if not cat.get('parent')]
+            parent_cats = root_categories(user_id)
             tr_with_lang = {**tr, '_lang': db.get_lang(user_id)}
             categories_kb = kb.kb_categories(tr_with_lang, parent_cats)
             show_cart(user_id, preserve_reply_markup=categories_kb)
@@ -1474,8 +1667,7 @@ def on_text(message: types.Message):
         
         # Проверяем, является ли текст названием категории
         try:
-            categories = api_client.get_categories()
-            parent_cats = [cat for cat in categories if not cat.get('parent')]
+            parent_cats = root_categories(user_id)
             
             selected_category = None
             for cat in parent_cats:
@@ -1571,9 +1763,9 @@ def on_text(message: types.Message):
                 payload_items.append({'product_id': product['id'], 'quantity': qty})
 
             try:
-                checkout_resp = api_client.create_checkout(
-                    telegram_user_id=user_id,
-                    cart_items=payload_items,
+                checkout_resp = place_checkout(
+                    user_id,
+                    payload_items,
                     comment=state_data.get('comment', ''),
                     address=addr,
                     latitude=state_data.get('lat'),
@@ -1693,9 +1885,10 @@ def on_text(message: types.Message):
             
         except Exception as e:
             print(f"Error rejecting order: {e}")
-            import traceback
-            traceback.print_exc()
-            bot.send_message(user_id, tr['payment_error'])
+            if not is_already_processed(e):
+                import traceback
+                traceback.print_exc()
+            bot.send_message(user_id, tr['payment_already_processed' if is_already_processed(e) else 'payment_error'])
             clear_state(user_id)
         return
 
@@ -1745,7 +1938,7 @@ def on_text(message: types.Message):
             clear_state(user_id)
         except (requests.HTTPError, requests.RequestException) as e:
             print(f"Error rejecting payment: {e}")
-            bot.send_message(user_id, tr['payment_error'])
+            bot.send_message(user_id, tr['payment_already_processed' if is_already_processed(e) else 'payment_error'])
             clear_state(user_id)
         except Exception as e:
             print(f"Unexpected error rejecting payment: {e}")
@@ -1790,6 +1983,19 @@ def on_text(message: types.Message):
                     bot.send_message(user_id, '\n'.join(lines))
                 bot.send_message(user_id, t(user_id, 'admin_menu'), reply_markup=kb.kb_admin(tr))
                 return
+            if text == tr['admin_review_queue']:
+                queue = db.list_payments_under_review()
+                if not queue:
+                    bot.send_message(user_id, tr['admin_review_empty'])
+                    return
+                st['data']['review_queue'] = queue
+                st['data']['review_selected'] = []
+                bot.send_message(
+                    user_id,
+                    tr['admin_review_header'].format(count=len(queue)),
+                    reply_markup=kb.ikb_admin_review_queue(tr, queue, []),
+                )
+                return
             if text == tr['back']:
                 bot.send_message(user_id, t(user_id, 'select_from_menu'), reply_markup=kb.kb_main(tr))
                 clear_state(user_id)
@@ -1924,6 +2130,7 @@ def on_text(message: types.Message):
             elif field == 'photo_file_id':
                 bot.send_message(user_id, t(user_id, 'send_photo'))
                 return
+            api_client.invalidate_products([pid])
             bot.send_message(user_id, t(user_id, 'saved'), reply_markup=kb.kb_admin(tr))
             set_state(user_id, 'admin_menu')
             return
@@ -1947,6 +2154,7 @@ def on_text(message: types.Message):
             else:
                 if text.lower() == t(user_id, 'yes'):
                     db.delete_product(d['delete_id'])
+                    api_client.invalidate_products([d['delete_id']])
                     bot.send_message(user_id, t(user_id, 'deleted'), reply_markup=kb.kb_admin(tr))
                     set_state(user_id, 'admin_menu', {'delete_id': None})
                     return
@@ -1984,6 +2192,7 @@ def on_photo(message: types.Message):
     if st['step'] == 'admin_edit_new_value' and st['data'].get('edit_field') == 'photo_file_id':
         pid = st['data'].get('edit_product_id')
         db.update_product_field(pid, 'photo_file_id', file_id)
+        api_client.invalidate_products([pid])
         bot.send_message(user_id, t(user_id, 'saved'), reply_markup=kb.kb_admin(tr))
         set_state(user_id, 'admin_menu')
         return
@@ -2005,27 +2214,18 @@ def on_document(message: types.Message):
 
 # Product catalog UI helpers
 
+def root_categories(user_id: int) -> List[Dict[str, Any]]:
+    """Корневые категории из /bootstrap/; ответ перепроверяется по ETag, повторный показ почти бесплатен"""
+    return api_client.get_bootstrap(db.get_lang(user_id) or 'ru').get('categories', [])
+
+
 def show_categories(user_id: int):
     """Показать категории с веб-апп кнопкой"""
     tr = get_tr(user_id)
     lang = db.get_lang(user_id)
     
     try:
-        categories = api_client.get_categories()
-        
-        # Обрабатываем разные форматы ответа от API
-        if not categories:
-            bot.send_message(user_id, tr.get('no_categories', 'Категории не найдены. Попробуйте позже.'))
-            return
-        
-        # Если categories - это список, берем только родительские категории
-        if isinstance(categories, list):
-            parent_cats = [cat for cat in categories if not cat.get('parent')]
-        elif isinstance(categories, dict):
-            # Если это результат API с results
-            parent_cats = [cat for cat in categories.get('results', []) if not cat.get('parent')]
-        else:
-            parent_cats = []
+        parent_cats = root_categories(user_id)
         
         if not parent_cats:
             error_msg = tr.get('no_categories', 'Категории не найдены. Попробуйте позже.')
@@ -2136,8 +2336,9 @@ def send_product_detail(user_id: int, product: Dict[str, Any], quantity: int = 1
     # Получаем базовый URL для медиа файлов
     base_url = os.getenv('DJANGO_BASE_URL', os.getenv('DJANGO_API_URL', 'http://localhost:8000').replace('/api', ''))
     
-    # Пробуем разные варианты полей для изображения
+    # Пробуем разные варианты полей для изображения; копия full в JPEG меньше оригинала
     image_ref = (
+        ((merged.get('image_variants') or {}).get('full') or {}).get('jpeg') or
         merged.get('image') or 
         merged.get('photo_url') or 
         merged.get('image_url') or
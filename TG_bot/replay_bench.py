@@ -0,0 +1,423 @@
+"""
+Replay benchmark for the Telegram bot handlers
+Feeds recorded or synthetic update streams through the real handlers in main.py
+against a local fake Bot API (fake_bot_api.py) and an in-thread Django server.
+
+Run:
+    python replay_bench.py --users 20
+    python replay_bench.py --updates recorded.jsonl --db /path/to/copy-of-db.sqlite3
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from fake_bot_api import FakeBotAPI
+
+BASE_USER_ID = 700000000
+ADMIN_USER_ID = 699999999
+CATALOG = {
+    'Шары': ['Шар красный', 'Шар синий', 'Шар золотой'],
+    'Наборы': ['Набор на день рождения', 'Набор для выпускного', 'Набор мини'],
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10, help='Synthetic customers to simulate.')
+    parser.add_argument('--updates', help='JSONL file with recorded Update objects to replay instead of the synthetic flow.')
+    parser.add_argument('--db', help='SQLite file to use (default: fresh temporary database).')
+    parser.add_argument('--transport', choices=('getupdates', 'direct'), default='getupdates',
+                        help='Deliver updates through getUpdates on the fake server or hand them to the bot directly.')
+    parser.add_argument('--no-seed', action='store_true', help='Do not create the demo catalog.')
+    parser.add_argument('--tracemalloc', action='store_true', help='Also report Python heap growth (slower).')
+    parser.add_argument('--json', dest='json_path', help='Write the report as JSON to this file.')
+    return parser.parse_args()
+
+
+# Environment
+
+def boot_django(db_path: str):
+    os.environ['DJANGO_DB_PATH'] = db_path
+    os.environ['BOT_TOKEN'] = ''
+    os.environ['ADMIN_TELEGRAM_CHAT_ID'] = ''
+    import django_setup  # noqa: F401  # side effect: configures Django
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0, interactive=False)
+
+
+def seed_catalog():
+    from django_setup import Category, Product
+    for index, (category_name, titles) in enumerate(CATALOG.items()):
+        category, _ = Category.objects.get_or_create(slug=f'bench-{index}', defaults={'name': category_name})
+        for position, title in enumerate(titles):
+            Product.objects.get_or_create(
+                category=category,
+                title=title,
+                defaults={'price': 10000 * (position + 1), 'description': f'{title} для бенчмарка'},
+            )
+
+
+def start_django_server() -> Tuple[Any, str]:
+    from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+    from django.core.wsgi import get_wsgi_application
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    httpd = ThreadedWSGIServer(('127.0.0.1', 0), QuietHandler)
+    httpd.set_app(get_wsgi_application())
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    host, port = httpd.server_address[:2]
+    return httpd, f"http://{host}:{port}/api"
+
+
+# Update builders
+
+class Updates:
+    def __init__(self):
+        self._update_id = 0
+        self._message_id = 0
+
+    def _next(self) -> Tuple[int, int]:
+        self._update_id += 1
+        self._message_id += 1
+        return self._update_id, self._message_id
+
+    @staticmethod
+    def _user(user_id: int) -> Dict[str, Any]:
+        return {'id': user_id, 'is_bot': False, 'first_name': f'Bench{user_id % 10000}', 'language_code': 'ru'}
+
+    def message(self, user_id: int, **content) -> Dict[str, Any]:
+        update_id, message_id = self._next()
+        message = {
+            'message_id': message_id,
+            'from': self._user(user_id),
+            'chat': {'id': user_id, 'type': 'private'},
+            'date': int(time.time()),
+        }
+        message.update(content)
+        return {'update_id': update_id, 'message': message}
+
+    def text(self, user_id: int, text: str) -> Dict[str, Any]:
+        return self.message(user_id, text=text)
+
+    def callback(self, user_id: int, data: str, message_id: Optional[int] = None) -> Dict[str, Any]:
+        update_id, own_message_id = self._next()
+        return {
+            'update_id': update_id,
+            'callback_query': {
+                'id': str(update_id),
+                'from': self._user(user_id),
+                'chat_instance': str(user_id),
+                'data': data,
+                'message': {
+                    'message_id': message_id or own_message_id,
+                    'from': {'id': 1, 'is_bot': True, 'first_name': 'bot'},
+                    'chat': {'id': user_id, 'type': 'private'},
+                    'date': int(time.time()),
+                    'text': '…',
+                },
+            },
+        }
+
+
+# Synthetic scenario
+
+def registration_flow(main, updates: Updates, user_id: int) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    tr = main.kb.LANG['ru']
+    yield 'start', updates.text(user_id, '/start')
+    yield 'language', updates.text(user_id, tr['lang_ru'])
+    yield 'name', updates.text(user_id, f'Клиент {user_id}')
+    yield 'contact', updates.message(user_id, contact={
+        'phone_number': f'+99890{user_id % 10000000:07d}',
+        'first_name': 'Bench',
+        'user_id': user_id,
+    })
+
+
+def customer_flow(main, updates: Updates, user_id: int, index: int) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    tr = main.kb.LANG['ru']
+    category_name = list(CATALOG)[index % len(CATALOG)]
+    product_title = CATALOG[category_name][index % len(CATALOG[category_name])]
+
+    yield from registration_flow(main, updates, user_id)
+    yield 'menu_order', updates.text(user_id, tr['menu_order'])
+    yield 'location', updates.message(user_id, location={'latitude': 41.311081, 'longitude': 69.240562})
+    yield 'asap', updates.text(user_id, tr['asap'])
+    yield 'category', updates.text(user_id, category_name)
+    yield 'product', updates.text(user_id, product_title)
+    product_id = main.get_state(user_id)['data'].get('selected_product_id')
+    yield 'qty_inc', updates.callback(user_id, f'qty:{product_id}:inc')
+    yield 'add_to_cart', updates.callback(user_id, f'add_to_cart:{product_id}')
+    yield 'open_cart', updates.text(user_id, tr['catalog_cart'])
+    yield 'checkout', updates.callback(user_id, 'cart_checkout')
+    yield 'send_proof', updates.message(user_id, photo=[
+        {'file_id': f'proof-{user_id}', 'file_unique_id': f'proof-{user_id}', 'width': 800, 'height': 1200},
+    ])
+    yield 'my_orders', updates.text(user_id, tr['menu_orders'])
+
+
+def admin_flow(main, updates: Updates) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    pending = dict(main.get_state(ADMIN_USER_ID)['data'].get('pending_proofs', {}))
+    for order_id, proof in pending.items():
+        yield 'admin_view_proof', updates.callback(ADMIN_USER_ID, f'view_proof:{order_id}')
+        yield 'admin_approve', updates.callback(ADMIN_USER_ID, f"approve_payment:{proof['payment_id']}:{order_id}")
+
+
+def synthetic_stream(main, users: int) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    updates = Updates()
+    yield from registration_flow(main, updates, ADMIN_USER_ID)
+    yield 'become_admin', updates.text(ADMIN_USER_ID, f'/become_admin {main.ADMIN_PASSWORD}')
+
+    # Customers interleave round-robin, the way concurrent chats arrive in getUpdates
+    flows = [customer_flow(main, updates, BASE_USER_ID + i, i) for i in range(users)]
+    while flows:
+        for flow in list(flows):
+            try:
+                yield next(flow)
+            except StopIteration:
+                flows.remove(flow)
+
+    yield from admin_flow(main, updates)
+
+
+def recorded_stream(path: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    with open(path, encoding='utf-8') as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            update = json.loads(line)
+            yield describe_update(update), update
+
+
+def describe_update(update: Dict[str, Any]) -> str:
+    if 'callback_query' in update:
+        return 'callback:' + (update['callback_query'].get('data') or '').split(':', 1)[0]
+    message = update.get('message') or {}
+    text = message.get('text') or ''
+    if text.startswith('/'):
+        return 'command:' + text.split()[0]
+    for kind in ('contact', 'location', 'photo', 'document', 'web_app_data'):
+        if kind in message:
+            return kind
+    return 'text'
+
+
+# Instrumentation
+
+def deep_sizeof(obj: Any, seen: Optional[set] = None) -> int:
+    seen = seen if seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, '__dict__'):
+        size += deep_sizeof(vars(obj), seen)
+    return size
+
+
+def storage_snapshot(main) -> Dict[str, int]:
+    return {
+        'state_users': len(main.STATE),
+        'state_bytes': deep_sizeof(main.STATE),
+        'cart_users': len(main.db.CART_STORAGE),
+        'cart_bytes': deep_sizeof(main.db.CART_STORAGE),
+    }
+
+
+class HandlerTimer:
+    """Wraps registered telebot handlers to record per-handler latency"""
+
+    def __init__(self, bot):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        for handlers in (bot.message_handlers, bot.callback_query_handlers):
+            for handler in handlers:
+                handler['function'] = self._wrap(handler['function'])
+
+    def _wrap(self, func: Callable) -> Callable:
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.samples[func.__name__].append(time.perf_counter() - started)
+        timed.__name__ = func.__name__
+        return timed
+
+
+class DjangoCallCounter:
+    """Counts HTTP calls made by api_client to Django"""
+
+    def __init__(self, client):
+        self.count = 0
+        original = client.session.request
+
+        def counted(*args, **kwargs):
+            self.count += 1
+            return original(*args, **kwargs)
+
+        client.session.request = counted
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def latency_row(values: List[float]) -> Dict[str, float]:
+    return {
+        'count': len(values),
+        'p50_ms': percentile(values, 0.50) * 1000,
+        'p95_ms': percentile(values, 0.95) * 1000,
+        'max_ms': max(values) * 1000 if values else 0.0,
+    }
+
+
+# Runner
+
+def run(args) -> Dict[str, Any]:
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix='partyland-bench-'), 'db.sqlite3')
+    boot_django(db_path)
+    if not args.no_seed:
+        seed_catalog()
+
+    httpd, api_url = start_django_server()
+    fake = FakeBotAPI().start()
+    fake.install()
+    os.environ['DJANGO_API_URL'] = api_url
+
+    import main
+    main.api_client.base_url = api_url
+    main.bot.threaded = False
+
+    timer = HandlerTimer(main.bot)
+    django_calls = DjangoCallCounter(main.api_client)
+    stream = recorded_stream(args.updates) if args.updates else synthetic_stream(main, args.users)
+
+    per_label: Dict[str, List[float]] = defaultdict(list)
+    telegram_calls_by_label: Dict[str, Counter] = defaultdict(Counter)
+    django_calls_by_label: Dict[str, Counter] = defaultdict(Counter)
+    errors: Counter = Counter()
+    memory_before = storage_snapshot(main)
+    if args.tracemalloc:
+        tracemalloc.start()
+    heap_before = tracemalloc.get_traced_memory()[0] if args.tracemalloc else 0
+
+    from telebot import types
+    processed = 0
+    next_offset = 0
+    started = time.perf_counter()
+    for label, update in stream:
+        telegram_before = fake.total_calls()
+        django_before = django_calls.count
+        update_started = time.perf_counter()
+        try:
+            if args.transport == 'getupdates':
+                fake.push_update(update)
+                raw_updates = main.bot.get_updates(offset=next_offset, timeout=5, long_polling_timeout=0)
+                if raw_updates:
+                    next_offset = raw_updates[-1].update_id + 1
+                main.bot.process_new_updates(raw_updates)
+            else:
+                main.bot.process_new_updates([types.Update.de_json(update)])
+        except Exception as exc:
+            errors[f'{label}: {type(exc).__name__}'] += 1
+        per_label[label].append(time.perf_counter() - update_started)
+        telegram_calls_by_label[label][fake.total_calls() - telegram_before] += 1
+        django_calls_by_label[label][django_calls.count - django_before] += 1
+        processed += 1
+    elapsed = time.perf_counter() - started
+
+    memory_after = storage_snapshot(main)
+    heap_after = tracemalloc.get_traced_memory()[0] if args.tracemalloc else 0
+    if args.tracemalloc:
+        tracemalloc.stop()
+
+    fake.stop()
+    httpd.shutdown()
+
+    def calls_summary(histogram: Counter) -> Dict[str, float]:
+        total = sum(calls * times for calls, times in histogram.items())
+        updates = sum(histogram.values())
+        return {'avg': total / updates if updates else 0.0, 'max': max(histogram) if histogram else 0}
+
+    return {
+        'updates': processed,
+        'seconds': elapsed,
+        'updates_per_second': processed / elapsed if elapsed else 0.0,
+        'transport': args.transport,
+        'handlers': {name: latency_row(values) for name, values in sorted(timer.samples.items())},
+        'steps': {
+            label: {
+                **latency_row(values),
+                'telegram_calls': calls_summary(telegram_calls_by_label[label]),
+                'django_calls': calls_summary(django_calls_by_label[label]),
+            }
+            for label, values in per_label.items()
+        },
+        'telegram_calls_by_method': dict(fake.calls),
+        'django_calls': django_calls.count,
+        'django_api': main.api_client.metrics(),
+        'memory': {
+            'before': memory_before,
+            'after': memory_after,
+            'state_bytes_growth': memory_after['state_bytes'] - memory_before['state_bytes'],
+            'cart_bytes_growth': memory_after['cart_bytes'] - memory_before['cart_bytes'],
+            'heap_bytes_growth': heap_after - heap_before if args.tracemalloc else None,
+        },
+        'errors': dict(errors),
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"Updates: {report['updates']} in {report['seconds']:.2f}s "
+          f"({report['updates_per_second']:.1f} updates/s, transport={report['transport']})")
+    print()
+    print(f"{'handler':<22}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for name, row in report['handlers'].items():
+        print(f"{name:<22}{row['count']:>7}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['max_ms']:>10.2f}")
+    print()
+    print(f"{'step':<22}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'tg/upd':>8}{'api/upd':>9}")
+    for label, row in report['steps'].items():
+        print(f"{label:<22}{row['count']:>7}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}"
+              f"{row['telegram_calls']['avg']:>8.2f}{row['django_calls']['avg']:>9.2f}")
+    print()
+    print('Bot API calls:', ', '.join(f'{m}={c}' for m, c in sorted(report['telegram_calls_by_method'].items())))
+    print('Django API calls:', report['django_calls'])
+    api = report['django_api']
+    print(f"Django API errors: {api['errors']}, circuit: {api['circuit']}, "
+          f"retries: {sum(row['retries'] for row in api['endpoints'].values())}")
+    memory = report['memory']
+    print(f"STATE: {memory['after']['state_users']} users, {memory['after']['state_bytes']} bytes "
+          f"(+{memory['state_bytes_growth']})")
+    print(f"CART_STORAGE: {memory['after']['cart_users']} users, {memory['after']['cart_bytes']} bytes "
+          f"(+{memory['cart_bytes_growth']})")
+    if memory['heap_bytes_growth'] is not None:
+        print(f"Python heap growth: {memory['heap_bytes_growth']} bytes")
+    if report['errors']:
+        print('Errors:', report['errors'])
+
+
+if __name__ == '__main__':
+    arguments = parse_args()
+    result = run(arguments)
+    print_report(result)
+    if arguments.json_path:
+        with open(arguments.json_path, 'w', encoding='utf-8') as out:
+            json.dump(result, out, ensure_ascii=False, indent=2)
@@ -0,0 +1,214 @@
+"""
+Тесты бота без сети и без Telegram: python -m unittest tests (из папки TG_bot)
+"""
+import io
+import unittest
+from unittest import mock
+
+import requests
+
+import http_transport
+import main
+from http_transport import CircuitBreaker, CircuitOpenError, ResilientTransport
+
+
+def make_response(status_code: int, body: bytes = b'{}') -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = body
+    response.raw = io.BytesIO(body)
+    return response
+
+
+class StubSession:
+    """Вместо requests.Session: отдаёт ответы (или бросает исключения) по очереди и запоминает вызовы"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CircuitBreakerTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(http_transport.time, 'monotonic', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+
+    def test_opens_after_threshold_then_probe_closes(self):
+        for _ in range(2):
+            self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'closed')
+        self.assertTrue(self.breaker.allow())
+
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'open')
+        self.assertFalse(self.breaker.allow())
+
+        self.clock.now += 30
+        self.assertEqual(self.breaker.state, 'half-open')
+        self.assertTrue(self.breaker.allow())
+        # Пока пробный запрос не вернулся, остальные не проходят
+        self.assertFalse(self.breaker.allow())
+
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, 'closed')
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_probe_opens_again(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.clock.now += 30
+        self.assertTrue(self.breaker.allow())
+
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'open')
+        self.assertFalse(self.breaker.allow())
+
+
+class ResilientTransportTests(unittest.TestCase):
+    def make_transport(self, *outcomes, failure_threshold: int = 100) -> ResilientTransport:
+        transport = ResilientTransport(
+            'http://django.test/api/', retries=2, backoff_base=0,
+            breaker=CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=30),
+        )
+        transport.session = StubSession(*outcomes)
+        return transport
+
+    def test_post_without_idempotency_key_is_not_retried(self):
+        transport = self.make_transport(make_response(503))
+        response = transport.request('POST', 'checkout/', json={})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(transport.session.calls), 1)
+
+        transport = self.make_transport(requests.Timeout('read timed out'))
+        with self.assertRaises(requests.Timeout):
+            transport.request('POST', 'checkout/', json={})
+        self.assertEqual(len(transport.session.calls), 1)
+
+    def test_post_with_idempotency_key_is_retried_up_to_limit(self):
+        headers = {'Idempotency-Key': 'abc'}
+        transport = self.make_transport(requests.Timeout('read timed out'), make_response(201))
+        response = transport.request('POST', 'checkout/', json={}, headers=headers)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(transport.session.calls), 2)
+        # Все попытки уходят с тем же ключом
+        self.assertEqual({call[2]['headers']['Idempotency-Key'] for call in transport.session.calls}, {'abc'})
+
+        transport = self.make_transport(
+            requests.ConnectionError('refused'), make_response(503), make_response(504), make_response(201),
+        )
+        response = transport.request('POST', 'checkout/', json={}, headers=headers)
+        self.assertEqual(response.status_code, 504)
+        self.assertEqual(len(transport.session.calls), 3)
+
+    def test_client_errors_are_not_retried(self):
+        transport = self.make_transport(make_response(400), make_response(201))
+        response = transport.request('GET', 'products/')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(transport.session.calls), 1)
+
+    def test_metrics_count_requests_errors_retries_and_rejections(self):
+        transport = self.make_transport(
+            make_response(200), make_response(502), make_response(200),
+            requests.Timeout('read timed out'), requests.Timeout('read timed out'),
+            failure_threshold=2,
+        )
+        transport.request('GET', 'products/7/')
+        transport.request('GET', 'products/8/')
+        with self.assertRaises(requests.Timeout):
+            transport.request('POST', 'checkout/', json={})
+        with self.assertRaises(requests.Timeout):
+            transport.request('POST', 'checkout/', json={})
+        # Вторая ошибка подряд открыла цепь — следующий запрос даже не отправляется
+        with self.assertRaises(CircuitOpenError):
+            transport.request('GET', 'products/9/')
+
+        snapshot = transport.metrics.snapshot()
+        self.assertEqual(snapshot['requests'], 5)
+        self.assertEqual(snapshot['errors'], 3)
+        self.assertEqual(snapshot['circuit_rejected'], 1)
+        products = snapshot['endpoints']['GET /products/{id}/']
+        self.assertEqual((products['requests'], products['errors'], products['retries']), (3, 1, 1))
+        checkout = snapshot['endpoints']['POST /checkout/']
+        self.assertEqual((checkout['requests'], checkout['errors'], checkout['retries']), (2, 2, 0))
+        self.assertEqual(len(transport.session.calls), 5)
+
+
+def http_error(status_code: int) -> requests.HTTPError:
+    return requests.HTTPError(f'{status_code} error', response=make_response(status_code))
+
+
+class FakeCheckoutAPI:
+    """Как /api/checkout/: один заказ на Idempotency-Key; errors — что вернуть вместо ответа по очереди"""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.orders = {}
+        self.keys = []
+
+    def __call__(self, telegram_user_id, cart_items, idempotency_key=None, **fields):
+        self.keys.append(idempotency_key)
+        if self.errors:
+            raise self.errors.pop(0)
+        order_id = self.orders.setdefault(idempotency_key, len(self.orders) + 1)
+        return {'order_id': order_id}
+
+
+class CheckoutKeyTests(unittest.TestCase):
+    user_id = 555000111
+    items = [{'product_id': 1, 'quantity': 2}]
+
+    def setUp(self):
+        main.STATE.pop(self.user_id, None)
+        self.addCleanup(main.STATE.pop, self.user_id, None)
+
+    def checkout(self, api):
+        with mock.patch.object(main.api_client, 'create_checkout', api):
+            return main.place_checkout(self.user_id, list(self.items), address='Test')
+
+    def test_second_identical_order_creates_a_new_order(self):
+        api = FakeCheckoutAPI()
+        first = self.checkout(api)
+        main.clear_state(self.user_id)
+        second = self.checkout(api)
+        self.assertNotEqual(first['order_id'], second['order_id'])
+        self.assertNotIn('checkout_key', main.get_state(self.user_id)['data'])
+
+    def test_key_survives_transport_failures_and_retry_statuses(self):
+        api = FakeCheckoutAPI(requests.Timeout('read timed out'), http_error(503))
+        for _ in range(2):
+            with self.assertRaises(requests.RequestException):
+                self.checkout(api)
+            main.clear_state(self.user_id)
+        order = self.checkout(api)
+        self.assertEqual(len(set(api.keys)), 1)
+        self.assertEqual(order['order_id'], 1)
+
+    def test_key_is_dropped_after_client_error(self):
+        api = FakeCheckoutAPI(http_error(400))
+        with self.assertRaises(requests.HTTPError):
+            self.checkout(api)
+        main.clear_state(self.user_id)
+        self.checkout(api)
+        self.assertNotEqual(api.keys[0], api.keys[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -199,6 +199,7 @@ export default function AdminPaymentsPage() {
               <table className="w-full text-sm text-left">
                 <thead className="bg-slate-900/80 text-slate-400 uppercase tracking-wide">
                   <tr>
+                    <th className="px-4 py-3">Чек</th>
                     <th className="px-4 py-3">Заказ</th>
                     <th className="px-4 py-3">Сумма</th>
                     <th className="px-4 py-3">Провайдер</th>
@@ -208,13 +209,13 @@ export default function AdminPaymentsPage() {
                 <tbody>
                   {listLoading ? (
                     <tr>
-                      <td colSpan={4} className="px-4 py-6 text-center text-slate-400">
+                      <td colSpan={5} className="px-4 py-6 text-center text-slate-400">
                         Загружаем…
                       </td>
                     </tr>
                   ) : payments.length === 0 ? (
                     <tr>
-                      <td colSpan={4} className="px-4 py-6 text-center text-slate-400">
+                      <td colSpan={5} className="px-4 py-6 text-center text-slate-400">
                         Нет чеков на проверку.
                       </td>
                     </tr>
@@ -227,6 +228,21 @@ export default function AdminPaymentsPage() {
                           payment.id === selectedPaymentId ? "bg-slate-800" : ""
                         }`}
                       >
+                        <td className="px-4 py-3">
+                          {payment.proof_preview ? (
+                            <div className="relative h-12 w-9 overflow-hidden rounded-md border border-slate-700 bg-slate-800">
+                              <Image
+                                src={payment.proof_preview}
+                                alt={`Чек к заказу #${payment.order_id}`}
+                                fill
+                                sizes="36px"
+                                className="object-cover"
+                              />
+                            </div>
+                          ) : (
+                            <span className="text-slate-500">—</span>
+                          )}
+                        </td>
                         <td className="px-4 py-3 font-medium text-white">#{payment.order_id}</td>
                         <td className="px-4 py-3 text-slate-100">{payment.formatted_amount}</td>
                         <td className="px-4 py-3 text-slate-300">{payment.provider}</td>
@@ -3,6 +3,28 @@ import { NextRequest, NextResponse } from 'next/server';
 // Всегда используем продакшн сервер
 const API_BACKEND_URL = 'http://81.162.55.70:8001';
 
+// Заголовки, которые прокси передаёт Django и обратно клиенту
+const FORWARDED_REQUEST_HEADERS = ['if-none-match', 'idempotency-key', 'last-event-id'];
+const RELAYED_RESPONSE_HEADERS = ['etag', 'cache-control', 'idempotent-replayed'];
+
+function forwardedHeaders(request: NextRequest): Record<string, string> {
+  const headers: Record<string, string> = { 'Content-Type': 'application/json' };
+  for (const name of FORWARDED_REQUEST_HEADERS) {
+    const value = request.headers.get(name);
+    if (value) headers[name] = value;
+  }
+  return headers;
+}
+
+function relayedHeaders(response: Response): Headers {
+  const headers = new Headers();
+  for (const name of RELAYED_RESPONSE_HEADERS) {
+    const value = response.headers.get(name);
+    if (value) headers.set(name, value);
+  }
+  return headers;
+}
+
 // ВАЖНО: Эта функция обрабатывает все запросы к /api-proxy/* и проксирует их на Django бэкенд
 
 export async function GET(
@@ -16,12 +38,16 @@ export async function GET(
   try {
     const response = await fetch(url, {
       method: 'GET',
-      headers: {
-        'Content-Type': 'application/json',
-      },
+      headers: forwardedHeaders(request),
       cache: 'no-store',
+      // Закрытая вкладка закрывает и SSE-соединение с Django
+      signal: request.signal,
     });
 
+    if (response.status === 304) {
+      return new NextResponse(null, { status: 304, headers: relayedHeaders(response) });
+    }
+
     if (!response.ok) {
       return NextResponse.json(
         { error: `Backend error: ${response.status} ${response.statusText}` },
@@ -29,8 +55,19 @@ export async function GET(
       );
     }
 
+    // SSE (/orders/<id>/events/) отдаём потоком, без буферизации
+    if (response.headers.get('content-type')?.startsWith('text/event-stream')) {
+      return new Response(response.body, {
+        headers: {
+          'Content-Type': 'text/event-stream',
+          'Cache-Control': 'no-cache',
+          'X-Accel-Buffering': 'no',
+        },
+      });
+    }
+
     const data = await response.json();
-    return NextResponse.json(data);
+    return NextResponse.json(data, { headers: relayedHeaders(response) });
   } catch (error) {
     console.error('[API Proxy] Error:', error);
     return NextResponse.json(
@@ -52,9 +89,7 @@ export async function POST(
   try {
     const response = await fetch(url, {
       method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-      },
+      headers: forwardedHeaders(request),
       body: JSON.stringify(body),
       cache: 'no-store',
     });
@@ -67,7 +102,7 @@ export async function POST(
     }
 
     const data = await response.json();
-    return NextResponse.json(data);
+    return NextResponse.json(data, { status: response.status, headers: relayedHeaders(response) });
   } catch (error) {
     console.error('[API Proxy] Error:', error);
     return NextResponse.json(
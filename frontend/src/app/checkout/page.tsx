@@ -1,6 +1,6 @@
 "use client";
 
-import { FormEvent, useEffect, useState } from "react";
+import { FormEvent, useEffect, useRef, useState } from "react";
 import Link from "next/link";
 import { useRouter } from "next/navigation";
 import {
@@ -20,7 +20,7 @@ import { Textarea } from "@/components/ui/textarea";
 import { Alert, AlertDescription } from "@/components/ui/alert";
 import { useCart, CartItem } from "@/contexts/CartContext";
 import { useLanguage } from "@/contexts/LanguageContext";
-import { createCheckout, CheckoutPayload, CheckoutResponse } from "@/lib/api";
+import { createCheckout, newIdempotencyKey, CheckoutPayload, CheckoutResponse } from "@/lib/api";
 import { formatUZS } from "@/lib/utils";
 import { getTelegramWebApp, initTelegramWebApp, isTelegramWebApp } from "@/lib/telegram";
 
@@ -46,6 +46,8 @@ export default function CheckoutPage() {
   const [isSubmitting, setIsSubmitting] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [showInstructions, setShowInstructions] = useState(false);
+  // Один ключ на одинаковый заказ: повторная отправка после ошибки сети не создаст дубль
+  const checkoutKeyRef = useRef<{ payload: string; key: string } | null>(null);
   const [snapshotItems, setSnapshotItems] = useState<CartItem[]>([]);
   const [snapshotTotal, setSnapshotTotal] = useState(0);
   const [checkoutInfo, setCheckoutInfo] = useState<CheckoutResponse | null>(null);
@@ -111,7 +113,13 @@ export default function CheckoutPage() {
       const snapshot = items.map((item) => ({ ...item }));
       const total = snapshot.reduce((sum, item) => sum + item.price * item.quantity, 0);
 
-      const response = await createCheckout(payload);
+      const payloadJson = JSON.stringify(payload);
+      if (checkoutKeyRef.current?.payload !== payloadJson) {
+        checkoutKeyRef.current = { payload: payloadJson, key: newIdempotencyKey() };
+      }
+
+      const response = await createCheckout(payload, checkoutKeyRef.current.key);
+      checkoutKeyRef.current = null;
       setCheckoutInfo(response);
       setSnapshotItems(snapshot);
       setSnapshotTotal(total);
@@ -9,14 +9,16 @@ import { CategoryIcons } from "@/components/CategoryIcons";
 import { ProductCardCompact } from "@/components/ProductCardCompact";
 import { Sparkles } from "lucide-react";
 import { useEffect, useState, useMemo, useCallback } from "react";
-import { isTelegramWebApp, initTelegramWebApp } from "@/lib/telegram";
+import { isTelegramWebApp, initTelegramWebApp, getTelegramWebApp } from "@/lib/telegram";
 import { useLanguage } from "@/contexts/LanguageContext";
 import {
-  getCategories,
-  getProducts,
+  getBootstrap,
+  flattenCategories,
+  bootstrapProducts,
   getProduct,
   Product as ApiProduct,
   Category as ApiCategory,
+  pickImageVariant,
 } from "@/lib/api";
 
 // Определяем API URL - всегда используем продакшн сервер
@@ -72,27 +74,21 @@ export default function Home() {
     setLoading(true);
     setError(null);
 
-    // Загрузка категорий с бэкенда
-    getCategories()
-      .then((cats) => {
-        setBackendCategories(cats);
-      })
-      .catch((error) => {
-        console.error("Failed to load categories:", error);
-        setError("Не удалось загрузить категории");
-      });
-
-    // Загрузка товаров с бэкенда
-    getProducts()
-      .then((prods: ApiProduct[]) => {
-        setApiProducts(prods);
+    // Категории и товары первого экрана — одним запросом
+    const tgUserId = getTelegramWebApp()?.initDataUnsafe?.user?.id;
+    getBootstrap(language, tgUserId)
+      .then((bootstrap) => {
+        setBackendCategories(flattenCategories(bootstrap.categories));
+        setApiProducts(bootstrapProducts(bootstrap));
         setLoading(false);
       })
       .catch((error) => {
-        console.error("Failed to load products:", error);
+        console.error("Failed to load bootstrap:", error);
         setError("Не удалось загрузить товары");
         setLoading(false);
       });
+    // Язык меняет только подписи, которые страница выбирает сама
+    // eslint-disable-next-line react-hooks/exhaustive-deps
   }, []);
 
   useEffect(() => {
@@ -112,7 +108,7 @@ export default function Home() {
             ? p.description_uz
             : p.description,
         price: Number(p.price) || 0,
-        image: getImageUrl(p.image),
+        image: getImageUrl(pickImageVariant(p.image_variants, "card") || p.image),
         category: categoryName,
         longDescription:
           language === "uz" && p.description_uz
@@ -175,7 +171,7 @@ export default function Home() {
               ? fullProduct.description_uz
               : fullProduct.description,
           price: Number(fullProduct.price) || 0,
-          image: getImageUrl(fullProduct.image),
+          image: getImageUrl(pickImageVariant(fullProduct.image_variants, "full") || fullProduct.image),
           category: categoryName || product.category,
           longDescription:
             language === "uz" && fullProduct.description_uz
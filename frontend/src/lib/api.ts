@@ -17,6 +17,7 @@ export interface Product {
   price: string;
   category: string | Category; // Может быть строкой или объектом Category в детальном ответе
   image?: string;
+  image_variants?: ImageVariants;
   created_at: string;
 }
 
@@ -27,6 +28,30 @@ export interface Category {
   slug: string;
   parent?: number | null;
   image?: string;
+  image_variants?: ImageVariants;
+}
+
+export interface ImageVariant {
+  width: number;
+  height: number;
+  webp?: string;
+  jpeg?: string;
+}
+
+// Уменьшенные копии картинки; пустой объект — копии ещё не готовы, используйте image
+export interface ImageVariants {
+  thumb?: ImageVariant;
+  card?: ImageVariant;
+  full?: ImageVariant;
+  srcset?: { webp?: string; jpeg?: string };
+}
+
+export function pickImageVariant(
+  variants: ImageVariants | undefined,
+  size: "thumb" | "card" | "full",
+): string | undefined {
+  const variant = variants?.[size];
+  return variant?.webp || variant?.jpeg;
 }
 
 export interface CheckoutItemPayload {
@@ -83,6 +108,8 @@ export interface AdminPayment {
   reviewed_by?: string | null;
   reviewed_at?: string | null;
   proofs: PaymentProofSummary[];
+  // Миниатюра последнего чека (в списке); null — картинки ещё нет
+  proof_preview?: string | null;
 }
 
 export interface AdminOrderSummary {
@@ -256,11 +283,76 @@ export async function getCategories(): Promise<Category[]> {
   }
 }
 
-export async function createCheckout(payload: CheckoutPayload): Promise<CheckoutResponse> {
+export interface BootstrapCategory extends Category {
+  label: string;
+  children: BootstrapCategory[];
+}
+
+export interface BootstrapProduct extends Product {
+  label: string;
+}
+
+export interface TelegramProfile {
+  telegram_id: number;
+  name?: string | null;
+  phone?: string | null;
+  language: string;
+  is_admin: boolean;
+}
+
+export interface Bootstrap {
+  catalog_version: string;
+  language: string;
+  categories: BootstrapCategory[];
+  products: Record<string, { items: BootstrapProduct[]; has_more: boolean }>;
+  user: TelegramProfile | null;
+}
+
+// Первый экран одним запросом. cache: 'no-cache' — браузер перепроверяет ответ по ETag и получает 304
+export async function getBootstrap(language?: string, telegramUserId?: number): Promise<Bootstrap> {
+  const params = new URLSearchParams();
+  if (language) params.set('lang', language);
+  if (telegramUserId) params.set('telegram_user_id', String(telegramUserId));
+  const query = params.toString();
+  const response = await fetch(`${getApiUrl()}/bootstrap/${query ? `?${query}` : ''}`, {
+    method: 'GET',
+    cache: 'no-cache',
+  });
+  if (!response.ok) {
+    throw new Error(`Failed to fetch bootstrap: ${response.status} ${response.statusText}`);
+  }
+  return response.json();
+}
+
+// Дерево категорий из bootstrap -> плоский список (как у getCategories)
+export function flattenCategories(tree: BootstrapCategory[]): Category[] {
+  return tree.flatMap(({ children, ...category }) => [category, ...flattenCategories(children)]);
+}
+
+export function bootstrapProducts(bootstrap: Bootstrap): Product[] {
+  const seen = new Set<number>();
+  return Object.values(bootstrap.products)
+    .flatMap((group) => group.items)
+    .filter((product) => !seen.has(product.id) && seen.add(product.id));
+}
+
+export function newIdempotencyKey(): string {
+  if (typeof crypto !== 'undefined' && typeof crypto.randomUUID === 'function') {
+    return crypto.randomUUID();
+  }
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
+// Повтор с тем же idempotencyKey вернёт уже созданный заказ вместо нового
+export async function createCheckout(payload: CheckoutPayload, idempotencyKey?: string): Promise<CheckoutResponse> {
   const apiBaseUrl = getApiUrl();
+  const headers: Record<string, string> = { 'Content-Type': 'application/json' };
+  if (idempotencyKey) {
+    headers['Idempotency-Key'] = idempotencyKey;
+  }
   const response = await fetch(`${apiBaseUrl}/checkout/`, {
     method: 'POST',
-    headers: { 'Content-Type': 'application/json' },
+    headers,
     body: JSON.stringify(payload),
     cache: 'no-store',
   });
@@ -328,3 +420,112 @@ export async function rejectAdminPayment(paymentId: number, reason: string): Pro
   }
   return response.json();
 }
+
+export interface PaymentDecision {
+  payment_id: number;
+  action: 'approve' | 'reject';
+  reason?: string;
+}
+
+export interface PaymentDecisionResult {
+  payment_id: number;
+  result: 'approved' | 'rejected' | 'already_processed' | 'order_changed' | 'not_found';
+  detail: string;
+  status: string | null;
+  order_id: number | null;
+  order_status: string | null;
+}
+
+export interface BulkModerationResponse {
+  results: PaymentDecisionResult[];
+  approved: number;
+  rejected: number;
+  skipped: number;
+  notifications_queued: number;
+}
+
+export async function moderateAdminPayments(decisions: PaymentDecision[]): Promise<BulkModerationResponse> {
+  const apiBaseUrl = getApiUrl();
+  const response = await fetch(`${apiBaseUrl}/admin/payments/bulk/`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    credentials: 'include',
+    body: JSON.stringify({ decisions }),
+  });
+  if (!response.ok) {
+    const errorText = await response.text();
+    throw new Error(errorText || 'Failed to moderate payments');
+  }
+  return response.json();
+}
+
+export interface OrderSnapshotEvent {
+  order_id: number;
+  status: string;
+  payment_status: string | null;
+  payment_deadline_at: string;
+  seconds_left: number;
+  is_expired: boolean;
+}
+
+export interface OrderDeadline {
+  order_id: number;
+  status: string;
+  payment_deadline_at: string;
+  seconds_left: number;
+  is_expired: boolean;
+}
+
+// Сроки оплаты нескольких открытых заказов одним запросом; чужие и неизвестные заказы пропускаются
+export async function getOrderDeadlines(orderIds: number[], telegramUserId?: number): Promise<OrderDeadline[]> {
+  if (orderIds.length === 0) return [];
+  const params = new URLSearchParams({ ids: orderIds.join(',') });
+  if (telegramUserId) params.set('telegram_user_id', String(telegramUserId));
+  const response = await fetch(`${getApiUrl()}/orders/deadlines/?${params.toString()}`, { cache: 'no-store' });
+  if (!response.ok) {
+    throw new Error(`Failed to fetch order deadlines: ${response.status}`);
+  }
+  return response.json();
+}
+
+export interface OrderStatusEvent {
+  order_id: number;
+  previous_status: string;
+  status: string;
+}
+
+export interface OrderPaymentEvent {
+  order_id: number;
+  payment_id: number;
+  status: string;
+  is_active: boolean;
+}
+
+export interface OrderEventHandlers {
+  onSnapshot?: (event: OrderSnapshotEvent) => void;
+  onStatus?: (event: OrderStatusEvent) => void;
+  onPayment?: (event: OrderPaymentEvent) => void;
+}
+
+// SSE вместо опроса /deadline/: EventSource сам переподключается и присылает Last-Event-ID,
+// поэтому после обрыва приходят только пропущенные события. Возвращает функцию отписки.
+export function subscribeOrderEvents(
+  orderId: number,
+  telegramUserId: number | undefined,
+  handlers: OrderEventHandlers,
+): () => void {
+  const params = new URLSearchParams();
+  if (telegramUserId) params.set('telegram_user_id', String(telegramUserId));
+  const query = params.toString();
+  const source = new EventSource(`${getApiUrl()}/orders/${orderId}/events/${query ? `?${query}` : ''}`);
+
+  const listen = <T>(type: string, handler?: (event: T) => void) => {
+    if (!handler) return;
+    source.addEventListener(type, (event) => handler(JSON.parse((event as MessageEvent).data) as T));
+  };
+  listen('snapshot', handlers.onSnapshot);
+  listen('status', handlers.onStatus);
+  listen('payment', handlers.onPayment);
+
+  return () => source.close();
+}